@@ -1,32 +1,15 @@
 import tkinter as tk
 from tkinter import simpledialog, messagebox
-import json
-
-class SmartHome:
-    def __init__(self, name):
-        self.name = name
-        self.devices = []
-
-    def add_device(self, device):
-        self.devices.append(device)
-
-    def remove_device(self, device_name):
-        self.devices = [d for d in self.devices if d['name'] != device_name]
-
-    def to_dict(self):
-        return {"name": self.name, "devices": self.devices}
-
-    @staticmethod
-    def from_dict(data):
-        home = SmartHome(data["name"])
-        home.devices = data["devices"]
-        return home
+from homeStore import HomeStore
+from homeModel import SmartHome
+from instrumentation import profile_session
 
 class SmartHomesApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Smart Homes Manager")
         self.homes = []
+        self.store = HomeStore("homes.json")
         self.load_homes()
         self.create_main_menu()
 
@@ -49,14 +32,18 @@ class SmartHomesApp:
     def add_home(self):
         name = simpledialog.askstring("Add Home", "Enter home name:")
         if name:
-            self.homes.append(SmartHome(name))
+            home = SmartHome(name)
+            self.homes.append(home)
+            self.store.add_home(home)
             self.create_main_menu()
 
     def add_device(self, home):
         name = simpledialog.askstring("Add Device", "Enter device name:")
         status = simpledialog.askstring("Device Status", "Enter device status (on/off):")
         if name and status:
-            home.add_device({"name": name, "status": status})
+            device = {"name": name, "status": status}
+            home.add_device(device)
+            self.store.add_device(home, device)
             self.manage_home(home)
 
     def clear_window(self):
@@ -64,19 +51,14 @@ class SmartHomesApp:
             widget.destroy()
 
     def load_homes(self):
-        try:
-            with open("homes.json", "r") as file:
-                data = json.load(file)
-                self.homes = [SmartHome.from_dict(home) for home in data]
-        except FileNotFoundError:
-            self.homes = []
+        self.homes = self.store.load(SmartHome.from_dict)
 
     def save_and_exit(self):
-        with open("homes.json", "w") as file:
-            json.dump([home.to_dict() for home in self.homes], file)
+        self.store.close()
         self.root.quit()
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = SmartHomesApp(root)
-    root.mainloop()
+    with profile_session():
+        root = tk.Tk()
+        app = SmartHomesApp(root)
+        root.mainloop()
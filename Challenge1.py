@@ -1,95 +1,207 @@
+import itertools
 import tkinter as tk
 from tkinter import ttk, simpledialog, messagebox
-import json
-
-DEVICE_TYPES = ["Light", "Fridge", "Plug", "Heater", "TV", "Speaker"]
-
-class SmartHome:
-    def __init__(self, name):
-        self.name = name
-        self.devices = []
-
-    def add_device(self, device):
-        self.devices.append(device)
-
-    def remove_device(self, device_name):
-        self.devices = [d for d in self.devices if d['name'] != device_name]
-    
-    def toggle_device(self, device_name):
-        for device in self.devices:
-            if device['name'] == device_name:
-                device['status'] = "on" if device['status'] == "off" else "off"
-    
-    def edit_device(self, device_name):
-        for device in self.devices:
-            if device['name'] == device_name:
-                new_status = simpledialog.askstring("Edit Device", f"Set new value for {device_name}:")
-                if new_status:
-                    device['status'] = new_status
-
-    def to_dict(self):
-        return {"name": self.name, "devices": self.devices}
-
-    @staticmethod
-    def from_dict(data):
-        home = SmartHome(data["name"])
-        home.devices = data["devices"]
-        return home
+from homeStore import HomeStore
+from commandBuffer import CommandBuffer
+from changeBus import ChangeBus
+from homeHistory import HomeHistory
+from auditLog import AuditLog
+from homeModel import SmartHome, DEVICE_TYPES
+from instrumentation import profile_session
 
 class SmartHomesApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Smart Homes Manager")
+        # Homes live in this process; shardedHomes.ShardedHomes is the multi-process backend for
+        # scripts, and the GUI does not go through it
         self.homes = []
+        self.store = HomeStore("homes.json")
+        # Bursts of clicks on one device are folded into their net effect before touching anything
+        self.commands = CommandBuffer(self.apply_commands, window=0.1,
+                                      schedule=lambda delay, flush: self.root.after(int(delay * 1000), flush),
+                                      cancel=self.root.after_cancel)
+        self.bus = ChangeBus()
+        SmartHome.bus = self.bus
         self.load_homes()
+        self.history = HomeHistory(self.homes, self.bus)
+        # Every device change, timestamped, for working out later what state a home was in
+        self.audit = AuditLog("homes.audit", self.bus)
+        for home in self.homes:
+            self.audit.track(home)
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
         self.create_main_screen()
 
     def create_main_screen(self):
         self.clear_window()
+        # Retained widgets: home -> its frame and device rows, so later changes patch only what moved
+        self._home_views = {}
+        self._removed_homes = set()
+        self._dirty = set()
+        self._repaint_pending = False
         tk.Label(self.root, text="Smart Homes", font=("Arial", 16, "bold")).pack(pady=10)
         
-        home_frame = tk.Frame(self.root)
-        home_frame.pack(fill=tk.BOTH, expand=True)
+        self.home_frame = tk.Frame(self.root)
+        self.home_frame.pack(fill=tk.BOTH, expand=True)
         
         for home in self.homes:
-            frame = tk.LabelFrame(home_frame, text=home.name, padx=10, pady=10)
-            frame.pack(fill=tk.X, padx=5, pady=5)
-            
-            for device in home.devices:
-                device_frame = tk.Frame(frame)
-                device_frame.pack(fill=tk.X)
-                tk.Label(device_frame, text=f"{device['name']}: {device['status']}").pack(side=tk.LEFT)
-                tk.Button(device_frame, text="Toggle", command=lambda d=device['name'], h=home: self.toggle_device(h, d)).pack(side=tk.LEFT, padx=5)
-                tk.Button(device_frame, text="Edit", command=lambda d=device['name'], h=home: self.edit_device_popup(h, d)).pack(side=tk.LEFT, padx=5)
-                tk.Button(device_frame, text="Delete", command=lambda d=device['name'], h=home: self.remove_device(h, d)).pack(side=tk.LEFT, padx=5)
-            
-            tk.Button(frame, text="Add Device", command=lambda h=home: self.add_device(h)).pack(pady=2)
-            tk.Button(frame, text="Remove Home", command=lambda h=home: self.remove_home(h)).pack(pady=2)
+            self.build_home(home)
         
         tk.Button(self.root, text="Add Home", command=self.add_home).pack(pady=10)
+        tk.Button(self.root, text="Undo", command=self.undo).pack(pady=2)
+        tk.Button(self.root, text="Redo", command=self.redo).pack(pady=2)
         tk.Button(self.root, text="Exit", command=self.save_and_exit).pack(pady=10)
     
-    def toggle_device(self, home, device_name):
-        home.toggle_device(device_name)
-        self.create_main_screen()
+    def build_home(self, home):
+        frame = tk.LabelFrame(self.home_frame, text=home.name, padx=10, pady=10)
+        frame.pack(fill=tk.X, padx=5, pady=5)
+        view = {"frame": frame, "rows": {}}
+        self._home_views[home] = view
+        
+        for device in home.devices:
+            view["rows"][device['id']] = self.build_device_row(frame, home, device)
+        
+        view["add_button"] = tk.Button(frame, text="Add Device", command=lambda h=home: self.add_device(h))
+        view["add_button"].pack(pady=2)
+        tk.Button(frame, text="Remove Home", command=lambda h=home: self.remove_home(h)).pack(pady=2)
     
-    def edit_device_popup(self, home, device_name):
-        home.edit_device(device_name)
-        self.create_main_screen()
+    def build_device_row(self, frame, home, device, before=None):
+        device_frame = tk.Frame(frame)
+        device_frame.pack(fill=tk.X, before=before)
+        label = tk.Label(device_frame, text=f"{device['name']}: {device['status']}")
+        label.pack(side=tk.LEFT)
+        tk.Button(device_frame, text="Toggle", command=lambda d=device['id'], h=home: self.toggle_device(h, d)).pack(side=tk.LEFT, padx=5)
+        tk.Button(device_frame, text="Edit", command=lambda d=device['id'], h=home: self.edit_device_popup(h, d)).pack(side=tk.LEFT, padx=5)
+        tk.Button(device_frame, text="Delete", command=lambda d=device['id'], h=home: self.remove_device(h, d)).pack(side=tk.LEFT, padx=5)
+        return device_frame, label
     
-    def remove_device(self, home, device_name):
-        home.remove_device(device_name)
-        self.create_main_screen()
+    def invalidate(self, home, device_id=None):
+        # Record what changed and repaint once when Tk is next idle, however many changes arrive first
+        self._dirty.add((home, device_id))
+        if not self._repaint_pending:
+            self._repaint_pending = True
+            self.root.after_idle(self.repaint)
+    
+    def repaint(self):
+        self._repaint_pending = False
+        dirty, self._dirty = self._dirty, set()
+        removed, self._removed_homes = self._removed_homes, set()
+        for home, device_id in dirty:
+            if device_id is not None:
+                continue
+            if home in removed:
+                if home in self._home_views:
+                    self._home_views.pop(home)["frame"].destroy()
+            elif home not in self._home_views:
+                self.build_home(home)
+        
+        for home, device_id in dirty:
+            view = self._home_views.get(home)
+            if device_id is None or view is None:
+                continue
+            row = view["rows"].get(device_id)
+            if not home.has_device(device_id):
+                if row is not None:
+                    view["rows"].pop(device_id)[0].destroy()
+                continue
+            device = home.get_device(device_id)
+            if row is None:
+                view["rows"][device_id] = self.build_device_row(view["frame"], home, device, before=view["add_button"])
+            else:
+                row[1].config(text=f"{device['name']}: {device['status']}")
+    
+    def toggle_device(self, home, device_id):
+        self.commands.toggle((home, device_id))
+    
+    def edit_device_popup(self, home, device_id):
+        device_name = home.get_device(device_id)['name']
+        new_status = simpledialog.askstring("Edit Device", f"Set new value for {device_name}:")
+        if new_status:
+            self.commands.set_option((home, device_id), new_status)
+    
+    def apply_commands(self, commands):
+        for command in commands:
+            home, device_id = command.key
+            if not home.has_device(device_id):
+                continue
+            # Toggles and edits both set the status, so each device ends on one resolved status
+            if command.has_option:
+                status = command.option
+                if command.toggled_after:
+                    status = "on" if status == "off" else "off"
+                home.set_device_status(device_id, status)
+                self.store.edit_device(home, device_id, status)
+            elif command.toggle:
+                home.toggle_device(device_id)
+                self.store.toggle_device(home, device_id)
+            self.invalidate(home, device_id)
+        self.history.commit()
+    
+    def remove_device(self, home, device_id):
+        self.commands.flush()
+        home.remove_device(device_id)
+        self.store.remove_device(home, device_id)
+        self.invalidate(home, device_id)
+        self.history.commit()
     
     def add_home(self):
         name = simpledialog.askstring("Add Home", "Enter home name:")
         if name:
-            self.homes.append(SmartHome(name))
-            self.create_main_screen()
+            home = SmartHome(name)
+            self.homes.append(home)
+            self.store.add_home(home)
+            self.history.add_home(home)
+            self.history.commit()
+            self.audit.add_home(home)
+            self.invalidate(home)
     
     def remove_home(self, home):
+        self.commands.flush()
         self.homes.remove(home)
-        self.create_main_screen()
+        self.store.remove_home(home)
+        self.history.remove_home(home)
+        self.history.commit()
+        self.audit.remove_home(home)
+        self._removed_homes.add(home)
+        self.invalidate(home)
+    
+    def undo(self):
+        self.commands.flush()
+        self.restore(self.history.undo())
+    
+    def redo(self):
+        self.commands.flush()
+        self.restore(self.history.redo())
+    
+    def restore(self, changes):
+        # The history has already put the homes back; the store and the widgets follow it here
+        if changes is None:
+            return
+        added, removed, devices = changes
+        for home in removed:
+            self.store.remove_home(home)
+            self.audit.remove_home(home)
+            self._removed_homes.add(home)
+            self.invalidate(home)
+        for home in added:
+            # Back under its own id and in its old place, which the history has put it in
+            position = self.homes.index(home)
+            self.store.restore_home(home, self.homes[position + 1] if position + 1 < len(self.homes) else None)
+            self.audit.add_home(home)
+            self._removed_homes.discard(home)
+            self.invalidate(home)
+        for home, device_id, before, after in devices:
+            if home not in added:
+                if after is None:
+                    self.store.remove_device(home, device_id)
+                elif before is None or before[0] != after[0]:
+                    if before is not None:
+                        self.store.remove_device(home, device_id)
+                    self.store.add_device(home, home.get_device(device_id))
+                else:
+                    self.store.edit_device(home, device_id, after[1])
+            self.invalidate(home, device_id)
     
     def add_device(self, home):
         device_popup = tk.Toplevel(self.root)
@@ -101,9 +213,12 @@ class SmartHomesApp:
         def confirm():
             selected_device = device_type.get()
             if selected_device:
-                home.add_device({"name": selected_device, "status": "off"})
+                device = {"name": selected_device, "status": "off"}
+                device_id = home.add_device(device)
+                self.store.add_device(home, device)
+                self.history.commit()
                 device_popup.destroy()
-                self.create_main_screen()
+                self.invalidate(home, device_id)
         
         tk.Button(device_popup, text="Add", command=confirm).pack()
     
@@ -111,20 +226,43 @@ class SmartHomesApp:
         for widget in self.root.winfo_children():
             widget.destroy()
     
-    def load_homes(self):
-        try:
-            with open("homes.json", "r") as file:
-                data = json.load(file)
-                self.homes = [SmartHome.from_dict(home) for home in data]
-        except FileNotFoundError:
-            self.homes = []
+    def load_homes(self, first_screen=50):
+        # Enough homes for the first screen load up front; the rest stream in between Tk events
+        # Loaded devices are not changes, so nothing is published while homes stream in
+        self._loader = self.store.iter_load(SmartHome.from_dict)
+        with self.bus.suppress():
+            for _ in itertools.islice(self._loader, first_screen):
+                pass
+        self.homes = self.store.homes
+        self.root.after(1, self.load_more)
+    
+    def load_more(self, batch=200):
+        if self._loader is None:
+            return
+        for _ in range(batch):
+            with self.bus.suppress():
+                home = next(self._loader, None)
+            if home is None:
+                self._loader = None
+                return
+            self.history.track(home)
+            self.audit.track(home)
+            self.invalidate(home)
+        self.root.after(1, self.load_more)
     
     def save_and_exit(self):
-        with open("homes.json", "w") as file:
-            json.dump([home.to_dict() for home in self.homes], file)
+        if self._loader is not None:
+            with self.bus.suppress():
+                for _ in self._loader:
+                    pass
+            self._loader = None
+        self.commands.flush()
+        self.store.close()
+        self.audit.close()
         self.root.quit()
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = SmartHomesApp(root)
-    root.mainloop()
\ No newline at end of file
+    with profile_session():
+        root = tk.Tk()
+        app = SmartHomesApp(root)
+        root.mainloop()
\ No newline at end of file
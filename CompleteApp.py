@@ -1,23 +1,41 @@
 import tkinter as tk
 from tkinter import simpledialog, messagebox
+from virtualList import VirtualDeviceList
+from deviceCommands import CommandExecutor, LocalTransport, TkBridge
+from commandBuffer import CommandBuffer
+from changeBus import ChangeBus, DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED, OPTION_CHANGED
+from instrumentation import profile_session
 
 # Task 1: Base SmartDevice class
 class SmartDevice:
-    def __init__(self, name, option_value, option_range, default_value):
-        if option_value not in option_range:
-            raise ValueError(f"{name} option value must be within {option_range}.")
-        self.name = name
+    # Name, range, default and status label are per type and live on the class
+    name = "Device"
+    label = "Value"
+    option_range = range(0, 101)
+    default_value = 0
+    bus = None
+
+    def __init__(self, option_value=None):
+        if option_value is None:
+            option_value = self.default_value
+        if option_value not in self.option_range:
+            raise ValueError(f"{self.name} option value must be within {self.option_range}.")
         self._switched_on = False
         self._option_value = option_value
-        self._option_range = option_range
-        self._default_value = default_value
+        self._text = None
     
     def toggle_switch(self):
         self._switched_on = not self._switched_on
+        self._text = None
+        if self.bus is not None:
+            self.bus.publish(SWITCH_CHANGED, self, not self._switched_on, self._switched_on)
     
     def __str__(self):
-        state = "on" if self._switched_on else "off"
-        return f"{self.name}: {state}, {self.get_status()}"
+        # Cached until the state or value changes, so redrawing unchanged rows is a lookup
+        if self._text is None:
+            state = "on" if self._switched_on else "off"
+            self._text = f"{self.name}: {state}, {self.get_status()}"
+        return self._text
     
     @property
     def option_value(self):
@@ -25,31 +43,35 @@ class SmartDevice:
     
     @option_value.setter
     def option_value(self, value):
-        if value not in self._option_range:
-            raise ValueError(f"{self.name} option value must be within {self._option_range}.")
+        if value not in self.option_range:
+            raise ValueError(f"{self.name} option value must be within {self.option_range}.")
+        old = self._option_value
         self._option_value = value
+        self._text = None
+        if self.bus is not None:
+            self.bus.publish(OPTION_CHANGED, self, old, value)
     
     def get_status(self):
-        return f"Value: {self._option_value}"  # Override in subclasses
+        return f"{self.label}: {self._option_value}"
 
 # Task 2: SmartDevice subclasses
 class SmartLight(SmartDevice):
-    def __init__(self, brightness=50):
-        super().__init__("Light", brightness, range(0, 101), 50)
-    def get_status(self):
-        return f"Brightness: {self.option_value}"
+    name = "Light"
+    label = "Brightness"
+    option_range = range(0, 101)
+    default_value = 50
 
 class SmartFridge(SmartDevice):
-    def __init__(self, temperature=3):
-        super().__init__("Fridge", temperature, {1, 3, 5}, 3)
-    def get_status(self):
-        return f"Temperature: {self.option_value}"
+    name = "Fridge"
+    label = "Temperature"
+    option_range = {1, 3, 5}
+    default_value = 3
 
 class SmartPlug(SmartDevice):
-    def __init__(self, consumption=45):
-        super().__init__("Plug", consumption, range(0, 101), 45)
-    def get_status(self):
-        return f"Consumption: {self.option_value}"
+    name = "Plug"
+    label = "Consumption"
+    option_range = range(0, 101)
+    default_value = 45
 
 # Task 3-5: GUI Implementation
 class SmartHomeGUI:
@@ -57,6 +79,18 @@ class SmartHomeGUI:
         self.root = root
         self.root.title("Smart Home Automation")
         self.devices = []
+        # Device commands are queued asynchronously but applied on the Tk thread via the bridge, so
+        # a device's cached text is never cleared while the list is drawing it
+        self.bridge = TkBridge(root)
+        self.executor = CommandExecutor(LocalTransport(dispatch=self.bridge.call), max_concurrency=1024,
+                                        dispatch=self.bridge.call)
+        self.commands = CommandBuffer(self.send_commands, window=0.1,
+                                      schedule=lambda delay, flush: self.root.after(int(delay * 1000), flush),
+                                      cancel=self.root.after_cancel)
+        # The bus hands device diffs to the Tk thread in batches
+        self.bus = ChangeBus(schedule=self.bridge.call)
+        SmartDevice.bus = self.bus
+        self.bus.subscribe(self.on_changes)
         
         self.control_frame = tk.Frame(root, bg="lightgray", padx=10, pady=10)
         self.control_frame.pack(fill=tk.BOTH, expand=True)
@@ -67,8 +101,14 @@ class SmartHomeGUI:
         self.btn_turn_off_all = tk.Button(self.control_frame, text="Turn off all", command=self.turn_off_all)
         self.btn_turn_off_all.pack()
         
-        self.device_frame = tk.Frame(self.control_frame, bg="lightgray")
-        self.device_frame.pack(fill=tk.BOTH, expand=True)
+        self.device_list = VirtualDeviceList(
+            self.control_frame,
+            row_text=lambda i: str(self.devices[i]),
+            actions=[("Toggle", lambda i: self.toggle_device(self.devices[i])),
+                     ("Edit", lambda i: self.edit_device(self.devices[i])),
+                     ("Delete", lambda i: self.remove_device(self.devices[i]))],
+            bg="lightgray")
+        self.device_list.pack(fill=tk.BOTH, expand=True)
         
         self.btn_add = tk.Button(self.control_frame, text="Add", command=self.add_device)
         self.btn_add.pack()
@@ -78,59 +118,58 @@ class SmartHomeGUI:
     def add_device(self):
         name = simpledialog.askstring("Add Device", "Enter device type (Light, Fridge, Plug):")
         if name:
-            if name.lower() == "light":
-                self.devices.append(SmartLight())
-            elif name.lower() == "fridge":
-                self.devices.append(SmartFridge())
-            elif name.lower() == "plug":
-                self.devices.append(SmartPlug())
+            device_classes = {"light": SmartLight, "fridge": SmartFridge, "plug": SmartPlug}
+            if name.lower() in device_classes:
+                device = device_classes[name.lower()]()
+                self.devices.append(device)
+                self.bus.publish(DEVICE_ADDED, device)
             else:
                 messagebox.showerror("Error", "Invalid device type!")
-            self.update_ui()
     
     def remove_device(self, device):
         self.devices.remove(device)
-        self.update_ui()
+        self.bus.publish(DEVICE_REMOVED, device)
     
     def toggle_device(self, device):
-        device.toggle_switch()
-        self.update_ui()
+        self.commands.toggle(id(device), device)
     
     def edit_device(self, device):
         new_value = simpledialog.askinteger("Edit Device", f"Enter new value for {device.name}:")
         if new_value is not None:
-            try:
-                device.option_value = new_value
-            except ValueError as e:
-                messagebox.showerror("Error", str(e))
-            self.update_ui()
+            self.commands.set_option(id(device), new_value, device)
+    
+    def send_commands(self, commands):
+        batch = []
+        for command in commands:
+            if command.toggle:
+                batch.append((command.target, "toggle", None))
+            if command.has_option:
+                batch.append((command.target, "option", command.option))
+        self.executor.submit_many(batch, callback=self.commands_done)
     
     def turn_on_all(self):
-        for device in self.devices:
-            device._switched_on = True
-        self.update_ui()
+        self.executor.submit_many([(device, "switch", True) for device in self.devices], callback=self.commands_done)
     
     def turn_off_all(self):
-        for device in self.devices:
-            device._switched_on = False
-        self.update_ui()
+        self.executor.submit_many([(device, "switch", False) for device in self.devices], callback=self.commands_done)
+    
+    def commands_done(self, futures):
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            messagebox.showerror("Error", f"{len(errors)} command(s) failed: {errors[0]}")
+    
+    def on_changes(self, changes):
+        if any(change.kind in (DEVICE_ADDED, DEVICE_REMOVED) for change in changes):
+            self.update_ui()
+            return
+        changed = {id(change.device) for change in changes}
+        self.device_list.redraw(lambda i: id(self.devices[i]) in changed)
     
     def update_ui(self):
-        for widget in self.device_frame.winfo_children():
-            widget.destroy()
-        
-        for device in self.devices:
-            row = tk.Frame(self.device_frame, bg="lightgray")
-            row.pack(fill=tk.X)
-            
-            lbl = tk.Label(row, text=str(device), bg="lightgray")
-            lbl.pack(side=tk.LEFT)
-            
-            tk.Button(row, text="Toggle", command=lambda d=device: self.toggle_device(d)).pack(side=tk.RIGHT)
-            tk.Button(row, text="Edit", command=lambda d=device: self.edit_device(d)).pack(side=tk.RIGHT)
-            tk.Button(row, text="Delete", command=lambda d=device: self.remove_device(d)).pack(side=tk.RIGHT)
+        self.device_list.refresh(len(self.devices))
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = SmartHomeGUI(root)
-    root.mainloop()
+    with profile_session():
+        root = tk.Tk()
+        app = SmartHomeGUI(root)
+        root.mainloop()
@@ -0,0 +1,482 @@
+import json
+import os
+import struct
+import time
+from bisect import bisect_right
+
+from changeBus import DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED, OPTION_CHANGED, ALL_SWITCHED
+from deviceFleet import DeviceFleet
+
+# Event kinds as stored, named after the HomeStore log ops
+ADD_HOME = 1
+REMOVE_HOME = 2
+ADD_DEVICE = 3
+REMOVE_DEVICE = 4
+SET_STATUS = 5
+SET_OPTION = 6
+EVENT_NAMES = {ADD_HOME: "add_home", REMOVE_HOME: "remove_home", ADD_DEVICE: "add_device",
+               REMOVE_DEVICE: "remove_device", SET_STATUS: "set_status", SET_OPTION: "set_option"}
+
+_HEADER = b"HAUDIT1\n"
+# kind, value tag, home, device, time in microseconds, value
+_RECORD = struct.Struct("<BBIIqq")
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STRING = range(6)
+_DOUBLE = struct.Struct("<d")
+_INT64 = struct.Struct("<q")
+
+def _status(value):
+    return value if isinstance(value, str) else ("on" if value else "off")
+
+def _describe(device):
+    # (name, status, option) for dict devices and device objects alike
+    if isinstance(device, dict):
+        return device["name"], device["status"], None
+    option = getattr(device, getattr(device, "_option_name", "option_value"), None)
+    return type(device).__name__, "on" if device._switched_on else "off", option
+
+def _apply(state, kind, home, device, value):
+    # state: home key -> [name, {device key: [name, status, option]}, next device key]. Device
+    # keys only count up, so a removed device's key never comes back for another device
+    entry = state.get(home)
+    if kind == SET_STATUS or kind == SET_OPTION:
+        target = entry[1].get(device) if entry is not None else None
+        if target is not None:
+            target[1 if kind == SET_STATUS else 2] = value
+    elif kind == ADD_DEVICE:
+        if entry is not None:
+            entry[1][device] = [value, "off", None]
+            if device >= entry[2]:
+                entry[2] = device + 1
+    elif kind == REMOVE_DEVICE:
+        if entry is not None:
+            entry[1].pop(device, None)
+    elif kind == ADD_HOME:
+        state[home] = [value, {}, 0]
+    elif kind == REMOVE_HOME:
+        state.pop(home, None)
+
+class AuditLog:
+    # Append-only history of every device mutation, fed from a ChangeBus. Events are fixed-size
+    # binary records with strings kept in a side table, so a replay is struct.iter_unpack over the
+    # file. Every checkpoint_every events the homes changed since the last checkpoint are written
+    # out whole; rebuilding a home at some time starts from the checkpoint before it and replays
+    # only the events that follow
+    def __init__(self, path="homes.audit", bus=None, checkpoint_every=10000, clock=time.time, sync=False):
+        self.path = path
+        self.strings_path = path + ".strings"
+        self.checkpoint_path = path + ".ckpt"
+        self.checkpoint_every = checkpoint_every
+        self.clock = clock
+        self.sync = sync
+        self._strings = []
+        self._string_ids = {}
+        self._checkpoints = []      # (time, seq) of every complete checkpoint
+        self._snapshots = {}        # home key -> ([seq], [offset in the checkpoint file])
+        self._state = {}
+        self._dirty = set()
+        self._keys = {}             # tracked home -> key
+        self._claimed = set()       # keys of the tracked homes
+        self._next_home = 0         # above every home key the log has used
+        self._owners = {}           # device object -> (home key, device key); dict devices carry ids
+        self._last_time = 0
+        self._open()
+        if bus is not None:
+            bus.subscribe(self.on_changes)
+
+    def __len__(self):
+        return self._seq
+
+    # Opening: load the string table and checkpoint index, then rebuild the live state from the
+    # last checkpoint. Torn tails from a crash are cut back to the last whole entry
+    def _open(self):
+        self._strings = self._read_lines(self.strings_path, json.loads)
+        self._string_ids = {text: index for index, text in enumerate(self._strings)}
+        self._checkpoint_size = self._read_checkpoints()
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as file:
+                file.write(_HEADER)
+        with open(self.path, "rb") as file:
+            if file.read(len(_HEADER)) != _HEADER:
+                raise ValueError(f"{self.path} is not an audit log.")
+        size = os.path.getsize(self.path) - len(_HEADER)
+        self._seq = size // _RECORD.size
+        if size % _RECORD.size:
+            os.truncate(self.path, len(_HEADER) + self._seq * _RECORD.size)
+        start = self._checkpoints[-1][1] if self._checkpoints else 0
+        self._checkpoint_seq = start
+        self._state = self._load_snapshots(self._snapshots, start)
+        self._dirty = self._replay(self._state, start)
+        self._next_home = max(self._next_home, max(self._state.keys() | self._dirty, default=-1) + 1)
+        if self._seq:
+            with open(self.path, "rb") as file:
+                file.seek(len(_HEADER) + (self._seq - 1) * _RECORD.size)
+                self._last_time = _RECORD.unpack(file.read(_RECORD.size))[4]
+        self._log = open(self.path, "ab")
+        self._strings_file = open(self.strings_path, "a")
+        self._checkpoint_file = open(self.checkpoint_path, "ab")
+
+    @staticmethod
+    def _read_lines(path, parse):
+        items = []
+        try:
+            with open(path, "rb") as file:
+                raw = file.read()
+        except FileNotFoundError:
+            return items
+        end = raw.rfind(b"\n") + 1
+        if end < len(raw):
+            os.truncate(path, end)
+        for line in raw[:end].splitlines():
+            items.append(parse(line))
+        return items
+
+    def _read_checkpoints(self):
+        # Snapshot lines only count once the marker line closing their checkpoint is on disk
+        offset = complete = 0
+        try:
+            file = open(self.checkpoint_path, "rb")
+        except FileNotFoundError:
+            return 0
+        with file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                if line.startswith(b'{"checkpoint"'):
+                    marker = json.loads(line)
+                    for home, position in marker["homes"]:
+                        seqs, offsets = self._snapshots.setdefault(home, ([], []))
+                        seqs.append(marker["checkpoint"])
+                        offsets.append(position)
+                    self._checkpoints.append((marker["time"], marker["checkpoint"]))
+                    self._next_home = marker.get("next_home", 0)
+                    complete = offset + len(line)
+                offset += len(line)
+        if complete < offset or offset < os.path.getsize(self.checkpoint_path):
+            os.truncate(self.checkpoint_path, complete)
+        return complete
+
+    # Recording
+    def _string(self, text):
+        index = self._string_ids.get(text)
+        if index is None:
+            index = self._string_ids[text] = len(self._strings)
+            self._strings.append(text)
+            # Written ahead of any record that refers to it
+            self._strings_file.write(json.dumps(text) + "\n")
+            self._strings_file.flush()
+        return index
+
+    def _encode(self, value):
+        if value is None:
+            return _NONE, 0
+        if value is True or value is False:
+            return (_TRUE if value else _FALSE), 0
+        if type(value) is int and -(1 << 63) <= value < 1 << 63:
+            return _INT, value
+        if type(value) is float:
+            return _FLOAT, _INT64.unpack(_DOUBLE.pack(value))[0]
+        return _STRING, self._string(str(value))
+
+    def _append(self, kind, home, device, value):
+        now = max(int(self.clock() * 1e6), self._last_time)
+        self._last_time = now
+        tag, raw = self._encode(value)
+        self._log.write(_RECORD.pack(kind, tag, home, device, now, raw))
+        self._seq += 1
+        if kind == ADD_HOME and home >= self._next_home:
+            self._next_home = home + 1
+        _apply(self._state, kind, home, device, value)
+        self._dirty.add(home)
+        if self._seq - self._checkpoint_seq >= self.checkpoint_every:
+            self.checkpoint()
+
+    def _add_device(self, home, device_key, device):
+        name, status, option = _describe(device)
+        self._append(ADD_DEVICE, home, device_key, name)
+        if status != "off":
+            self._append(SET_STATUS, home, device_key, status)
+        if option is not None:
+            self._append(SET_OPTION, home, device_key, option)
+
+    def _owner(self, device, source, adding=False):
+        if isinstance(device, dict):
+            home = self._keys.get(source)
+            return None if home is None else (home, device["id"])
+        owner = self._owners.get(device)
+        if owner is None and adding:
+            home = self._keys.get(source)
+            if home is None:
+                return None
+            entry = self._state[home]
+            device_key = entry[2]
+            entry[2] = device_key + 1
+            owner = self._owners[device] = (home, device_key)
+        return owner
+
+    def track(self, home):
+        # Brings the log in line with a home as it stands, e.g. one just loaded from the store.
+        # Homes with a store id keep it as their key, so a reopened log picks up where it left off
+        key = self._keys.get(home)
+        if key is not None:
+            return key
+        if isinstance(getattr(home, "devices", None), DeviceFleet):
+            raise TypeError("Columnar homes address devices by position and cannot be audited.")
+        key = getattr(home, "home_id", None)
+        if key is None or key in self._claimed:
+            key = self._next_home
+        self._next_home = max(self._next_home, key + 1)
+        self._keys[home] = key
+        self._claimed.add(key)
+        name = getattr(home, "name", "")
+        known = self._state.get(key)
+        if known is None or known[0] != name:
+            if known is not None:
+                self._append(REMOVE_HOME, key, 0, None)
+            self._append(ADD_HOME, key, 0, name)
+            known = self._state[key]
+        devices = known[1]
+        seen = set()
+        for device in home.devices:
+            owner = self._owner(device, home, adding=True)
+            device_key = owner[1]
+            seen.add(device_key)
+            name, status, option = _describe(device)
+            entry = devices.get(device_key)
+            if entry is None or entry[0] != name:
+                if entry is not None:
+                    self._append(REMOVE_DEVICE, key, device_key, None)
+                self._add_device(key, device_key, device)
+                continue
+            if entry[1] != status:
+                self._append(SET_STATUS, key, device_key, status)
+            if entry[2] != option:
+                self._append(SET_OPTION, key, device_key, option)
+        for device_key in [device_key for device_key in devices if device_key not in seen]:
+            self._append(REMOVE_DEVICE, key, device_key, None)
+        return key
+
+    def add_home(self, home):
+        return self.track(home)
+
+    def remove_home(self, home):
+        key = self._keys.pop(home, None)
+        if key is None:
+            return
+        self._claimed.discard(key)
+        for device in home.devices:
+            if not isinstance(device, dict):
+                self._owners.pop(device, None)
+        if key in self._state:
+            self._append(REMOVE_HOME, key, 0, None)
+
+    def on_changes(self, changes):
+        for change in changes:
+            kind = change.kind
+            if kind == ALL_SWITCHED:
+                status = _status(change.new)
+                for device in change.devices:
+                    owner = self._owner(device, change.source)
+                    if owner is not None:
+                        self._append(SET_STATUS, owner[0], owner[1], status)
+                continue
+            owner = self._owner(change.device, change.source, kind == DEVICE_ADDED)
+            if owner is None:
+                continue
+            home, device_key = owner
+            if kind == SWITCH_CHANGED:
+                self._append(SET_STATUS, home, device_key, _status(change.new))
+            elif kind == OPTION_CHANGED:
+                self._append(SET_OPTION, home, device_key, change.new)
+            elif kind == DEVICE_ADDED:
+                self._add_device(home, device_key, change.device)
+            elif kind == DEVICE_REMOVED:
+                self._append(REMOVE_DEVICE, home, device_key, None)
+                if not isinstance(change.device, dict):
+                    self._owners.pop(change.device, None)
+
+    # Checkpoints: one JSON line per home changed since the last one (or a tombstone for a removed
+    # home), then a marker line that lists them and makes the checkpoint count
+    def checkpoint(self):
+        if not self._dirty:
+            return
+        self._log.flush()
+        offset = self._checkpoint_size
+        lines = []
+        written = []
+        for home in sorted(self._dirty):
+            entry = self._state.get(home)
+            record = {"home": home, "seq": self._seq}
+            if entry is None:
+                record["removed"] = True
+            else:
+                record["name"] = entry[0]
+                record["devices"] = [[device_key, *device] for device_key, device in entry[1].items()]
+                record["next_device"] = entry[2]
+            line = (json.dumps(record) + "\n").encode()
+            written.append([home, offset])
+            lines.append(line)
+            offset += len(line)
+        marker = (json.dumps({"checkpoint": self._seq, "time": self._last_time, "homes": written,
+                              "next_home": self._next_home}) + "\n").encode()
+        lines.append(marker)
+        self._checkpoint_file.write(b"".join(lines))
+        self._checkpoint_file.flush()
+        if self.sync:
+            os.fsync(self._log.fileno())
+            os.fsync(self._checkpoint_file.fileno())
+        for home, position in written:
+            seqs, offsets = self._snapshots.setdefault(home, ([], []))
+            seqs.append(self._seq)
+            offsets.append(position)
+        self._checkpoints.append((self._last_time, self._seq))
+        self._checkpoint_size = offset + len(marker)
+        self._checkpoint_seq = self._seq
+        self._dirty = set()
+
+    def _load_snapshots(self, homes, seq):
+        # Each home's latest snapshot at or before seq, read in file order through one handle
+        positions = []
+        for home in homes:
+            seqs, offsets = self._snapshots.get(home, ((), ()))
+            index = bisect_right(seqs, seq) - 1
+            if index >= 0:
+                positions.append(offsets[index])
+        state = {}
+        if not positions:
+            return state
+        with open(self.checkpoint_path, "rb") as file:
+            for position in sorted(positions):
+                file.seek(position)
+                record = json.loads(file.readline())
+                if not record.get("removed"):
+                    devices = {device[0]: device[1:] for device in record["devices"]}
+                    # Checkpoints written before the counter was kept only know the live keys
+                    next_device = record.get("next_device", max(devices, default=-1) + 1)
+                    state[record["home"]] = [record["name"], devices, next_device]
+        return state
+
+    # Reading
+    def _replay(self, state, start, until=None, home=None):
+        # Applies records from seq start on, up to time until; returns the homes touched
+        touched = set()
+        strings = self._strings
+        size = _RECORD.size
+        with open(self.path, "rb") as file:
+            file.seek(len(_HEADER) + start * size)
+            while True:
+                chunk = file.read(size * 8192)
+                chunk = chunk[:len(chunk) - len(chunk) % size]
+                if not chunk:
+                    return touched
+                for kind, tag, home_key, device, stamp, raw in _RECORD.iter_unpack(chunk):
+                    if until is not None and stamp > until:
+                        return touched
+                    if home is not None and home_key != home:
+                        continue
+                    if tag == _STRING:
+                        value = strings[raw]
+                    elif tag == _INT:
+                        value = raw
+                    else:
+                        value = self._decode(tag, raw)
+                    _apply(state, kind, home_key, device, value)
+                    touched.add(home_key)
+
+    def _decode(self, tag, raw):
+        if tag == _NONE:
+            return None
+        if tag == _FALSE or tag == _TRUE:
+            return tag == _TRUE
+        if tag == _FLOAT:
+            return _DOUBLE.unpack(_INT64.pack(raw))[0]
+        return self._strings[raw] if tag == _STRING else raw
+
+    def _start(self, until):
+        # The seq of the last checkpoint at or before until
+        if until is None:
+            index = len(self._checkpoints) - 1
+        else:
+            index = bisect_right(self._checkpoints, (until, float("inf"))) - 1
+        return self._checkpoints[index][1] if index >= 0 else 0
+
+    @staticmethod
+    def _export(entry):
+        if entry is None:
+            return None
+        devices = []
+        for device_key, (name, status, option) in entry[1].items():
+            device = {"name": name, "status": status, "id": device_key}
+            if option is not None:
+                device["option"] = option
+            devices.append(device)
+        return {"name": entry[0], "devices": devices}
+
+    def _home_key(self, home):
+        return home if isinstance(home, int) else self._keys[home]
+
+    def _flush(self):
+        # Readers open the file themselves, so buffered records go out first
+        if self._log is not None:
+            self._log.flush()
+
+    def home_at(self, home, when=None):
+        # A home (tracked object or key) as it was at time when, in homes.json form; None if it
+        # did not exist then
+        self._flush()
+        key = self._home_key(home)
+        until = None if when is None else int(when * 1e6)
+        start = self._start(until)
+        state = self._load_snapshots((key,), start)
+        self._replay(state, start, until, key)
+        return self._export(state.get(key))
+
+    def homes_at(self, when=None):
+        # Every home that existed at time when: home key -> homes.json form
+        self._flush()
+        until = None if when is None else int(when * 1e6)
+        start = self._start(until)
+        state = self._load_snapshots(self._snapshots, start)
+        self._replay(state, start, until)
+        return {key: self._export(entry) for key, entry in sorted(state.items())}
+
+    def _seek_time(self, file, when):
+        # Records are in time order, so the first one at or after a time is a binary search away
+        low, high = 0, self._seq
+        while low < high:
+            middle = (low + high) // 2
+            file.seek(len(_HEADER) + middle * _RECORD.size)
+            if _RECORD.unpack(file.read(_RECORD.size))[4] < when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def events(self, since=None, until=None, home=None):
+        # (time, event name, home key, device key, value) in order, optionally for one home
+        self._flush()
+        key = None if home is None else self._home_key(home)
+        size = _RECORD.size
+        with open(self.path, "rb") as file:
+            first = 0 if since is None else self._seek_time(file, int(since * 1e6))
+            file.seek(len(_HEADER) + first * size)
+            stop = None if until is None else int(until * 1e6)
+            while True:
+                chunk = file.read(size * 8192)
+                chunk = chunk[:len(chunk) - len(chunk) % size]
+                if not chunk:
+                    return
+                for kind, tag, home_key, device, stamp, raw in _RECORD.iter_unpack(chunk):
+                    if stop is not None and stamp > stop:
+                        return
+                    if key is None or home_key == key:
+                        yield stamp / 1e6, EVENT_NAMES[kind], home_key, device, self._decode(tag, raw)
+
+    def close(self):
+        if self._log is None:
+            return
+        # A checkpoint on the way out keeps the next open's replay short
+        self.checkpoint()
+        self._log.close()
+        self._strings_file.close()
+        self._checkpoint_file.close()
+        self._log = None
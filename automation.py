@@ -0,0 +1,202 @@
+import operator
+import time
+
+from deviceCommands import apply_command
+
+SWITCH = "switched_on"
+OPTION = "option_value"
+
+_COMPARE = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+            "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+def _option(device):
+    return getattr(device, getattr(device, "_option_name", "option_value"))
+
+def _minutes_now():
+    now = time.localtime()
+    return now.tm_hour * 60 + now.tm_min
+
+# Conditions. Device conditions also act as triggers: a rule is indexed under the
+# (device, attribute) pairs it reads and is only evaluated when one of those changes
+class StateIs:
+    def __init__(self, device, on=True):
+        self.device = device
+        self.on = on
+        self.attribute = SWITCH
+
+    def __call__(self, engine):
+        return bool(self.device._switched_on) == self.on
+
+class OptionIs:
+    def __init__(self, device, op, value):
+        if op not in _COMPARE:
+            raise ValueError(f"Unknown comparison {op!r}; expected one of {sorted(_COMPARE)}.")
+        self.device = device
+        self.compare = _COMPARE[op]
+        self.value = value
+        self.attribute = OPTION
+
+    def __call__(self, engine):
+        return self.compare(_option(self.device), self.value)
+
+# Time conditions trigger at their edge, the minute of the day they become true
+class After:
+    device = None
+
+    def __init__(self, hour, minute=0):
+        self.minutes = hour * 60 + minute
+        self.edge = self.minutes
+
+    def __call__(self, engine):
+        return engine.clock() >= self.minutes
+
+class Before:
+    device = None
+    edge = 0
+
+    def __init__(self, hour, minute=0):
+        self.minutes = hour * 60 + minute
+
+    def __call__(self, engine):
+        return engine.clock() < self.minutes
+
+# Actions
+class Switch:
+    def __init__(self, device, on=True):
+        self.device = device
+        self.command = ("switch", on)
+
+class SetOption:
+    def __init__(self, device, value):
+        self.device = device
+        self.command = ("option", value)
+
+class Rule:
+    def __init__(self, name, conditions, actions):
+        self.name = name
+        self.conditions = list(conditions)
+        self.actions = list(actions)
+        self.fired = 0
+
+    def triggers(self):
+        return {(id(c.device), c.attribute) for c in self.conditions if c.device is not None}
+
+    def edges(self):
+        return {c.edge for c in self.conditions if getattr(c, "edge", None) is not None}
+
+class AutomationEngine:
+    def __init__(self, dispatch=None, clock=_minutes_now, max_cascade=8, scheduler=None):
+        self.dispatch = dispatch or self.apply_locally
+        self.clock = clock
+        self.max_cascade = max_cascade
+        # With a Scheduler, rules with time conditions are also evaluated when those turn true
+        self.scheduler = scheduler
+        self._index = {}
+        self._edges = {}            # minute of the day -> rules with a time condition turning true then
+        self._edge_timers = {}
+        self._pending = {}
+        self.evaluated = 0
+        self.failed = []
+
+    def add_rule(self, rule):
+        triggers = rule.triggers()
+        edges = rule.edges()
+        if not triggers and not edges:
+            raise ValueError(f"Rule {rule.name!r} needs at least one device or time condition to trigger it.")
+        for key in triggers:
+            self._index.setdefault(key, []).append(rule)
+        for edge in edges:
+            self._edges.setdefault(edge, []).append(rule)
+            if self.scheduler is not None and edge not in self._edge_timers:
+                self._edge_timers[edge] = self.scheduler.daily(edge // 60, edge % 60, edge, self._time_reached)
+        return rule
+
+    def remove_rule(self, rule):
+        for key in rule.triggers():
+            rules = self._index.get(key, [])
+            if rule in rules:
+                rules.remove(rule)
+            if not rules:
+                self._index.pop(key, None)
+        for edge in rule.edges():
+            rules = self._edges.get(edge, [])
+            if rule in rules:
+                rules.remove(rule)
+            if not rules:
+                self._edges.pop(edge, None)
+                timer = self._edge_timers.pop(edge, None)
+                if timer is not None:
+                    timer.cancel()
+
+    def _evaluate(self, rules):
+        for rule in rules:
+            self.evaluated += 1
+            if all(condition(self) for condition in rule.conditions):
+                rule.fired += 1
+                for action in rule.actions:
+                    # Later actions on the same device and command replace earlier ones in the batch
+                    self._pending[(id(action.device), action.command[0])] = (rule, action)
+
+    def notify(self, device, attribute):
+        # Only the rules that read this device attribute are looked at
+        self._evaluate(self._index.get((id(device), attribute), ()))
+
+    def time_reached(self, minutes):
+        # The rules whose time condition turns true at this minute of the day, e.g. from a timer
+        self._evaluate(list(self._edges.get(minutes, ())))
+        self.flush()
+
+    def _time_reached(self, edge, value=None):
+        # Scheduler callback: the device slot carries the edge
+        self.time_reached(edge)
+
+    def flush(self):
+        # Dispatch everything queued as one batch; changes the batch makes can trigger more rules
+        for _ in range(self.max_cascade):
+            if not self._pending:
+                return
+            batch = [action for _, action in self._pending.values()]
+            self._pending = {}
+            changed = self.dispatch(batch)
+            for device, attribute in changed or ():
+                self.notify(device, attribute)
+        if self._pending:
+            # Rules that keep re-triggering each other would otherwise run forever
+            rules = sorted({rule.name for rule, _ in self._pending.values()})
+            self._pending = {}
+            error = RuntimeError(f"Automation cascade stopped after {self.max_cascade} rounds; "
+                                 f"actions dropped from rules: {', '.join(rules)}")
+            error.rules = rules
+            raise error
+
+    def apply_locally(self, actions):
+        # One failing device does not stop the rest of the batch; failures are kept in failed
+        changed = []
+        for action in actions:
+            command, value = action.command
+            device = action.device
+            try:
+                if command == "switch":
+                    before = bool(device._switched_on)
+                    apply_command(device, command, value)
+                    if before != bool(device._switched_on):
+                        changed.append((device, SWITCH))
+                else:
+                    before = _option(device)
+                    apply_command(device, command, value)
+                    if before != _option(device):
+                        changed.append((device, OPTION))
+            except Exception as error:
+                self.failed.append((action, error))
+        return changed
+
+    # Convenience for callers that drive devices through the engine
+    def toggle(self, device):
+        device.toggle_switch()
+        self.notify(device, SWITCH)
+        self.flush()
+
+    def set_option(self, device, value):
+        apply_command(device, "option", value)
+        self.notify(device, OPTION)
+        self.flush()
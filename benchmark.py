@@ -0,0 +1,758 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from smartDevice import (SmartLight, SmartFridge, SmartHeater, SmartTV, SmartSpeaker,
+                         SmartDoorBell, SmartOven, SmartWashingMachine, SmartDoor, SmartAirFryer)
+from smart_plug import SmartPlug
+
+DEVICE_CLASSES = [SmartLight, SmartFridge, SmartHeater, SmartTV, SmartSpeaker, SmartDoorBell,
+                  SmartOven, SmartWashingMachine, SmartDoor, SmartAirFryer]
+
+def make_device(cls):
+    if cls is SmartPlug:
+        return SmartPlug(45)
+    return cls()
+
+class DictDevice:
+    # The device layout from before __slots__: an instance dict with the state, the value and a
+    # per-instance reference to the range and default
+    def __init__(self, option_value, option_range, default_value):
+        self._switched_on = False
+        self._option_value = option_value
+        self._option_range = option_range
+        self._default_value = default_value
+
+def _bytes_per_device(make, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    devices = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list itself holds one pointer per device; leave it out of the per-device figure
+    return (after - before - devices.__sizeof__()) / count
+
+def bench_device_memory(count):
+    print(f"{'class':<22}{'dict bytes':>12}{'slots bytes':>13}{'saved':>8}")
+    for cls in DEVICE_CLASSES + [SmartPlug]:
+        option = getattr(make_device(cls), cls._option_name)
+        baseline = _bytes_per_device(lambda: DictDevice(option, cls._option_range, cls._default_value), count)
+        slotted = _bytes_per_device(lambda: make_device(cls), count)
+        print(f"{cls.__name__:<22}{baseline:>12.1f}{slotted:>13.1f}{1 - slotted / baseline:>8.0%}")
+
+def _per_op(func, args):
+    start = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+def bench_device_index(sizes, ops):
+    from homeModel import SmartHome as DictHome, DEVICE_TYPES
+    rng = random.Random(0)
+    print(f"{'devices':>8}{'lookup us':>12}{'toggle us':>12}{'edit us':>12}{'remove us':>12}")
+    for size in sizes:
+        home = DictHome("bench")
+        for i in range(size):
+            home.add_device({"name": DEVICE_TYPES[i % len(DEVICE_TYPES)], "status": "off"})
+        ids = [rng.randrange(size) for _ in range(ops)]
+        names = [rng.choice(DEVICE_TYPES) for _ in range(ops)]
+        lookup = _per_op(home.find_device, names)
+        toggle = _per_op(home.toggle_device, ids)
+        edit = _per_op(lambda device_id: home.set_device_status(device_id, "on"), ids)
+        victims = rng.sample(range(size), min(ops, size))
+        remove = _per_op(home.remove_device, victims)
+        print(f"{size:>8}{lookup:>12.2f}{toggle:>12.2f}{edit:>12.2f}{remove:>12.2f}")
+
+def write_homes_file(path, homes, devices_per_home):
+    # Written one home at a time so the parent stays small; children inherit its peak RSS
+    names = ["Light", "Fridge", "Plug", "Heater", "TV", "Speaker"]
+    with open(path, "w") as file:
+        file.write("[")
+        for i in range(homes):
+            if i:
+                file.write(", ")
+            json.dump({"name": f"home {i}",
+                       "devices": [{"name": names[j % len(names)], "status": "off", "id": j}
+                                   for j in range(devices_per_home)],
+                       "id": i}, file)
+        file.write("]")
+
+def load_child(mode, path):
+    # Runs in a fresh interpreter so ru_maxrss only reflects this one load
+    from homeModel import SmartHome as DictHome
+    from homeStream import iter_homes
+    start = time.perf_counter()
+    first = None
+    if mode == "json":
+        with open(path) as file:
+            homes = [DictHome.from_dict(data) for data in json.load(file)]
+        first = time.perf_counter() - start
+        count = len(homes)
+    elif mode == "stream":
+        count = 0
+        for home in iter_homes(path, DictHome.from_dict):
+            if first is None:
+                first = time.perf_counter() - start
+            count += 1
+    else:
+        # Challenge1 itself, from the directory holding the file as its homes.json: first is the
+        # first screen drawn by Tk, total is when the background load has every home
+        import tkinter as tk
+        try:
+            root = tk.Tk()
+        except tk.TclError:
+            print(json.dumps({"first": None, "total": None, "peak_kb": None, "homes": 0}))
+            return
+        os.chdir(os.path.dirname(path))
+        from Challenge1 import SmartHomesApp
+        app = SmartHomesApp(root)
+        root.update()
+        first = time.perf_counter() - start
+        while app._loader is not None:
+            app.load_more()
+        root.update()
+        count = len(app.homes)
+        app.save_and_exit()
+        root.destroy()
+    total = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"first": first, "total": total, "peak_kb": peak_kb, "homes": count}))
+
+def bench_stream_load(sizes, devices_per_home):
+    # "app" rows time Challenge1 to its first painted screen, the others to the first home parsed
+    print(f"{'homes':>8}{'MB':>8}{'mode':>8}{'first ms':>10}{'total s':>10}{'peak RSS MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            os.mkdir(os.path.join(tmp, str(size)))
+            path = os.path.join(tmp, str(size), "homes.json")
+            write_homes_file(path, size, devices_per_home)
+            megabytes = os.path.getsize(path) / 1e6
+            for mode in ("json", "stream", "app"):
+                out = subprocess.run([sys.executable, __file__, "_load-child", mode, path],
+                                     capture_output=True, text=True, check=True).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                if result["first"] is None:
+                    print(f"{size:>8}{megabytes:>8.1f}{mode:>8}{'no display':>12}")
+                    continue
+                print(f"{size:>8}{megabytes:>8.1f}{mode:>8}{result['first'] * 1e3:>10.2f}"
+                      f"{result['total']:>10.2f}{result['peak_kb'] / 1024:>13.1f}")
+
+def bench_snapshot(sizes, devices_per_home, lookups):
+    from homeModel import SmartHome as DictHome
+    from homeSnapshot import HomeSnapshot, json_to_snapshot
+    rng = random.Random(0)
+    print(f"{'homes':>8}{'format':>8}{'MB':>8}{'full load s':>13}{'one home ms':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            json_path = os.path.join(tmp, f"homes_{size}.json")
+            snapshot_path = os.path.join(tmp, f"homes_{size}.shb")
+            write_homes_file(json_path, size, devices_per_home)
+            json_to_snapshot(json_path, snapshot_path)
+            picks = [rng.randrange(size) for _ in range(lookups)]
+
+            start = time.perf_counter()
+            with open(json_path) as file:
+                homes = [DictHome.from_dict(data) for data in json.load(file)]
+            full_json = time.perf_counter() - start
+            del homes
+            # JSON has no way to reach one home without parsing the whole file
+            one_json = full_json
+
+            start = time.perf_counter()
+            with HomeSnapshot(snapshot_path) as snapshot:
+                homes = [snapshot.home(i, DictHome.from_dict) for i in range(len(snapshot))]
+            full_snapshot = time.perf_counter() - start
+            del homes
+
+            start = time.perf_counter()
+            for index in picks:
+                with HomeSnapshot(snapshot_path) as snapshot:
+                    snapshot.home(index, DictHome.from_dict)
+            one_snapshot = (time.perf_counter() - start) / lookups
+
+            for name, path, full, one in (("json", json_path, full_json, one_json),
+                                          ("binary", snapshot_path, full_snapshot, one_snapshot)):
+                print(f"{size:>8}{name:>8}{os.path.getsize(path) / 1e6:>8.1f}{full:>13.3f}{one * 1e3:>13.3f}")
+
+def bench_automation(rules, devices, events):
+    from automation import AutomationEngine, Rule, StateIs, OptionIs, After, SetOption, Switch
+    rng = random.Random(0)
+    lights = [SmartLight() for _ in range(devices)]
+    doors = [SmartDoor() for _ in range(devices)]
+    engine = AutomationEngine(clock=lambda: 23 * 60)
+    for i in range(rules):
+        door, light = rng.choice(doors), rng.choice(lights)
+        engine.add_rule(Rule(f"rule {i}", [OptionIs(door, "==", False), After(22)],
+                             [SetOption(light, rng.randrange(1, 101)), Switch(light, True)]))
+    picks = [rng.choice(doors) for _ in range(events)]
+    start = time.perf_counter()
+    for door in picks:
+        engine.set_option(door, not door.option_value)
+    elapsed = time.perf_counter() - start
+    print(f"{rules} rules, {devices} doors/lights, {events} events")
+    print(f"{events / elapsed:,.0f} events/s, {engine.evaluated / events:.1f} rules evaluated per event "
+          f"(a full scan would evaluate {rules})")
+
+def bench_shards(worker_counts, homes, devices_per_home, ops, batch):
+    from shardedHomes import ShardedHomes
+    rng = random.Random(0)
+    names = ["Light", "Fridge", "Plug", "Heater", "TV", "Speaker"]
+    print(f"{os.cpu_count()} CPUs, {homes} homes x {devices_per_home} devices, {ops} toggles in batches of {batch}")
+    print(f"{'workers':>8}{'toggles/s':>12}{'all off ms':>12}")
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp, ShardedHomes(tmp, workers) as fleet:
+            keys = [fleet.add_home(f"home {i}") for i in range(homes)]
+            fleet.execute([("add_device", key, {"name": names[j % len(names)], "status": "off"})
+                           for key in keys for j in range(devices_per_home)])
+            commands = [("toggle_device", rng.choice(keys), rng.randrange(devices_per_home)) for _ in range(ops)]
+            start = time.perf_counter()
+            for i in range(0, ops, batch):
+                fleet.execute(commands[i:i + batch])
+            toggles = ops / (time.perf_counter() - start)
+            fleet.turn_all_on()
+            start = time.perf_counter()
+            fleet.turn_all_off()
+            all_off = time.perf_counter() - start
+        print(f"{workers:>8}{toggles:>12,.0f}{all_off * 1e3:>12.1f}")
+
+def bench_render(count, redraws):
+    devices = [make_device(DEVICE_CLASSES[i % len(DEVICE_CLASSES)]) for i in range(count)]
+
+    def rebuilt(device):
+        # What __str__ did before display strings were cached
+        state = "on" if device._switched_on else "off"
+        return f"{device.__class__.__name__} is {state} with {device._option_value}"
+
+    # The baseline only means something while it builds the very string __str__ serves
+    mismatched = [device for device in devices if rebuilt(device) != str(device)]
+    if mismatched:
+        raise SystemExit(f"rebuilt baseline differs from __str__: {rebuilt(mismatched[0])!r} != {str(mismatched[0])!r}")
+
+    def redraw(render):
+        start = time.perf_counter()
+        for _ in range(redraws):
+            for device in devices:
+                render(device)
+        return (time.perf_counter() - start) / (redraws * count) * 1e9
+
+    str_ns = redraw(lambda device: device.__str__())
+    rebuilt_ns = redraw(rebuilt)
+    # Every device changed since the last redraw: each string is built once, then served from cache
+    for device in devices:
+        device.toggle_switch()
+    start = time.perf_counter()
+    for device in devices:
+        device.__str__()
+    changed_ns = (time.perf_counter() - start) / count * 1e9
+    print(f"{count} devices, {redraws} redraws")
+    print(f"{'rebuild every redraw':<28}{rebuilt_ns:>8.1f} ns/device")
+    print(f"{'cached, unchanged':<28}{str_ns:>8.1f} ns/device")
+    print(f"{'changed, rebuilt once':<28}{changed_ns:>8.1f} ns/device")
+
+def bench_batch(count, repeat):
+    from changeBus import ChangeBus
+    from smartDevice import set_bus
+    from smartHome import SmartHome
+    deliveries = [0]
+    bus = ChangeBus()
+    bus.subscribe(lambda changes: deliveries.__setitem__(0, deliveries[0] + 1))
+    set_bus(bus)
+    home = SmartHome()
+    for i in range(count):
+        home.add_device(make_device(DEVICE_CLASSES[i % len(DEVICE_CLASSES)]))
+    def scene(value):
+        return [(SmartLight, "option", value), (SmartLight, "switch", True), (SmartDoor, "option", True),
+                (SmartFridge, "option", 3), (SmartHeater, "switch", False)]
+
+    def individually(value):
+        # The scene as separate calls: every device validates and notifies on its own
+        for index, device in enumerate(home.devices):
+            if isinstance(device, SmartLight):
+                device.option_value = value
+                if not device._switched_on:
+                    device.toggle_switch()
+            elif isinstance(device, SmartDoor):
+                device.option_value = True
+            elif isinstance(device, SmartFridge):
+                device.option_value = 3
+            elif isinstance(device, SmartHeater) and device._switched_on:
+                device.toggle_switch()
+
+    print(f"{count} devices, scene touches {sum(isinstance(d, (SmartLight, SmartDoor, SmartFridge, SmartHeater)) for d in home.devices)}")
+    print(f"{'mode':<14}{'ms/scene':>10}{'deliveries':>12}")
+    for name, run in (("individual", individually),
+                      ("apply", lambda value: home.apply(scene(value)))):
+        best = float("inf")
+        for i in range(repeat):
+            # Alternate the brightness so every run changes something
+            home.switch_all_off()
+            deliveries[0] = 0
+            start = time.perf_counter()
+            run(30 + i % 2)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:<14}{best * 1e3:>10.2f}{deliveries[0]:>12}")
+    set_bus(None)
+
+def bench_scheduler(timers, devices, horizon):
+    from scheduler import Scheduler
+    rng = random.Random(0)
+    now = [0.0]
+    scheduler = Scheduler(clock=lambda: now[0])
+    ovens = [SmartOven() for _ in range(devices)]
+    delays = [rng.uniform(1, horizon) for _ in range(timers)]
+    commands = [(rng.choice(ovens), "switch", rng.random() < 0.5) for _ in range(timers)]
+
+    start = time.perf_counter()
+    handles = [scheduler.call_later(delay, *command) for delay, command in zip(delays, commands)]
+    insert = time.perf_counter() - start
+
+    victims = rng.sample(handles, timers // 10)
+    start = time.perf_counter()
+    for timer in victims:
+        timer.cancel()
+    cancel = time.perf_counter() - start
+
+    # Headless: step the clock a minute at a time until everything has fired
+    start = time.perf_counter()
+    while now[0] < horizon + 60:
+        now[0] += 60
+        scheduler.advance()
+    fire = time.perf_counter() - start
+    print(f"{timers} timers over {horizon / 3600:.0f} h on {devices} devices, {len(victims)} cancelled")
+    print(f"insert  {insert / timers * 1e6:8.2f} us/timer")
+    print(f"cancel  {cancel / len(victims) * 1e6:8.2f} us/timer")
+    print(f"fire    {fire / scheduler.fired * 1e6:8.2f} us/timer  ({scheduler.fired} fired, {len(scheduler)} left)")
+
+def bench_query(homes, devices_per_home, repeat, mutations):
+    from changeBus import ChangeBus
+    from deviceIndex import DeviceIndex, describe
+    from smartDevice import set_bus
+    from smartHome import SmartHome
+    rng = random.Random(0)
+    bus = ChangeBus()
+    set_bus(bus)
+    index = DeviceIndex()
+    unsubscribe = bus.subscribe(index.on_changes)
+    fleet = []
+    for _ in range(homes):
+        home = SmartHome()
+        for i in range(devices_per_home):
+            cls = (DEVICE_CLASSES + [SmartPlug])[rng.randrange(len(DEVICE_CLASSES) + 1)]
+            home.add_device(make_device(cls))
+            if rng.random() < 0.3:
+                home.toggle_device(i)
+            if cls is SmartLight:
+                home.get_device(i).option_value = rng.randrange(1, 101)
+            elif cls is SmartFridge:
+                home.get_device(i).option_value = rng.choice((1, 3, 5))
+        fleet.append(home)
+
+    def scan(name, on=None, option=None, low=None, high=None):
+        # What a dashboard does without the index: every device of every home
+        found = []
+        for home in fleet:
+            for device in home.devices:
+                device_name, device_on, device_option = describe(device)
+                if (device_name == name and (on is None or device_on == on)
+                        and (option is None or device_option == option)
+                        and (low is None or low <= device_option <= high)):
+                    found.append(device)
+        return found
+
+    queries = [("plugs on", dict(name="SmartPlug", on=True)),
+               ("fridges at 5", dict(name="SmartFridge", option=5)),
+               ("lights 20..30", dict(name="SmartLight", low=20, high=30))]
+    print(f"{homes} homes x {devices_per_home} devices, {len(index)} indexed")
+    print(f"{'query':<16}{'results':>9}{'scan ms':>10}{'index ms':>10}")
+    for label, spec in queries:
+        timings = []
+        for run in (lambda: scan(**spec),
+                    lambda: index.query(spec["name"], spec.get("on"), spec.get("option"), spec.get("low"), spec.get("high"))):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                found = run()
+                best = min(best, time.perf_counter() - start)
+            timings.append((best, len(found)))
+        assert timings[0][1] == timings[1][1]
+        print(f"{label:<16}{timings[1][1]:>9}{timings[0][0] * 1e3:>10.3f}{timings[1][0] * 1e3:>10.3f}")
+
+    # Upkeep: the same mutations with the index subscribed, then without it
+    picks = [(rng.choice(fleet), rng.randrange(devices_per_home)) for _ in range(mutations)]
+    lights = [(home, i) for home, i in picks if isinstance(home.get_device(i), SmartLight)]
+    for label in ("with index", "without index"):
+        if label == "without index":
+            unsubscribe()
+        start = time.perf_counter()
+        for home, i in picks:
+            home.toggle_device(i)
+        for home, i in lights:
+            home.get_device(i).option_value = rng.randrange(1, 101)
+        elapsed = time.perf_counter() - start
+        print(f"mutations {label:<14}{elapsed / (len(picks) + len(lights)) * 1e6:>8.2f} us/op")
+    set_bus(None)
+
+def bench_history(sizes, steps, jumps):
+    import copy
+    from changeBus import ChangeBus
+    from homeHistory import HomeHistory
+    from homeModel import SmartHome as DictHome, DEVICE_TYPES
+    rng = random.Random(0)
+    print(f"{'devices':>9}{'deepcopy KB/step':>18}{'history B/step':>16}{'commit us':>11}{'jump ms':>9}")
+    for size in sizes:
+        bus = ChangeBus()
+        DictHome.bus = bus
+        homes = []
+        for h in range(10):
+            home = DictHome(f"home {h}")
+            for i in range(size // 10):
+                home.add_device({"name": DEVICE_TYPES[i % len(DEVICE_TYPES)], "status": "off"})
+            homes.append(home)
+        # What a naive undo would keep per step
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        copied = copy.deepcopy([home.to_dict() for home in homes])
+        naive = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del copied
+
+        history = HomeHistory(homes, bus, limit=steps)
+        picks = [(rng.choice(homes), rng.randrange(size // 10)) for _ in range(steps)]
+
+        def record(picks):
+            for home, device_id in picks:
+                # One step: a device toggled (or put back if it was removed) and, now and then, one removed
+                if home.has_device(device_id):
+                    home.toggle_device(device_id)
+                else:
+                    home.add_device({"name": "Light", "status": "on", "id": device_id})
+                if device_id % 8 == 0 and home.has_device(device_id + 1):
+                    home.remove_device(device_id + 1)
+                history.commit()
+        # Half the steps timed, the other half under tracemalloc for their memory
+        half = steps // 2
+        start = time.perf_counter()
+        record(picks[:half])
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        record(picks[half:])
+        per_step = (tracemalloc.get_traced_memory()[0] - before) / (steps - half)
+        tracemalloc.stop()
+
+        targets = [rng.randrange(len(history)) for _ in range(jumps)]
+        start = time.perf_counter()
+        for position in targets:
+            history.goto(position)
+        jump = (time.perf_counter() - start) / jumps
+        print(f"{size:>9}{naive / 1024:>18.1f}{per_step:>16.0f}{elapsed / half * 1e6:>11.2f}{jump * 1e3:>9.2f}")
+    DictHome.bus = None
+
+def bench_audit(events, homes, devices_per_home, checkpoint_every, lookups):
+    from auditLog import AuditLog
+    from changeBus import ChangeBus
+    from homeModel import SmartHome as DictHome, DEVICE_TYPES
+    rng = random.Random(0)
+    workload = [(rng.randrange(homes), rng.randrange(devices_per_home), rng.random() < 0.8) for _ in range(events)]
+    print(f"{events} events over {homes} homes x {devices_per_home} devices")
+    print(f"{'checkpoints':>12}{'append us':>11}{'B/event':>9}{'replay ev/s':>14}{'latest ms':>11}"
+          f"{'home at ms':>12}{'all homes at ms':>17}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for every in (events + 1, checkpoint_every):
+            bus = ChangeBus()
+            DictHome.bus = bus
+            now = [0.0]
+            fleet = []
+            for h in range(homes):
+                home = DictHome(f"home {h}")
+                for i in range(devices_per_home):
+                    home.add_device({"name": DEVICE_TYPES[i % len(DEVICE_TYPES)], "status": "off"})
+                fleet.append(home)
+            path = os.path.join(tmp, f"audit-{every}")
+            log = AuditLog(path, bus, checkpoint_every=every, clock=lambda: now[0])
+            for home in fleet:
+                log.track(home)
+            start = time.perf_counter()
+            for h, device_id, toggle in workload:
+                now[0] += 0.001
+                if toggle:
+                    fleet[h].toggle_device(device_id)
+                else:
+                    fleet[h].set_device_status(device_id, "standby")
+            append = (time.perf_counter() - start) / events
+
+            # Every event decoded from the first, the state now (a full replay without checkpoints)
+            # and point-in-time lookups spread over the run
+            start = time.perf_counter()
+            for _ in log.events():
+                pass
+            replay = len(log) / (time.perf_counter() - start)
+            per_event = (os.path.getsize(path) + os.path.getsize(path + ".strings")) / len(log)
+            start = time.perf_counter()
+            log.homes_at()
+            latest = time.perf_counter() - start
+            times = [rng.uniform(0, now[0]) for _ in range(lookups)]
+            start = time.perf_counter()
+            for when in times:
+                log.home_at(rng.randrange(homes), when)
+            home_at = (time.perf_counter() - start) / lookups
+            start = time.perf_counter()
+            for when in times[:max(1, lookups // 10)]:
+                log.homes_at(when)
+            homes_at = (time.perf_counter() - start) / max(1, lookups // 10)
+            log.close()
+            label = "none" if every > events else f"every {every}"
+            print(f"{label:>12}{append * 1e6:>11.2f}{per_event:>9.1f}{replay:>14,.0f}{latest * 1e3:>11.1f}"
+                  f"{home_at * 1e3:>12.2f}{homes_at * 1e3:>17.2f}")
+    DictHome.bus = None
+
+def _suite_cases(size, tmp):
+    # name -> (setup, run, ops): setup builds fresh state for every repeat, only run is timed
+    from homeModel import SmartHome as DictHome, DEVICE_TYPES
+    from smartHome import SmartHome
+    rng = random.Random(size)
+    cases = {}
+    for cls in DEVICE_CLASSES + [SmartPlug]:
+        cases[f"construct.{cls.__name__}"] = (lambda: None, lambda _, cls=cls: [make_device(cls) for _ in range(size)], size)
+
+    def lights():
+        return [SmartLight() for _ in range(size)], [rng.randrange(1, 101) for _ in range(size)]
+
+    def set_options(state):
+        for device, value in zip(*state):
+            device.option_value = value
+    cases["device.validate"] = (lights, set_options, size)
+
+    def home():
+        home = SmartHome()
+        for i in range(size):
+            home.add_device(make_device(DEVICE_CLASSES[i % len(DEVICE_CLASSES)]))
+        return home, [rng.randrange(size) for _ in range(size)]
+
+    def switch_all(state):
+        state[0].switch_all_on()
+        state[0].switch_all_off()
+    cases["home.switch_all"] = (home, switch_all, 2)
+    cases["home.get_device"] = (home, lambda state: list(map(state[0].get_device, state[1])), size)
+    cases["home.toggle_device"] = (home, lambda state: list(map(state[0].toggle_device, state[1])), size)
+
+    def dict_home():
+        home = DictHome("bench")
+        for i in range(size):
+            home.add_device({"name": DEVICE_TYPES[i % len(DEVICE_TYPES)], "status": "off"})
+        return home, rng.sample(range(size), min(size, 1_000))
+    cases["challenge1.remove_device"] = (dict_home, lambda state: list(map(state[0].remove_device, state[1])),
+                                         min(size, 1_000))
+
+    path = os.path.join(tmp, f"homes_{size}.json")
+    homes = max(1, size // 10)
+    write_homes_file(path, homes, 10)
+
+    def save(state):
+        with open(path + ".out", "w") as file:
+            json.dump([home.to_dict() for home in state], file)
+    def load(_):
+        with open(path) as file:
+            return [DictHome.from_dict(data) for data in json.load(file)]
+    cases["json.load"] = (lambda: None, load, homes * 10)
+    cases["json.save"] = (lambda: load(None), save, homes * 10)
+    return cases
+
+def bench_suite(sizes, repeat, save, compare, threshold):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for name, (setup, run, ops) in _suite_cases(size, tmp).items():
+                best = float("inf")
+                for _ in range(repeat):
+                    state = setup()
+                    start = time.perf_counter()
+                    run(state)
+                    best = min(best, time.perf_counter() - start)
+                results[f"{name}[{size}]"] = best / ops
+
+    baseline = {}
+    if compare:
+        with open(compare) as file:
+            baseline = json.load(file)["results"]
+    regressions = []
+    print(f"{'case':<40}{'us/op':>12}{'baseline':>12}{'change':>9}")
+    for case, seconds in results.items():
+        line = f"{case:<40}{seconds * 1e6:>12.3f}"
+        if case in baseline:
+            change = seconds / baseline[case] - 1
+            line += f"{baseline[case] * 1e6:>12.3f}{change:>+9.1%}"
+            if change > threshold:
+                regressions.append(case)
+                line += "  REGRESSION"
+        print(line)
+    if save:
+        with open(save, "w") as file:
+            json.dump({"python": sys.version.split()[0], "repeat": repeat, "results": results}, file, indent=1)
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {threshold:.0%}")
+        return 1
+    return 0
+
+APP_SCRIPTS = {"Challenge": "SmartHomesApp", "Challenge1": "SmartHomesApp", "CompleteApp": "SmartHomeGUI",
+               "smartHomeApp": "SmartHomeApp", "smartHomeApp1": "SmartHomeGUI", "smartHomeAutomation": "build"}
+MODEL_MODULES = ["smartDevice", "smart_plug", "smartHome", "homeModel", "homeStore", "deviceFleet"]
+
+# Run with -c in a fresh interpreter so nothing benchmark.py imports is already cached
+STARTUP_CHILD = """
+import contextlib, importlib, io, json, sys, time
+module_name, entry = sys.argv[1:3]
+printed = io.StringIO()
+start = time.perf_counter()
+with contextlib.redirect_stdout(printed):
+    module = importlib.import_module(module_name)
+imported = time.perf_counter() - start
+window = None
+if entry:
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        root = None
+    if root is not None:
+        getattr(module, entry)(root)
+        root.update()
+        window = time.perf_counter() - start
+        root.destroy()
+print(json.dumps({"import": imported, "window": window, "printed": len(printed.getvalue())}))
+"""
+
+def bench_startup(repeat):
+    print(f"{'module':<22}{'import ms':>11}{'first window ms':>17}{'printed chars':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for module_name in MODEL_MODULES + list(APP_SCRIPTS):
+            runs = []
+            for _ in range(repeat):
+                # Run from an empty directory so apps start without a homes.json
+                out = subprocess.run([sys.executable, "-c", STARTUP_CHILD, module_name, APP_SCRIPTS.get(module_name, "")],
+                                     capture_output=True, text=True, check=True, cwd=tmp,
+                                     env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))).stdout
+                runs.append(json.loads(out.strip().splitlines()[-1]))
+            imported = min(run["import"] for run in runs)
+            windows = [run["window"] for run in runs if run["window"] is not None]
+            window = f"{min(windows) * 1e3:.1f}" if windows else "no display"
+            print(f"{module_name:<22}{imported * 1e3:>11.1f}{window:>17}{runs[0]['printed']:>15}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart home benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    memory = commands.add_parser("memory", help="bytes per device for each device class")
+    memory.add_argument("--count", type=int, default=100_000)
+
+    index = commands.add_parser("device-index", help="per-operation latency of homeModel.SmartHome")
+    index.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000])
+    index.add_argument("--ops", type=int, default=1_000)
+
+    stream = commands.add_parser("stream-load", help="json.load vs streaming homes.json reader and Challenge1 time to first paint")
+    stream.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    stream.add_argument("--devices", type=int, default=10)
+
+    snapshot = commands.add_parser("snapshot", help="homes.json vs binary snapshot size and load time")
+    snapshot.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    snapshot.add_argument("--devices", type=int, default=10)
+    snapshot.add_argument("--lookups", type=int, default=100)
+
+    automation = commands.add_parser("automation", help="rule engine throughput with indexed triggers")
+    automation.add_argument("--rules", type=int, default=10_000)
+    automation.add_argument("--devices", type=int, default=1_000)
+    automation.add_argument("--events", type=int, default=100_000)
+
+    shards = commands.add_parser("shards", help="sharded home manager throughput by worker count")
+    shards.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    shards.add_argument("--homes", type=int, default=2_000)
+    shards.add_argument("--devices", type=int, default=10)
+    shards.add_argument("--ops", type=int, default=200_000)
+    shards.add_argument("--batch", type=int, default=5_000)
+
+    render = commands.add_parser("render", help="cost of building device display strings on redraw")
+    render.add_argument("--count", type=int, default=100_000)
+    render.add_argument("--redraws", type=int, default=20)
+
+    batch = commands.add_parser("batch", help="SmartHome.apply scene vs individual device calls")
+    batch.add_argument("--count", type=int, default=100_000)
+    batch.add_argument("--repeat", type=int, default=5)
+
+    timers = commands.add_parser("scheduler", help="timing wheel insert, cancel and fire cost")
+    timers.add_argument("--timers", type=int, default=1_000_000)
+    timers.add_argument("--devices", type=int, default=1_000)
+    timers.add_argument("--horizon", type=float, default=86400.0, help="seconds ahead to spread timers over")
+
+    query = commands.add_parser("query", help="indexed device queries vs scanning every home")
+    query.add_argument("--homes", type=int, default=1_000)
+    query.add_argument("--devices", type=int, default=100, help="devices per home")
+    query.add_argument("--repeat", type=int, default=5)
+    query.add_argument("--mutations", type=int, default=100_000)
+
+    history = commands.add_parser("history", help="undo history memory per step and time to jump between steps")
+    history.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="devices across 10 homes")
+    history.add_argument("--steps", type=int, default=10_000)
+    history.add_argument("--jumps", type=int, default=100)
+
+    audit = commands.add_parser("audit", help="audit log append cost, replay rate and point-in-time lookups")
+    audit.add_argument("--events", type=int, default=1_000_000)
+    audit.add_argument("--homes", type=int, default=100)
+    audit.add_argument("--devices", type=int, default=100, help="devices per home")
+    audit.add_argument("--checkpoint-every", type=int, default=10_000)
+    audit.add_argument("--lookups", type=int, default=100)
+
+    suite = commands.add_parser("suite", help="regression suite over device, home and persistence operations")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    suite.add_argument("--repeat", type=int, default=5)
+    suite.add_argument("--save", metavar="BASELINE", help="write results to this JSON file")
+    suite.add_argument("--compare", metavar="BASELINE", help="fail if slower than this saved run")
+    suite.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, e.g. 0.25 for 25%%")
+
+    startup = commands.add_parser("startup", help="import time and time to first window of each app script")
+    startup.add_argument("--repeat", type=int, default=5)
+
+    child = commands.add_parser("_load-child")
+    child.add_argument("mode", choices=["json", "stream", "app"])
+    child.add_argument("path")
+
+    args = parser.parse_args()
+    if args.command == "memory":
+        bench_device_memory(args.count)
+    elif args.command == "device-index":
+        bench_device_index(args.sizes, args.ops)
+    elif args.command == "stream-load":
+        bench_stream_load(args.sizes, args.devices)
+    elif args.command == "snapshot":
+        bench_snapshot(args.sizes, args.devices, args.lookups)
+    elif args.command == "automation":
+        bench_automation(args.rules, args.devices, args.events)
+    elif args.command == "shards":
+        bench_shards(args.workers, args.homes, args.devices, args.ops, args.batch)
+    elif args.command == "render":
+        bench_render(args.count, args.redraws)
+    elif args.command == "batch":
+        bench_batch(args.count, args.repeat)
+    elif args.command == "scheduler":
+        bench_scheduler(args.timers, args.devices, args.horizon)
+    elif args.command == "query":
+        bench_query(args.homes, args.devices, args.repeat, args.mutations)
+    elif args.command == "history":
+        bench_history(args.sizes, args.steps, args.jumps)
+    elif args.command == "audit":
+        bench_audit(args.events, args.homes, args.devices, args.checkpoint_every, args.lookups)
+    elif args.command == "suite":
+        sys.exit(bench_suite(args.sizes, args.repeat, args.save, args.compare, args.threshold))
+    elif args.command == "startup":
+        bench_startup(args.repeat)
+    elif args.command == "_load-child":
+        load_child(args.mode, args.path)
+
+if __name__ == "__main__":
+    main()
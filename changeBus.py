@@ -0,0 +1,107 @@
+import itertools
+import threading
+from contextlib import contextmanager
+
+DEVICE_ADDED = "device_added"
+DEVICE_REMOVED = "device_removed"
+SWITCH_CHANGED = "switch_changed"
+OPTION_CHANGED = "option_changed"
+# One event for a bulk switch; devices lists everything it changed
+ALL_SWITCHED = "all_switched"
+
+# Changes to one device attribute that collapse into a single old -> new diff
+_DIFFS = (SWITCH_CHANGED, OPTION_CHANGED)
+
+class Change:
+    __slots__ = ("kind", "device", "old", "new", "devices", "source")
+
+    def __init__(self, kind, device=None, old=None, new=None, devices=(), source=None):
+        self.kind = kind
+        self.device = device
+        self.old = old
+        self.new = new
+        self.devices = devices
+        # The home (or other container) that made the change, when there is one
+        self.source = source
+
+    def __repr__(self):
+        return f"Change({self.kind}, {self.device}, {self.old!r} -> {self.new!r})"
+
+class ChangeBus:
+    # Publishers report what changed; subscribers get lists of changes. Inside batch(), or while a
+    # scheduled delivery is pending, repeated changes to one device attribute merge into one diff
+    # and changes that end where they started are dropped
+    def __init__(self, schedule=None):
+        # schedule(flush) defers delivery, e.g. to the Tk mainloop; without it delivery is immediate
+        self.schedule = schedule
+        self._subscribers = []
+        self._pending = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._depth = 0
+        # Per thread: suppressing on the UI thread must not drop what a worker thread publishes
+        self._local = threading.local()
+        self._scheduled = False
+
+    def subscribe(self, callback, kinds=None):
+        entry = (callback, frozenset(kinds) if kinds else None)
+        self._subscribers.append(entry)
+        return lambda: self._subscribers.remove(entry)
+
+    def publish(self, kind, device=None, old=None, new=None, devices=(), source=None):
+        if getattr(self._local, "suppressed", 0):
+            return
+        with self._lock:
+            if kind in _DIFFS:
+                key = (kind, device if device.__hash__ else id(device))
+                change = self._pending.get(key)
+                if change is None:
+                    self._pending[key] = Change(kind, device, old, new, source=source)
+                else:
+                    change.new = new
+            else:
+                self._pending[(kind, next(self._sequence))] = Change(kind, device, old, new, devices, source)
+        self._deliver()
+
+    def _deliver(self):
+        if self._depth:
+            return
+        if self.schedule is None:
+            self.flush()
+            return
+        with self._lock:
+            if self._scheduled or not self._pending:
+                return
+            self._scheduled = True
+        self.schedule(self.flush)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+        changes = [change for change in pending.values() if change.kind not in _DIFFS or change.old != change.new]
+        if not changes:
+            return
+        for callback, kinds in list(self._subscribers):
+            selected = changes if kinds is None else [change for change in changes if change.kind in kinds]
+            if selected:
+                callback(selected)
+
+    @contextmanager
+    def batch(self):
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            self._deliver()
+
+    @contextmanager
+    def suppress(self):
+        # For callers that publish one aggregated event in place of the per-device ones
+        local = self._local
+        local.suppressed = getattr(local, "suppressed", 0) + 1
+        try:
+            yield self
+        finally:
+            local.suppressed -= 1
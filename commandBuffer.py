@@ -0,0 +1,69 @@
+from collections import namedtuple
+
+# Net effect of everything buffered for one key: toggle is the parity of the toggles seen,
+# option is the last value written (only meaningful when has_option is set) and toggled_after is
+# the parity of the toggles that came after that write. Targets whose switch and option are
+# separate apply toggle and option in either order; when a toggle and an option write change the
+# same field, the result is option followed by toggled_after
+NetCommand = namedtuple("NetCommand", ["key", "target", "toggle", "has_option", "option", "toggled_after"])
+
+class CommandBuffer:
+    def __init__(self, flush, window=0.05, schedule=None, cancel=None):
+        # schedule(delay, callback) returns a handle that cancel(handle) revokes
+        self.flush_callback = flush
+        self.window = window
+        self.schedule = schedule
+        self.cancel = cancel
+        self._pending = {}
+        self._scheduled = False
+        self._handle = None
+        self.submitted = 0
+        self.flushed = 0
+        self.elided = 0
+
+    def toggle(self, key, target=None):
+        entry = self._entry(key, target)
+        entry[1] = not entry[1]
+        entry[4] = not entry[4]
+
+    def set_option(self, key, value, target=None):
+        entry = self._entry(key, target)
+        entry[2] = True
+        entry[3] = value
+        entry[4] = False
+
+    def _entry(self, key, target):
+        self.submitted += 1
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = [target, False, False, None, False]
+        if not self._scheduled and self.schedule is not None:
+            self._scheduled = True
+            self._handle = self.schedule(self.window, self._expired)
+        return entry
+
+    def _expired(self):
+        self._handle = None
+        self.flush()
+
+    def flush(self):
+        # Called by hand, e.g. before a removal, the timer for this window is no longer needed
+        if self._handle is not None and self.cancel is not None:
+            self.cancel(self._handle)
+        self._handle = None
+        self._scheduled = False
+        pending, self._pending = self._pending, {}
+        commands = [NetCommand(key, target, toggle, has_option, option, toggled_after)
+                    for key, (target, toggle, has_option, option, toggled_after) in pending.items()
+                    if toggle or has_option]
+        submitted = self.submitted - self.flushed - self.elided
+        sent = sum(command.toggle + command.has_option for command in commands)
+        self.flushed += sent
+        self.elided += submitted - sent
+        if commands:
+            self.flush_callback(commands)
+        return commands
+
+    def stats(self):
+        return {"submitted": self.submitted, "flushed": self.flushed, "elided": self.elided,
+                "pending": len(self._pending)}
@@ -0,0 +1,14 @@
+# Fixtures shared by the tests; pytest.ini puts the repository root on sys.path so they import
+# the modules directly, wherever pytest is started
+import pytest
+
+from changeBus import ChangeBus
+from smartDevice import set_bus
+
+@pytest.fixture
+def bus():
+    # A bus every device class publishes on, detached again afterwards
+    bus = ChangeBus()
+    set_bus(bus)
+    yield bus
+    set_bus(None)
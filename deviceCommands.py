@@ -0,0 +1,171 @@
+import asyncio
+import concurrent.futures
+import queue
+import random
+import threading
+
+def apply_command(device, command, value=None):
+    if command == "toggle":
+        device.toggle_switch()
+    elif command == "switch":
+        if bool(device._switched_on) != bool(value):
+            device.toggle_switch()
+    elif command == "option":
+        setattr(device, getattr(device, "_option_name", "option_value"), value)
+    else:
+        raise ValueError(f"Unknown device command: {command}")
+    return device
+
+class Transport:
+    async def send(self, device, command, value=None):
+        raise NotImplementedError
+
+class SimulatedTransport(Transport):
+    # Stands in for the network: waits a round-trip, may drop the command, then applies it locally
+    def __init__(self, latency=0.05, jitter=0.02, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    async def send(self, device, command, value=None):
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < self.failure_rate:
+            raise ConnectionError(f"{device} did not acknowledge {command}")
+        return apply_command(device, command, value)
+
+class LocalTransport(Transport):
+    # Devices in this process: a command applies as soon as its turn comes, with no round-trip.
+    # With a dispatch (e.g. TkBridge.call) the command runs on the thread that owns the devices
+    def __init__(self, dispatch=None):
+        self.dispatch = dispatch
+
+    async def send(self, device, command, value=None):
+        if self.dispatch is None:
+            return apply_command(device, command, value)
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                future.set_result(apply_command(device, command, value))
+            except Exception as error:
+                future.set_exception(error)
+
+        self.dispatch(run)
+        return await asyncio.wrap_future(future)
+
+class CommandExecutor:
+    def __init__(self, transport, max_concurrency=64, timeout=2.0, retries=2, retry_delay=0.05,
+                 dispatch=None):
+        self.transport = transport
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self._queues = {}
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop.run_forever()
+
+    def submit(self, device, command, value=None, callback=None):
+        future = concurrent.futures.Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: self.dispatch(callback, f))
+        self._loop.call_soon_threadsafe(self._enqueue, device, command, value, future)
+        return future
+
+    def submit_many(self, commands, callback=None):
+        # Fan out every command at once and report back when the last one settles
+        futures = [self.submit(device, command, value) for device, command, value in commands]
+        done = concurrent.futures.Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def settle(_):
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                done.set_result(futures)
+
+        if callback is not None:
+            done.add_done_callback(lambda f: self.dispatch(callback, f.result()))
+        if not futures:
+            done.set_result(futures)
+        for future in futures:
+            future.add_done_callback(settle)
+        return done
+
+    def _enqueue(self, device, command, value, future):
+        # Commands for one device run in order; different devices run concurrently. Fleet views
+        # are new objects on each access but hash and compare by device, so they share a queue
+        key = device if device.__hash__ is not None else id(device)
+        pending = self._queues.get(key)
+        if pending is None:
+            pending = self._queues[key] = asyncio.Queue()
+            self._loop.create_task(self._drain(key, pending))
+        pending.put_nowait((device, command, value, future))
+
+    async def _drain(self, key, pending):
+        while not pending.empty():
+            await self._execute(*pending.get_nowait())
+        del self._queues[key]
+
+    async def _execute(self, device, command, value, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        error = None
+        if command == "toggle":
+            # A timed-out toggle may still have reached the device, so a retry could flip it back.
+            # Sending the state it should end in makes every attempt safe to repeat; commands for
+            # one device run in order, so the current state is the one the toggle applies to
+            command, value = "switch", not device._switched_on
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    result = await asyncio.wait_for(self.transport.send(device, command, value), self.timeout)
+                except (asyncio.TimeoutError, ConnectionError) as e:
+                    error = e
+                    if attempt < self.retries:
+                        await asyncio.sleep(self.retry_delay * 2 ** attempt)
+                except Exception as e:
+                    future.set_exception(e)
+                    return
+                else:
+                    future.set_result(result)
+                    return
+        future.set_exception(error)
+
+    def shutdown(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+class TkBridge:
+    # Tk may only be touched from the mainloop thread, so results are queued here and drained by after()
+    def __init__(self, root, poll_ms=20):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._calls = queue.Queue()
+        self.root.after(self.poll_ms, self._drain)
+
+    def call(self, func, *args):
+        self._calls.put((func, args))
+
+    def _drain(self):
+        # A callback that raises must not stop the polling, or no later result reaches the UI
+        try:
+            while True:
+                try:
+                    func, args = self._calls.get_nowait()
+                except queue.Empty:
+                    break
+                func(*args)
+        finally:
+            self.root.after(self.poll_ms, self._drain)
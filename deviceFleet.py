@@ -0,0 +1,244 @@
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+from smartDevice import Interval
+from smart_plug import SmartPlug
+from changeBus import SWITCH_CHANGED, OPTION_CHANGED
+
+_FLIP = bytes(i ^ 1 for i in range(256))
+
+class DeviceType:
+    def __init__(self, device):
+        cls = type(device)
+        self.cls = cls
+        self.name = cls.__name__
+        self.option_range = option_range = device._option_range
+        self.option_name = cls._option_name
+        self.range_error = device._range_error
+        # Numeric ranges are stored as-is, sets are stored as an index into their sorted choices
+        if isinstance(option_range, (range, Interval)):
+            self.choices = None
+            self.codes = None
+            # The option column holds doubles; integer ranges read back as ints
+            self.whole = isinstance(option_range, range)
+        else:
+            self.whole = False
+            self.choices = tuple(sorted(option_range))
+            self.codes = {value: code for code, value in enumerate(self.choices)}
+
+    # Read from the class on each call rather than kept, so a validator patched in later (e.g. by
+    # instrumentation) is the one used
+    @property
+    def validate(self):
+        return self.cls._validate
+
+    def encode(self, value):
+        if not self.validate(value):
+            raise ValueError(self.range_error)
+        if self.choices is None:
+            return value
+        return self.codes[value]
+
+    def decode(self, code):
+        if self.choices is None:
+            return int(code) if self.whole or code.is_integer() else code
+        return self.choices[int(code)]
+
+    def format(self, switched_on, value):
+        return self.cls._type.format(switched_on, value)
+
+class DeviceView:
+    __slots__ = ("_fleet", "_index", "_id")
+
+    def __init__(self, fleet, index):
+        self._fleet = fleet
+        self._index = index
+        self._id = fleet._ids[index]
+
+    # A view follows its device rather than its position: removals shift the slots after them,
+    # so a view whose slot moved finds it again by the device's id
+    def _slot(self):
+        index = self._index
+        ids = self._fleet._ids
+        if index < len(ids) and ids[index] == self._id:
+            return index
+        index = bisect_left(ids, self._id)
+        if index == len(ids) or ids[index] != self._id:
+            raise IndexError("Device was removed from the fleet.")
+        self._index = index
+        return index
+
+    # Views are created on demand, so two views of one device count as the same device
+    def __eq__(self, other):
+        return isinstance(other, DeviceView) and other._fleet is self._fleet and other._id == self._id
+
+    def __hash__(self):
+        return hash((id(self._fleet), self._id))
+
+    @property
+    def _switched_on(self):
+        return bool(self._fleet._switched_on[self._slot()])
+
+    @_switched_on.setter
+    def _switched_on(self, value):
+        self._fleet._switched_on[self._slot()] = 1 if value else 0
+
+    @property
+    def device_type(self):
+        return self._fleet._types[self._fleet._type_ids[self._slot()]]
+
+    @property
+    def _validate(self):
+        return self.device_type.validate
+
+    @property
+    def _range_error(self):
+        return self.device_type.range_error
+
+    def toggle_switch(self):
+        self._fleet._switched_on[self._slot()] ^= 1
+        bus = self.device_type.cls.bus
+        if bus is not None:
+            on = self._switched_on
+            bus.publish(SWITCH_CHANGED, self, not on, on)
+
+    @property
+    def option_value(self):
+        return self.device_type.decode(self._fleet._options[self._slot()])
+
+    @option_value.setter
+    def option_value(self, value):
+        device_type = self.device_type
+        code = device_type.encode(value)
+        bus = device_type.cls.bus
+        if bus is not None:
+            old = self.option_value
+        self._fleet._options[self._slot()] = code
+        if bus is not None:
+            bus.publish(OPTION_CHANGED, self, old, value)
+
+    @property
+    def consumption_rate(self):
+        if self.device_type.cls is not SmartPlug:
+            raise AttributeError("consumption_rate")
+        return self.option_value
+
+    @consumption_rate.setter
+    def consumption_rate(self, value):
+        if self.device_type.cls is not SmartPlug:
+            raise AttributeError("consumption_rate")
+        self.option_value = value
+
+    def _store_option(self, value):
+        self.option_value = value
+
+    def __str__(self):
+        return self.device_type.format(self._switched_on, self.option_value)
+
+class DeviceFleet:
+    def __init__(self, devices=()):
+        self._types = []
+        self._type_lookup = {}
+        self._type_ids = array("B")
+        self._switched_on = bytearray()
+        self._options = array("d")
+        # Per-slot device ids, never reused and so always ascending, that views are keyed by
+        self._ids = array("Q")
+        self._next_id = 0
+        self.extend(devices)
+
+    def _device_type(self, device):
+        cls = type(device)
+        type_id = self._type_lookup.get(cls)
+        if type_id is None:
+            device_type = DeviceType(device)
+            type_id = len(self._types)
+            self._types.append(device_type)
+            self._type_lookup[cls] = type_id
+        return type_id
+
+    def append(self, device):
+        type_id = self._device_type(device)
+        device_type = self._types[type_id]
+        code = device_type.encode(getattr(device, device_type.option_name))
+        self._type_ids.append(type_id)
+        self._switched_on.append(1 if device._switched_on else 0)
+        self._options.append(code)
+        self._ids.append(self._next_id)
+        self._next_id += 1
+
+    def extend(self, devices):
+        for device in devices:
+            self.append(device)
+
+    def __len__(self):
+        return len(self._switched_on)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Invalid device index.")
+        return DeviceView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield DeviceView(self, index)
+
+    def pop(self, index):
+        device = self.to_device(index)
+        del self._type_ids[index]
+        del self._switched_on[index]
+        del self._options[index]
+        del self._ids[index]
+        return device
+
+    def _check(self, indices):
+        indices = list(indices)
+        if indices and (min(indices) < 0 or max(indices) >= len(self)):
+            raise IndexError("Invalid device index.")
+        return indices
+
+    def get_devices(self, indices):
+        # One bounds check for the whole selection instead of one per view
+        indices = self._check(indices)
+        return list(map(DeviceView, [self] * len(indices), indices))
+
+    def toggle(self, indices=None):
+        if indices is None:
+            self._switched_on = self._switched_on.translate(_FLIP)
+            return
+        switched_on = self._switched_on
+        for index in indices:
+            switched_on[index] ^= 1
+
+    def switch_all(self, on):
+        self._switched_on[:] = (b"\x01" if on else b"\x00") * len(self._switched_on)
+
+    def count_on(self):
+        return self._switched_on.count(1)
+
+    def states(self, indices=None):
+        if indices is None:
+            return bytes(self._switched_on)
+        indices = self._check(indices)
+        return bytes(itemgetter(*indices)(self._switched_on)) if len(indices) > 1 \
+            else bytes(self._switched_on[index] for index in indices)
+
+    def option_values(self, indices=None):
+        types = self._types
+        if indices is None:
+            return [types[type_id].decode(code) for type_id, code in zip(self._type_ids, self._options)]
+        indices = self._check(indices)
+        if len(indices) < 2:
+            return [types[self._type_ids[index]].decode(self._options[index]) for index in indices]
+        # Gathered column by column rather than through one view per device
+        type_ids = itemgetter(*indices)(self._type_ids)
+        codes = itemgetter(*indices)(self._options)
+        return [types[type_id].decode(code) for type_id, code in zip(type_ids, codes)]
+
+    def to_device(self, index):
+        view = self[index]
+        device = view.device_type.cls(view.option_value)
+        device._switched_on = view._switched_on
+        return device
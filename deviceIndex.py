@@ -0,0 +1,188 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+
+from changeBus import DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED, OPTION_CHANGED, ALL_SWITCHED
+
+def describe(device):
+    # (type name, on, option) for the device shapes used across the apps: device objects, columnar
+    # fleet views and the dict devices of homeModel (whose status doubles as their switch)
+    if isinstance(device, dict):
+        return device["name"], device["status"] == "on", None
+    device_type = getattr(device, "device_type", None)
+    name = device_type.name if device_type is not None else type(device).__name__
+    option = getattr(device, getattr(device, "_option_name", "option_value"), None)
+    return name, bool(device._switched_on), option
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _key(device):
+    # Objects and fleet views are their own key; dict devices go by identity
+    return device if device.__hash__ else id(device)
+
+class DeviceIndex:
+    # Secondary indexes over devices in any number of homes, kept current from the change bus:
+    # by type, by (type, on/off), by (type, option) and a sorted range index per type for numeric
+    # options. A query reads the narrowest index that answers it, so it costs about its result size
+    def __init__(self, bus=None):
+        self._entries = {}          # key -> [device, home, type, on, option, sequence]
+        self._home_keys = {}        # id(home) -> set of keys
+        self._by_type = {}
+        self._by_state = {}
+        self._by_option = {}
+        self._ranges = {}           # type -> sorted [(option, sequence)]
+        self._sequence_keys = {}
+        self._sequence = count()
+        if bus is not None:
+            bus.subscribe(self.on_changes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Maintenance
+    def track(self, home):
+        for device in home.devices:
+            self.add(device, home)
+
+    def untrack(self, home):
+        for key in list(self._home_keys.get(id(home), ())):
+            self._remove_key(key)
+
+    def add(self, device, home=None):
+        key = _key(device)
+        if key in self._entries:
+            self._remove_key(key)
+        name, on, option = describe(device)
+        sequence = next(self._sequence)
+        self._entries[key] = [device, home, name, on, option, sequence]
+        self._home_keys.setdefault(id(home), set()).add(key)
+        self._by_type.setdefault(name, set()).add(key)
+        self._by_state.setdefault((name, on), set()).add(key)
+        self._by_option.setdefault((name, option), set()).add(key)
+        if _numeric(option):
+            insort(self._ranges.setdefault(name, []), (option, sequence))
+        self._sequence_keys[sequence] = key
+
+    def remove(self, device):
+        key = _key(device)
+        if key in self._entries:
+            self._remove_key(key)
+
+    def _remove_key(self, key):
+        device, home, name, on, option, sequence = self._entries.pop(key)
+        keys = self._home_keys[id(home)]
+        keys.discard(key)
+        if not keys:
+            del self._home_keys[id(home)]
+        self._discard(self._by_type, name, key)
+        self._discard(self._by_state, (name, on), key)
+        self._discard(self._by_option, (name, option), key)
+        if _numeric(option):
+            self._unrange(name, option, sequence)
+        del self._sequence_keys[sequence]
+
+    def update(self, device):
+        # Re-reads one device and moves it between index buckets as needed
+        key = _key(device)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        _, home, name, on, option, sequence = entry
+        _, now_on, now_option = describe(device)
+        if now_on != on:
+            self._discard(self._by_state, (name, on), key)
+            self._by_state.setdefault((name, now_on), set()).add(key)
+            entry[3] = now_on
+        if now_option != option:
+            self._discard(self._by_option, (name, option), key)
+            self._by_option.setdefault((name, now_option), set()).add(key)
+            if _numeric(option):
+                self._unrange(name, option, sequence)
+            if _numeric(now_option):
+                insort(self._ranges.setdefault(name, []), (now_option, sequence))
+            entry[4] = now_option
+
+    @staticmethod
+    def _discard(index, bucket, key):
+        keys = index.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[bucket]
+
+    def _unrange(self, name, option, sequence):
+        ordered = self._ranges[name]
+        position = bisect_left(ordered, (option, sequence))
+        del ordered[position]
+
+    def on_changes(self, changes):
+        # A batch can hold changes to a fleet device followed by its removal, and the removed
+        # view no longer reads; those changes are skipped and the removal drops the entry
+        removed = {_key(change.device): position for position, change in enumerate(changes)
+                   if change.kind == DEVICE_REMOVED}
+        for position, change in enumerate(changes):
+            kind = change.kind
+            if kind == ALL_SWITCHED:
+                for device in change.devices:
+                    if removed.get(_key(device), -1) < position:
+                        self.update(device)
+            elif removed.get(_key(change.device), -1) > position:
+                continue
+            elif kind in (SWITCH_CHANGED, OPTION_CHANGED):
+                self.update(change.device)
+            elif kind == DEVICE_ADDED:
+                self.add(change.device, change.source)
+            elif kind == DEVICE_REMOVED:
+                # Fleet views keep their device's identity across the shift, so this is one entry
+                self.remove(change.device)
+
+    # Queries
+    def query(self, device_type=None, on=None, option=None, low=None, high=None, home=None):
+        # device_type is a class or class/device name; low/high bound a numeric option (inclusive)
+        name = device_type if device_type is None or isinstance(device_type, str) else device_type.__name__
+        ranged = low is not None or high is not None
+        if name is not None and option is not None:
+            keys = self._by_option.get((name, option), ())
+        elif name is not None and ranged:
+            keys = self._range_keys(name, low, high)
+            ranged = False
+        elif name is not None and on is not None:
+            keys = self._by_state.get((name, on), ())
+            on = None
+        elif name is not None:
+            keys = self._by_type.get(name, ())
+        elif home is not None:
+            keys = self._home_keys.get(id(home), ())
+        else:
+            keys = self._entries
+        entries = self._entries
+        found = []
+        for key in keys:
+            device, device_home, _, device_on, device_option, _ = entries[key]
+            if on is not None and device_on != on:
+                continue
+            if option is not None and device_option != option:
+                continue
+            if ranged and not (_numeric(device_option)
+                               and (low is None or device_option >= low)
+                               and (high is None or device_option <= high)):
+                continue
+            if home is not None and device_home is not home:
+                continue
+            found.append(device)
+        return found
+
+    def _range_keys(self, name, low, high):
+        ordered = self._ranges.get(name, [])
+        start = 0 if low is None else bisect_left(ordered, (low,))
+        stop = len(ordered) if high is None else bisect_right(ordered, (high, float("inf")))
+        keys = self._sequence_keys
+        return [keys[sequence] for _, sequence in ordered[start:stop]]
+
+    def count(self, device_type=None, on=None, option=None):
+        name = device_type if device_type is None or isinstance(device_type, str) else device_type.__name__
+        if name is not None and option is None and on is not None:
+            return len(self._by_state.get((name, on), ()))
+        if name is not None and option is None and on is None:
+            return len(self._by_type.get(name, ()))
+        return len(self.query(device_type, on, option))
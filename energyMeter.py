@@ -0,0 +1,206 @@
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import mul, sub
+
+# Every energy figure here, totals, windows and rollup buckets alike, is in watt-hours (Wh)
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+# Rollup width -> how many buckets to keep (None keeps them all)
+ROLLUPS = {MINUTE: 24 * 60, HOUR: 90 * 24, DAY: None}
+
+class PlugMeter:
+    # Power changes for one plug, kept in preallocated ring buffers, with rollups updated as
+    # each constant-power segment closes so dashboards never rescan raw events
+    def __init__(self, capacity=4096, rollups=ROLLUPS):
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._watts = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._count = 0
+        self._evicted = False
+        self._last_time = None
+        self._last_watts = 0.0
+        self.retention = dict(rollups)
+        self.rollups = {width: {} for width in rollups}
+        self.total_wh = 0.0
+
+    def record(self, timestamp, watts):
+        if self._last_time is not None:
+            if timestamp < self._last_time:
+                raise ValueError("Meter events must be recorded in time order.")
+            self._accumulate(self._last_time, timestamp, self._last_watts)
+        slot = (self._start + self._count) % self.capacity
+        self._times[slot] = timestamp
+        self._watts[slot] = watts
+        if self._count == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+            self._evicted = True
+        else:
+            self._count += 1
+        self._last_time = timestamp
+        self._last_watts = watts
+
+    def _accumulate(self, start, end, watts):
+        if watts == 0 or end <= start:
+            return
+        self.total_wh += watts * (end - start) / HOUR
+        for width, buckets in self.rollups.items():
+            for bucket, used in _spread(start, end, watts, width):
+                buckets[bucket] = buckets.get(bucket, 0.0) + used
+            limit = self.retention[width]
+            while limit is not None and len(buckets) > limit:
+                del buckets[next(iter(buckets))]
+
+    # The segment since the last event is still open: it only reaches total_wh and the rollups
+    # when the next event closes it, so the live figures below add it up to now
+    def _open(self, now):
+        if self._last_time is None or now is None or now <= self._last_time or self._last_watts == 0:
+            return None
+        return self._last_time, now, self._last_watts
+
+    def live_total_wh(self, now):
+        segment = self._open(now)
+        return self.total_wh + (segment[2] * (segment[1] - segment[0]) / HOUR if segment else 0.0)
+
+    def rollup_wh(self, width, now=None):
+        # Bucket start -> Wh, with the open segment spread over the buckets it covers
+        buckets = self.rollups[width]
+        segment = self._open(now)
+        if segment is None:
+            return buckets
+        buckets = dict(buckets)
+        for bucket, used in _spread(*segment, width):
+            buckets[bucket] = buckets.get(bucket, 0.0) + used
+        return buckets
+
+    def events(self):
+        end = self._start + self._count
+        if end <= self.capacity:
+            return self._times[self._start:end], self._watts[self._start:end]
+        wrap = end - self.capacity
+        return (self._times[self._start:] + self._times[:wrap],
+                self._watts[self._start:] + self._watts[:wrap])
+
+    # Positions below are logical, 0 being the oldest buffered event; the ring holds at most two
+    # sorted runs, [start, capacity) and [0, wrap), so searches and slices touch only the one needed
+    def _find(self, timestamp, right):
+        search = bisect_right if right else bisect_left
+        times = self._times
+        end = self._start + self._count
+        if end <= self.capacity:
+            return search(times, timestamp, self._start, end) - self._start
+        tail = self.capacity - self._start
+        if (timestamp < times[0]) if right else (timestamp <= times[self.capacity - 1]):
+            return search(times, timestamp, self._start, self.capacity) - self._start
+        return tail + search(times, timestamp, 0, end - self.capacity)
+
+    def _slice(self, column, first, last):
+        low, high = self._start + first, self._start + last
+        if high <= self.capacity:
+            return column[low:high]
+        if low >= self.capacity:
+            return column[low - self.capacity:high - self.capacity]
+        return column[low:] + column[:high - self.capacity]
+
+    def energy_wh(self, start, end, now=None):
+        # Wh used in [start, end), read from the buffered events in place; time older than the
+        # ring buffer falls back to minute rollups. With now, nothing after it is counted
+        if now is not None:
+            end = min(end, now)
+        if end <= start or self._count == 0:
+            return 0.0
+        oldest = self._times[self._start]
+        total = 0.0
+        if start < oldest:
+            if self._evicted:
+                total += self.rollup_energy_wh(MINUTE, start, min(end, oldest))
+            start = oldest
+            if end <= start:
+                return total
+        first = self._find(start, True) - 1
+        last = self._find(end, False)
+        points = self._slice(self._times, first + 1, last)
+        points.insert(0, start)
+        points.append(end)
+        watts = self._slice(self._watts, first, last)
+        total += sum(map(mul, watts, map(sub, points[1:], points[:-1]))) / HOUR
+        return total
+
+    def rollup_energy_wh(self, width, start, end, now=None):
+        # Sums whole buckets and a proportional share of the two partial ones at the edges
+        buckets = self.rollup_wh(width, now)
+        total = 0.0
+        bucket = math.floor(start / width) * width
+        while bucket < end:
+            used = buckets.get(bucket)
+            if used:
+                overlap = min(end, bucket + width) - max(start, bucket)
+                total += used * overlap / width
+            bucket += width
+        return total
+
+def _spread(start, end, watts, width):
+    # (bucket start, Wh) for each bucket of the given width that [start, end) at watts overlaps
+    moment = start
+    while moment < end:
+        bucket = math.floor(moment / width) * width
+        stop = min(end, bucket + width)
+        yield bucket, watts * (stop - moment) / HOUR
+        moment = stop
+
+class EnergyMeter:
+    def __init__(self, capacity=4096, clock=time.time):
+        self.capacity = capacity
+        self.clock = clock
+        self._plugs = {}
+        self._homes = {}
+
+    def track(self, plug, home=None):
+        key = id(plug)
+        if key not in self._plugs:
+            meter = PlugMeter(self.capacity)
+            self._plugs[key] = (plug, meter)
+            self._homes.setdefault(home, []).append(key)
+            meter.record(self.clock(), self.power(plug))
+        return self._plugs[key][1]
+
+    @staticmethod
+    def power(plug):
+        return float(plug.consumption_rate) if plug._switched_on else 0.0
+
+    def record(self, plug, timestamp=None):
+        plug, meter = self._plugs[id(plug)]
+        meter.record(self.clock() if timestamp is None else timestamp, self.power(plug))
+
+    def toggle(self, plug, timestamp=None):
+        plug.toggle_switch()
+        self.record(plug, timestamp)
+
+    def set_rate(self, plug, watts, timestamp=None):
+        plug.consumption_rate = watts
+        self.record(plug, timestamp)
+
+    def meter(self, plug):
+        return self._plugs[id(plug)][1]
+
+    def plug_energy_wh(self, plug, start, end):
+        return self.meter(plug).energy_wh(start, end, self.clock())
+
+    def home_energy_wh(self, home, start, end):
+        now = self.clock()
+        return sum(self._plugs[key][1].energy_wh(start, end, now) for key in self._homes.get(home, ()))
+
+    def home_total_wh(self, home):
+        now = self.clock()
+        return sum(self._plugs[key][1].live_total_wh(now) for key in self._homes.get(home, ()))
+
+    def home_rollup_wh(self, home, width):
+        now = self.clock()
+        merged = {}
+        for key in self._homes.get(home, ()):
+            for bucket, used in self._plugs[key][1].rollup_wh(width, now).items():
+                merged[bucket] = merged.get(bucket, 0.0) + used
+        return dict(sorted(merged.items()))
@@ -0,0 +1,325 @@
+from changeBus import DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_EMPTY_NODE = (None,) * _WIDTH
+
+class PersistentMap:
+    # Immutable map from non-negative ints to non-None values: a 32-way trie where set() and
+    # delete() copy only the nodes on the path to the key, so each version shares everything
+    # else with the one it came from
+    __slots__ = ("_root", "_shift", "_size")
+
+    def __init__(self, root=None, shift=0, size=0):
+        self._root = root
+        self._shift = shift
+        self._size = size
+
+    @classmethod
+    def from_items(cls, items):
+        # Built bottom-up in mutable lists, without the per-key path copies of set()
+        root = [None] * _WIDTH
+        shift = 0
+        size = 0
+        for key, value in items:
+            if key < 0:
+                raise ValueError("PersistentMap keys must be non-negative.")
+            while key >> (shift + _BITS):
+                root = [root] + [None] * (_WIDTH - 1)
+                shift += _BITS
+            node = root
+            for level in range(shift, 0, -_BITS):
+                index = (key >> level) & _MASK
+                if node[index] is None:
+                    node[index] = [None] * _WIDTH
+                node = node[index]
+            size += node[key & _MASK] is None
+            node[key & _MASK] = value
+        return cls(_freeze(root, shift) if size else None, shift, size)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        return (key for key, _ in self.items())
+
+    def get(self, key, default=None):
+        if key < 0 or key >> (self._shift + _BITS):
+            return default
+        node = self._root
+        for shift in range(self._shift, 0, -_BITS):
+            if node is None:
+                return default
+            node = node[(key >> shift) & _MASK]
+        if node is None:
+            return default
+        value = node[key & _MASK]
+        return default if value is None else value
+
+    def set(self, key, value):
+        if key < 0:
+            raise ValueError("PersistentMap keys must be non-negative.")
+        if value is None:
+            raise ValueError("PersistentMap values cannot be None.")
+        root, shift = self._root, self._shift
+        while key >> (shift + _BITS):
+            root = None if root is None else (root,) + _EMPTY_NODE[1:]
+            shift += _BITS
+        root, added = _assoc(root, shift, key, value)
+        if root is self._root:
+            return self
+        return PersistentMap(root, shift, self._size + added)
+
+    def delete(self, key):
+        if key < 0 or key >> (self._shift + _BITS):
+            return self
+        root, removed = _dissoc(self._root, self._shift, key)
+        if not removed:
+            return self
+        return PersistentMap(root, self._shift, self._size - 1)
+
+    def items(self):
+        if self._root is not None:
+            yield from _walk(self._root, self._shift, 0)
+
+    def diff(self, other):
+        # (key, mine, theirs) for every key whose value differs, None where a side lacks it.
+        # Subtrees the two versions share are skipped without being read
+        shift = max(self._shift, other._shift)
+        yield from _diff(_lift(self._root, self._shift, shift), _lift(other._root, other._shift, shift), shift, 0)
+
+def _assoc(node, shift, key, value):
+    if node is None:
+        node = _EMPTY_NODE
+    index = (key >> shift) & _MASK
+    if shift:
+        child, added = _assoc(node[index], shift - _BITS, key, value)
+    else:
+        child, added = value, node[index] is None
+    if child is node[index]:
+        return node, 0
+    return node[:index] + (child,) + node[index + 1:], added
+
+def _dissoc(node, shift, key):
+    if node is None:
+        return None, 0
+    index = (key >> shift) & _MASK
+    if shift:
+        child, removed = _dissoc(node[index], shift - _BITS, key)
+    else:
+        child, removed = None, node[index] is not None
+    if not removed:
+        return node, 0
+    node = node[:index] + (child,) + node[index + 1:]
+    return (None if node.count(None) == _WIDTH else node), 1
+
+def _freeze(node, shift):
+    if not shift:
+        return tuple(node)
+    return tuple(None if child is None else _freeze(child, shift - _BITS) for child in node)
+
+def _lift(root, shift, target):
+    while shift < target:
+        root = None if root is None else (root,) + _EMPTY_NODE[1:]
+        shift += _BITS
+    return root
+
+def _walk(node, shift, base):
+    for index, child in enumerate(node):
+        if child is not None:
+            if shift:
+                yield from _walk(child, shift - _BITS, base | (index << shift))
+            else:
+                yield base | index, child
+
+def _diff(mine, theirs, shift, base):
+    if mine is theirs:
+        return
+    mine = _EMPTY_NODE if mine is None else mine
+    theirs = _EMPTY_NODE if theirs is None else theirs
+    for index in range(_WIDTH):
+        a, b = mine[index], theirs[index]
+        if a is b:
+            continue
+        if shift:
+            yield from _diff(a, b, shift - _BITS, base | (index << shift))
+        elif a != b:
+            yield base | index, a, b
+
+# Stands in a version for a base home that was removed
+_REMOVED = ("removed",)
+
+def _device_map(home):
+    return PersistentMap.from_items((device["id"], (device["name"], device["status"])) for device in home.devices)
+
+class HomeHistory:
+    # Undo/redo for a list of homeModel homes. A version maps home key -> (home, devices) with
+    # devices mapping device id -> (name, status), all PersistentMaps, so a step costs the trie
+    # paths to what changed and moving between versions only visits the subtrees that differ.
+    # Device changes arrive from the homes' bus; homes added or removed by the app are reported
+    # with add_home() and remove_home(), and commit() closes one undoable step. Homes that existed
+    # all along (track()) live in a shared base; a version only holds them once they change
+    def __init__(self, homes, bus, limit=1000):
+        self.homes = homes
+        self.bus = bus
+        self.limit = limit
+        self.labels = [None]
+        self._keys = {}
+        self._base = {}
+        self._detached = {}
+        self._state = PersistentMap()
+        self._versions = [self._state]
+        self._position = 0
+        self._restoring = False
+        bus.subscribe(self.on_changes, (DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED))
+        for home in homes:
+            self.track(home)
+
+    def __len__(self):
+        return len(self._versions)
+
+    @property
+    def position(self):
+        return self._position
+
+    @property
+    def can_undo(self):
+        return self._position > 0 or self._state is not self._versions[self._position]
+
+    @property
+    def can_redo(self):
+        return self._position < len(self._versions) - 1 and self._state is self._versions[self._position]
+
+    # Recording
+    def _key(self, home):
+        key = self._keys.get(home)
+        if key is None:
+            key = self._keys[home] = len(self._keys)
+        return key
+
+    def track(self, home):
+        # A home that existed all along, e.g. one loaded after the history was created: it joins
+        # the base, which every version falls back to, rather than becoming a step of its own
+        if home in self._keys:
+            return
+        key = self._key(home)
+        self._base[key] = (home, _device_map(home))
+
+    def _entry(self, key, entry):
+        # A version's entry for key: its own, the base one where it has none, None if removed
+        if entry is None:
+            return self._base.get(key)
+        return None if entry is _REMOVED else entry
+
+    def add_home(self, home):
+        key = self._key(home)
+        self._detached.pop(key, None)
+        self._state = self._state.set(key, (home, _device_map(home)))
+
+    def remove_home(self, home):
+        key = self._keys.get(home)
+        if key is None:
+            return
+        entry = self._entry(key, self._state.get(key))
+        if entry is not None:
+            self._detached[key] = entry
+            self._state = self._state.set(key, _REMOVED) if key in self._base else self._state.delete(key)
+
+    def on_changes(self, changes):
+        if self._restoring:
+            return
+        state = self._state
+        for change in changes:
+            key = self._keys.get(change.source)
+            entry = None if key is None else self._entry(key, state.get(key))
+            if entry is None:
+                continue
+            home, devices = entry
+            device = change.device
+            if change.kind == DEVICE_REMOVED:
+                devices = devices.delete(device["id"])
+            else:
+                devices = devices.set(device["id"], (device["name"], device["status"]))
+            state = state.set(key, (home, devices))
+        self._state = state
+
+    def commit(self, label=None):
+        if self._state is self._versions[self._position]:
+            return False
+        # A new step after an undo discards the steps that were undone
+        del self._versions[self._position + 1:]
+        del self.labels[self._position + 1:]
+        self._versions.append(self._state)
+        self.labels.append(label)
+        self._position += 1
+        excess = len(self._versions) - self.limit - 1
+        if excess > 0:
+            del self._versions[:excess]
+            del self.labels[:excess]
+            self._position -= excess
+        return True
+
+    # Restoring: each returns (homes added, homes removed, [(home, device id, before, after)])
+    # with before/after as (name, status) or None, so the caller can persist and repaint them
+    def undo(self):
+        self.commit()
+        if self._position == 0:
+            return None
+        return self.goto(self._position - 1)
+
+    def redo(self):
+        if not self.can_redo:
+            return None
+        return self.goto(self._position + 1)
+
+    def goto(self, position):
+        self.commit()
+        if not 0 <= position < len(self._versions):
+            raise IndexError("No such history position.")
+        target = self._versions[position]
+        added, removed, devices = [], [], []
+        self._restoring = True
+        try:
+            for key, before, after in self._state.diff(target):
+                before, after = self._entry(key, before), self._entry(key, after)
+                if before is after:
+                    continue
+                if after is None:
+                    home = before[0]
+                    self.homes.remove(home)
+                    self._detached[key] = before
+                    removed.append(home)
+                    continue
+                if before is None:
+                    before = self._detached.pop(key)
+                    self._insert(key, after[0])
+                    added.append(after[0])
+                self._restore_devices(after[0], before[1], after[1], devices)
+            # A bus with deferred delivery still holds the restore's own changes
+            self.bus.flush()
+        finally:
+            self._restoring = False
+        self._state = target
+        self._position = position
+        return added, removed, devices
+
+    def _insert(self, key, home):
+        keys = self._keys
+        index = next((i for i, other in enumerate(self.homes) if keys.get(other, -1) > key), len(self.homes))
+        self.homes.insert(index, home)
+
+    @staticmethod
+    def _restore_devices(home, before, after, devices):
+        for device_id, old, new in before.diff(after):
+            if old is not None and (new is None or new[0] != old[0]):
+                home.remove_device(device_id)
+            if new is not None:
+                if home.has_device(device_id):
+                    home.set_device_status(device_id, new[1])
+                else:
+                    home.add_device({"name": new[0], "status": new[1], "id": device_id})
+            devices.append((home, device_id, old, new))
@@ -0,0 +1,94 @@
+from changeBus import DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED
+
+DEVICE_TYPES = ["Light", "Fridge", "Plug", "Heater", "TV", "Speaker"]
+
+class SmartHome:
+    # Shared by every home; a ChangeBus here receives device additions, removals and status changes
+    bus = None
+
+    def __init__(self, name):
+        self.name = name
+        # Devices keyed by a per-home id, plus every id that shares a name
+        self._devices = {}
+        self._names = {}
+        self._next_device_id = 0
+
+    @property
+    def devices(self):
+        # A live read-only view in insertion order; changes go through add_device/remove_device
+        return self._devices.values()
+
+    @devices.setter
+    def devices(self, devices):
+        self._devices = {}
+        self._names = {}
+        self._next_device_id = 0
+        for device in devices:
+            self.add_device(device)
+
+    def add_device(self, device):
+        device_id = device.get('id')
+        if device_id is None or device_id in self._devices:
+            device_id = self._next_device_id
+        device['id'] = device_id
+        self._next_device_id = max(self._next_device_id, device_id + 1)
+        self._devices[device_id] = device
+        self._names.setdefault(device['name'], {})[device_id] = None
+        if self.bus is not None:
+            self.bus.publish(DEVICE_ADDED, device, source=self)
+        return device_id
+
+    def get_device(self, device_id):
+        return self._devices[device_id]
+
+    def has_device(self, device_id):
+        return device_id in self._devices
+
+    def device_ids(self, device_name):
+        return list(self._names.get(device_name, ()))
+
+    def find_device(self, device_name):
+        return next(iter(self._names.get(device_name, ())), None)
+
+    def remove_device(self, device_id):
+        device = self._devices.pop(device_id)
+        ids = self._names[device['name']]
+        del ids[device_id]
+        if not ids:
+            del self._names[device['name']]
+        if self.bus is not None:
+            self.bus.publish(DEVICE_REMOVED, device, source=self)
+    
+    def toggle_device(self, device_id):
+        device = self._devices[device_id]
+        old = device['status']
+        device['status'] = "on" if old == "off" else "off"
+        if self.bus is not None:
+            self.bus.publish(SWITCH_CHANGED, device, old, device['status'], source=self)
+    
+    def set_device_status(self, device_id, status):
+        device = self._devices[device_id]
+        old = device['status']
+        device['status'] = status
+        if self.bus is not None:
+            self.bus.publish(SWITCH_CHANGED, device, old, status, source=self)
+
+    def edit_device(self, device_id):
+        # Tk is only loaded once something actually asks for a dialog
+        from tkinter import simpledialog
+        device_name = self._devices[device_id]['name']
+        new_status = simpledialog.askstring("Edit Device", f"Set new value for {device_name}:")
+        if new_status:
+            self.set_device_status(device_id, new_status)
+        return new_status
+
+    def to_dict(self):
+        # The id counter is saved too, so ids of removed devices are not handed out again
+        return {"name": self.name, "devices": list(self._devices.values()), "next_device_id": self._next_device_id}
+
+    @staticmethod
+    def from_dict(data):
+        home = SmartHome(data["name"])
+        home.devices = data["devices"]
+        home._next_device_id = max(home._next_device_id, data.get("next_device_id", 0))
+        return home
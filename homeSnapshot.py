@@ -0,0 +1,188 @@
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+
+from homeStream import iter_json_array
+
+# Layout: header, device records, home records, string offsets, string blob, name index; the
+# header holds the offset of each part. Every record is fixed width, so one home can be read
+# without touching any other.
+MAGIC = b"SHB2"
+HEADER = struct.Struct("<4sIII5Q")
+# name string, home id, first device record, device count, next device id
+HOME = struct.Struct("<IIQII")
+# Home records of SHB1 files, written before the device id counter was kept
+MAGIC_V1 = b"SHB1"
+HOME_V1 = struct.Struct("<IIQI")
+DEVICE = struct.Struct("<III")     # device id, name string, status string
+OFFSET = struct.Struct("<Q")
+INDEX = struct.Struct("<I")
+
+def _check_id(value, what):
+    if type(value) is not int or not 0 <= value <= 0xFFFFFFFF:
+        raise ValueError(f"{what} id {value!r} does not fit the snapshot's unsigned 32-bit ids.")
+    return value
+
+def write_snapshot(homes, path):
+    # Device records go straight to the file and home records to a spool file as each home
+    # arrives, so memory holds only the distinct strings and one name id per home. The string
+    # table and name index follow the records, and the header is filled in last
+    strings = {}
+    names = array("I")
+    device_count = 0
+
+    def intern(text):
+        sid = strings.get(text)
+        if sid is None:
+            sid = strings[text] = len(strings)
+        return sid
+
+    with open(path, "wb") as file, tempfile.TemporaryFile() as spool:
+        file.write(bytes(HEADER.size))
+        devices_offset = file.tell()
+        for position, home in enumerate(homes):
+            devices = home["devices"]
+            name_sid = intern(home["name"])
+            names.append(name_sid)
+            device_ids = [_check_id(device.get("id", number), "Device") for number, device in enumerate(devices)]
+            # The counter is kept so ids of removed devices stay retired after a round trip
+            next_device_id = _check_id(max(home.get("next_device_id", 0), max(device_ids, default=-1) + 1), "Device")
+            spool.write(HOME.pack(name_sid, _check_id(home.get("id", position), "Home"), device_count,
+                                  len(devices), next_device_id))
+            file.write(b"".join(DEVICE.pack(device_id, intern(device["name"]), intern(device["status"]))
+                                for device_id, device in zip(device_ids, devices)))
+            device_count += len(devices)
+
+        homes_offset = file.tell()
+        spool.seek(0)
+        shutil.copyfileobj(spool, file)
+
+        strings_offset = file.tell()
+        texts = list(strings)
+        encoded = [text.encode() for text in texts]
+        position = 0
+        file.write(OFFSET.pack(0))
+        for raw in encoded:
+            position += len(raw)
+            file.write(OFFSET.pack(position))
+        blob_offset = file.tell()
+        file.writelines(encoded)
+
+        index_offset = file.tell()
+        order = sorted(range(len(names)), key=lambda i: (texts[names[i]], i))
+        file.writelines(INDEX.pack(i) for i in order)
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, len(names), device_count, len(strings),
+                               strings_offset, blob_offset, homes_offset, devices_offset, index_offset))
+
+class HomeSnapshot:
+    def __init__(self, path, writable=False):
+        self._file = open(path, "r+b" if writable else "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        (magic, self._home_count, self._device_count, self._string_count, self._strings_offset,
+         self._blob_offset, self._homes_offset, self._devices_offset, self._index_offset) = \
+            HEADER.unpack_from(self._map, 0)
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f"{path} is not a binary homes snapshot")
+        self._home_struct = HOME if magic == MAGIC else HOME_V1
+        self._string_ids = None
+        # Names and statuses repeat heavily, so each table entry is decoded at most once
+        self._strings = [None] * self._string_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._home_count
+
+    def _string(self, sid):
+        text = self._strings[sid]
+        if text is None:
+            start, end = struct.unpack_from("<QQ", self._map, self._strings_offset + sid * OFFSET.size)
+            text = self._strings[sid] = self._map[self._blob_offset + start:self._blob_offset + end].decode()
+        return text
+
+    def _home_record(self, index):
+        if not 0 <= index < self._home_count:
+            raise IndexError("Invalid home index.")
+        return self._home_struct.unpack_from(self._map, self._homes_offset + index * self._home_struct.size)
+
+    def home_data(self, index):
+        name_sid, home_id, first, count, *counter = self._home_record(index)
+        string = self._string
+        devices = [{"name": string(device_name), "status": string(status), "id": device_id}
+                   for device_id, device_name, status in DEVICE.iter_unpack(
+                       self._map[self._devices_offset + first * DEVICE.size:
+                                 self._devices_offset + (first + count) * DEVICE.size])]
+        next_device_id = counter[0] if counter else max((device["id"] for device in devices), default=-1) + 1
+        return {"name": self._string(name_sid), "devices": devices, "next_device_id": next_device_id, "id": home_id}
+
+    def home(self, index, factory):
+        data = self.home_data(index)
+        home = factory(data)
+        home.home_id = data["id"]
+        return home
+
+    def home_name(self, index):
+        return self._string(self._home_record(index)[0])
+
+    def find(self, name):
+        # Binary search over the name index; returns every home index with that name
+        low, high = 0, self._home_count
+        while low < high:
+            mid = (low + high) // 2
+            if self.home_name(self._indexed(mid)) < name:
+                low = mid + 1
+            else:
+                high = mid
+        found = []
+        while low < self._home_count and self.home_name(self._indexed(low)) == name:
+            found.append(self._indexed(low))
+            low += 1
+        return found
+
+    def _indexed(self, position):
+        return INDEX.unpack_from(self._map, self._index_offset + position * INDEX.size)[0]
+
+    def iter_home_data(self):
+        for index in range(self._home_count):
+            yield self.home_data(index)
+
+    def set_device_status(self, index, device_id, status):
+        # In-place edit for statuses already in the string table (on/off and friends)
+        if self._string_ids is None:
+            self._string_ids = {self._string(sid): sid for sid in range(self._string_count)}
+        sid = self._string_ids.get(status)
+        if sid is None:
+            raise KeyError(f"Status {status!r} is not in the snapshot string table.")
+        first, count = self._home_record(index)[2:4]
+        for number in range(first, first + count):
+            offset = self._devices_offset + number * DEVICE.size
+            if DEVICE.unpack_from(self._map, offset)[0] == device_id:
+                struct.pack_into("<I", self._map, offset + 8, sid)
+                return
+        raise KeyError(device_id)
+
+def json_to_snapshot(json_path, snapshot_path):
+    with open(json_path, "rb") as file:
+        write_snapshot(iter_json_array(file), snapshot_path)
+
+def snapshot_to_json(snapshot_path, json_path):
+    with HomeSnapshot(snapshot_path) as snapshot, open(json_path, "w") as file:
+        file.write("[")
+        for index, data in enumerate(snapshot.iter_home_data()):
+            if index:
+                file.write(", ")
+            json.dump(data, file)
+        file.write("]")
@@ -0,0 +1,244 @@
+import json
+import os
+
+from homeStream import iter_json_array
+
+class HomeStore:
+    def __init__(self, path="homes.json", log_path=None, compact_every=1000, sync=False):
+        self.path = path
+        self.log_path = log_path or path + ".log"
+        self.compact_every = compact_every
+        self.sync = sync
+        self.homes = []
+        self._next_home_id = 0
+        self._log = None
+        self._log_records = 0
+        self._loading = False
+        self._deferred = []
+
+    # Loading: stream the snapshot one home at a time, applying the log tail recorded on top of it
+    def load(self, factory):
+        for _ in self.iter_load(factory):
+            pass
+        return self.homes
+
+    def iter_load(self, factory, chunk_size=1 << 16):
+        self.homes = []
+        self._loading = True
+        records, log_clean, next_home_id = self._read_log()
+        pending = {}
+        added = {}
+        for record in records:
+            if record["op"] in ("add_home", "restore_home"):
+                added.setdefault(record["home"], record)
+            pending.setdefault(record["home"], []).append(record)
+
+        seen = set()
+        try:
+            with open(self.path, "rb") as file:
+                for position, home_data in enumerate(iter_json_array(file, chunk_size)):
+                    home = factory(home_data)
+                    home.home_id = home_data.get("id", position)
+                    seen.add(home.home_id)
+                    home = self._replay(home, pending.get(home.home_id, ()), factory)
+                    if home is not None:
+                        self.homes.append(home)
+                        yield home
+        except FileNotFoundError:
+            pass
+        for home_id in added:
+            if home_id in seen:
+                continue
+            home = self._replay(None, pending[home_id], factory)
+            if home is None:
+                continue
+            # A restored home goes back in front of the home it was listed before. Homes added while
+            # the load runs are already listed but get their id only once it finishes
+            following = self._last_restore(pending[home_id])
+            ids = [getattr(other, "home_id", None) for other in self.homes] if following is not None else ()
+            if following in ids:
+                self.homes.insert(ids.index(following), home)
+            else:
+                self.homes.append(home)
+            yield home
+
+        # Ids are never reused: a log left behind by a crash mid-compaction, replayed over the
+        # newer snapshot, must not reach a home or device that took over a removed one's id.
+        # That log's header still holds the counter from before anything in it was assigned
+        self._next_home_id = max(max(list(seen) + list(pending), default=-1) + 1, next_home_id)
+        self._loading = False
+        self._open_log()
+        self._log_records = len(records)
+        deferred, self._deferred = self._deferred, []
+        for method, args in deferred:
+            method(*args)
+        if self._log_records >= self.compact_every or not log_clean:
+            self.compact()
+
+    def _read_log(self):
+        records = []
+        next_home_id = 0
+        try:
+            with open(self.log_path, "r") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash; keep what precedes it and compact it away
+                        return records, False, next_home_id
+                    if "op" in record:
+                        records.append(record)
+                    elif "next_home_id" in record:
+                        next_home_id = record["next_home_id"]
+        except FileNotFoundError:
+            pass
+        return records, True, next_home_id
+
+    @staticmethod
+    def _replay(home, records, factory):
+        # Records carry resulting state rather than deltas, so replaying a log whose changes
+        # already reached the snapshot (a crash mid-compaction) leaves the home unchanged.
+        # Returns the home, or None if it ends up removed
+        for record in records:
+            op = record["op"]
+            if op == "remove_home":
+                home = None
+                continue
+            if op == "add_home":
+                if home is None:
+                    home = factory({"name": record["name"], "devices": []})
+                    home.home_id = record["home"]
+                continue
+            if op == "restore_home":
+                home = factory(record["data"])
+                home.home_id = record["home"]
+                continue
+            if home is None:
+                continue
+            if isinstance(record.get("device"), str) or (op == "add_device" and "id" not in record["device"]):
+                HomeStore._replay_by_name(home, record)
+            elif op == "add_device":
+                if not home.has_device(record["device"]["id"]):
+                    home.add_device(dict(record["device"]))
+            elif op == "remove_device":
+                if home.has_device(record["device"]):
+                    home.remove_device(record["device"])
+            elif op == "edit_device":
+                if home.has_device(record["device"]):
+                    home.set_device_status(record["device"], record["status"])
+            elif op == "toggle_device":
+                # Written by older versions of the store
+                if home.has_device(record["device"]):
+                    home.toggle_device(record["device"])
+        return home
+
+    @staticmethod
+    def _last_restore(records):
+        following = None
+        for record in records:
+            if record["op"] == "restore_home":
+                following = record.get("before")
+            elif record["op"] == "add_home":
+                following = None
+        return following
+
+    @staticmethod
+    def _replay_by_name(home, record):
+        # Logs written before devices had ids name the device instead, meaning every device of
+        # that name, and add devices without an id
+        op = record["op"]
+        if op == "add_device":
+            home.add_device(dict(record["device"]))
+            return
+        device_ids = home.device_ids(record["device"])
+        for device_id in device_ids:
+            if op == "remove_device":
+                home.remove_device(device_id)
+            elif op == "edit_device":
+                home.set_device_status(device_id, record["status"])
+            elif op == "toggle_device":
+                home.toggle_device(device_id)
+
+    # Mutations: one appended line each. Homes may be edited while a background load is still
+    # streaming; those calls wait until every home id is known
+    def add_home(self, home):
+        if self._defer(self.add_home, home):
+            return
+        home.home_id = self._next_home_id
+        self._next_home_id += 1
+        self._append({"op": "add_home", "home": home.home_id, "name": home.name})
+
+    def restore_home(self, home, before=None):
+        # Undo of a removal: the home comes back under its own id, with its devices, listed in
+        # front of before (a home, or None for the end)
+        if self._defer(self.restore_home, home, before):
+            return
+        self._append({"op": "restore_home", "home": home.home_id, "data": home.to_dict(),
+                      "before": None if before is None else before.home_id})
+
+    def remove_home(self, home):
+        if self._defer(self.remove_home, home):
+            return
+        self._append({"op": "remove_home", "home": home.home_id})
+
+    def add_device(self, home, device):
+        if self._defer(self.add_device, home, device):
+            return
+        self._append({"op": "add_device", "home": home.home_id, "device": device})
+
+    def remove_device(self, home, device_id):
+        if self._defer(self.remove_device, home, device_id):
+            return
+        self._append({"op": "remove_device", "home": home.home_id, "device": device_id})
+
+    def toggle_device(self, home, device_id):
+        self.edit_device(home, device_id, home.get_device(device_id)["status"])
+
+    def edit_device(self, home, device_id, status):
+        if self._defer(self.edit_device, home, device_id, status):
+            return
+        self._append({"op": "edit_device", "home": home.home_id, "device": device_id, "status": status})
+
+    def _defer(self, method, *args):
+        if self._loading:
+            self._deferred.append((method, args))
+        return self._loading
+
+    def _append(self, record):
+        if self._log is None:
+            self._open_log()
+        self._log.write(json.dumps(record) + "\n")
+        self._log.flush()
+        if self.sync:
+            os.fsync(self._log.fileno())
+        self._log_records += 1
+        if self._log_records >= self.compact_every:
+            self.compact()
+
+    def _open_log(self):
+        self._log = open(self.log_path, "a")
+
+    # Compaction: write a fresh snapshot, then start a log holding only the home id counter
+    def compact(self):
+        raw = json.dumps([dict(home.to_dict(), id=home.home_id) for home in self.homes]).encode()
+        self._write_atomic(self.path, raw)
+        if self._log is not None:
+            self._log.close()
+        self._write_atomic(self.log_path, (json.dumps({"next_home_id": self._next_home_id}) + "\n").encode())
+        self._open_log()
+        self._log_records = 0
+
+    def _write_atomic(self, path, raw):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(raw)
+            file.flush()
+            if self.sync:
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        # Every change is already on disk, so shutdown doesn't rewrite the snapshot
+        if self._log is not None:
+            self._log.close()
+            self._log = None
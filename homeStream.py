@@ -0,0 +1,71 @@
+import codecs
+import json
+
+def iter_json_array(file, chunk_size=1 << 16):
+    # Yields the elements of a top-level JSON array one at a time, holding at most one
+    # element plus one chunk of text in memory
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    eof = False
+    state = "start"
+    read_size = chunk_size
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            chunk = file.read(read_size)
+            eof = not chunk
+            buffer = text.decode(chunk, final=eof)
+            pos = 0
+            continue
+
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise ValueError("Expected a top-level JSON array")
+            pos += 1
+            state = "first"
+        elif state == "next":
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' at character {pos}")
+            pos += 1
+            state = "item"
+        else:
+            if state == "first" and char == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if len(buffer) - end <= 2 and not eof:
+                    # A number cut off at the chunk boundary still parses, as far as it goes: "1.5"
+                    # split after "1", "1." or "1.5e-" leaves up to two characters unread. Make
+                    # sure the element is complete
+                    raise json.JSONDecodeError("Element may continue", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element runs past the buffered text: read more, in growing steps
+                chunk = file.read(read_size)
+                read_size *= 2
+                eof = not chunk
+                buffer = buffer[pos:] + text.decode(chunk, final=eof)
+                pos = 0
+                continue
+            read_size = chunk_size
+            pos = end
+            state = "next"
+            yield value
+
+def iter_homes(path, factory, chunk_size=1 << 16):
+    try:
+        with open(path, "rb") as file:
+            for data in iter_json_array(file, chunk_size):
+                yield factory(data)
+    except FileNotFoundError:
+        return
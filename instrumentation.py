@@ -0,0 +1,238 @@
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import sys
+import time
+from array import array
+from contextlib import contextmanager
+
+# (module, class, method, metric). Only modules that are already imported get instrumented,
+# so enabling never pulls in Tk or a demo. "*" on a class also covers every subclass
+TARGETS = [
+    ("smartDevice", "SmartDevice", "toggle_switch", "device.toggle"),
+    ("smartDevice", "SmartDevice*", "_validate", "device.validate"),
+    ("smartDevice", "SmartDevice", "_store_option", "device.set_option"),
+    ("smartDevice", "SmartDevice", "__str__", "device.format"),
+    ("smartDevice", None, "set_option_values", "device.set_option_values"),
+    ("smart_plug", "SmartPlug", "toggle_switch", "device.toggle"),
+    ("smart_plug", "SmartPlug", "_validate", "device.validate"),
+    ("smart_plug", "SmartPlug", "_store_option", "device.set_option"),
+    ("smart_plug", "SmartPlug", "__str__", "device.format"),
+    ("deviceFleet", "DeviceFleet", "toggle", "fleet.toggle"),
+    ("deviceFleet", "DeviceFleet", "switch_all", "fleet.switch_all"),
+    ("smartHome", "SmartHome", "toggle_devices", "home.toggle_devices"),
+    ("smartHome", "SmartHome", "switch_all_on", "home.switch_all"),
+    ("smartHome", "SmartHome", "switch_all_off", "home.switch_all"),
+    ("homeModel", "SmartHome", "toggle_device", "home.toggle_device"),
+    ("homeModel", "SmartHome", "set_device_status", "home.set_device_status"),
+    ("homeStore", "HomeStore", "_append", "store.append"),
+    ("homeStore", "HomeStore", "_replay", "store.replay"),
+    ("homeStore", "HomeStore", "compact", "store.compact"),
+    ("homeStream", None, "iter_json_array", "store.parse"),
+    ("commandBuffer", "CommandBuffer", "flush", "commands.flush"),
+    ("changeBus", "ChangeBus", "flush", "bus.flush"),
+    ("virtualList", "VirtualDeviceList", "layout", "gui.layout"),
+    ("virtualList", "VirtualDeviceList", "redraw", "gui.redraw"),
+    ("Challenge1", "SmartHomesApp", "create_main_screen", "gui.create_main_screen"),
+    ("Challenge1", "SmartHomesApp", "repaint", "gui.repaint"),
+    ("Challenge", "SmartHomesApp", "create_main_menu", "gui.create_main_menu"),
+    ("CompleteApp", "SmartHomeGUI", "update_ui", "gui.update_ui"),
+    ("smartHomeApp", "SmartHomeApp", "display_devices", "gui.display_devices"),
+]
+
+class Stat:
+    # Call count and total time, plus the most recent samples for percentiles
+    def __init__(self, name, capacity=1 << 16):
+        self.name = name
+        self.capacity = capacity
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = array("d")
+
+    def add(self, seconds):
+        if self.count < self.capacity:
+            self._samples.append(seconds)
+        else:
+            self._samples[self.count % self.capacity] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        return _pick(sorted(self._samples), p)
+
+    def summary(self):
+        ordered = sorted(self._samples)
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "p50": _pick(ordered, 50), "p90": _pick(ordered, 90), "p99": _pick(ordered, 99), "max": self.max}
+
+    def histogram(self):
+        # Power-of-two buckets in microseconds: {upper bound: samples}
+        buckets = {}
+        for seconds in self._samples:
+            bound = 1
+            while bound < seconds * 1e6:
+                bound *= 2
+            buckets[bound] = buckets.get(bound, 0) + 1
+        return dict(sorted(buckets.items()))
+
+def _pick(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+class Registry:
+    def __init__(self):
+        self.stats = {}
+        self.enabled = False
+        self._patches = []
+
+    def stat(self, name):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = Stat(name)
+        return stat
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stat(name).add(time.perf_counter() - start)
+
+    def query(self, prefix=""):
+        return {name: stat.summary() for name, stat in sorted(self.stats.items()) if name.startswith(prefix)}
+
+    def reset(self):
+        self.stats.clear()
+
+    # Instrumentation is patched in on enable() and removed on disable(), so code paths carry
+    # no timing hooks at all while it is off
+    def enable(self, targets=TARGETS):
+        if self.enabled:
+            return
+        self.enabled = True
+        for module_name, class_name, method, metric in targets:
+            module = _loaded(module_name)
+            if module is None:
+                continue
+            if class_name is None:
+                # Functions are also patched wherever they were imported by name
+                original = module.__dict__.get(method)
+                for other in list(sys.modules.values()):
+                    if original is not None and getattr(other, method, None) is original:
+                        self._patch(other, method, metric)
+                continue
+            cls = getattr(module, class_name.rstrip("*"), None)
+            if cls is None:
+                continue
+            owners = [cls] + (_subclasses(cls) if class_name.endswith("*") else [])
+            for owner in owners:
+                if method in owner.__dict__:
+                    self._patch(owner, method, metric)
+
+    def disable(self):
+        for owner, method, original in reversed(self._patches):
+            setattr(owner, method, original)
+        self._patches = []
+        self.enabled = False
+
+    def _patch(self, owner, method, metric):
+        original = vars(owner).get(method)
+        if original is None:
+            return
+        stat = self.stat(metric)
+        if isinstance(original, staticmethod):
+            wrapped = staticmethod(_timed(original.__func__, stat))
+        else:
+            wrapped = _timed(original, stat)
+        setattr(owner, method, wrapped)
+        self._patches.append((owner, method, original))
+
+    def report(self):
+        lines = [f"{'metric':<28}{'count':>9}{'total ms':>11}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}"]
+        for name, summary in self.query().items():
+            if summary["count"]:
+                lines.append(f"{name:<28}{summary['count']:>9}{summary['total'] * 1e3:>11.2f}"
+                             f"{summary['p50'] * 1e6:>10.1f}{summary['p90'] * 1e6:>10.1f}"
+                             f"{summary['p99'] * 1e6:>10.1f}{summary['max'] * 1e6:>10.1f}")
+        for name, stat in sorted(self.stats.items()):
+            if stat.count:
+                bars = "  ".join(f"<={bound}us:{samples}" for bound, samples in stat.histogram().items())
+                lines.append(f"{name}: {bars}")
+        return "\n".join(lines)
+
+def _timed(func, stat):
+    clock = time.perf_counter
+    if inspect.isgeneratorfunction(func):
+        # Generators are timed across every step, not just their creation
+        @functools.wraps(func)
+        def timed_generator(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            while True:
+                start = clock()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    stat.add(clock() - start)
+                    return
+                stat.add(clock() - start)
+                yield item
+        return timed_generator
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stat.add(clock() - start)
+    return timed
+
+def _loaded(module_name):
+    module = sys.modules.get(module_name)
+    if module is None:
+        # An entry point run as a script is imported as __main__
+        main = sys.modules.get("__main__")
+        if getattr(main, "__file__", "").endswith(f"{module_name}.py"):
+            module = main
+    return module
+
+def _subclasses(cls):
+    found = []
+    for sub in cls.__subclasses__():
+        found.append(sub)
+        found.extend(_subclasses(sub))
+    return found
+
+registry = Registry()
+
+@contextmanager
+def profile_session(argv=None, pstats_path="profile.pstats", out=None):
+    # Wraps an app's main block: with --profile on the command line, every target is timed and
+    # cProfile runs until exit, then the latency table, histograms and hottest functions are printed
+    argv = sys.argv if argv is None else argv
+    if "--profile" not in argv:
+        yield None
+        return
+    argv.remove("--profile")
+    out = out or sys.stderr
+    registry.enable()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield registry
+    finally:
+        profiler.disable()
+        registry.disable()
+        profiler.dump_stats(pstats_path)
+        print(registry.report(), file=out)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(30)
+        print(text.getvalue(), file=out)
+        print(f"cProfile data written to {pstats_path}", file=out)
@@ -0,0 +1,183 @@
+import math
+import time
+
+from deviceCommands import apply_command
+
+def _next_local(hour, minute, after):
+    # First local hour:minute later than after, stepping calendar days (mktime normalises the
+    # day of month) rather than adding 86400 s
+    local = time.localtime(after)
+    day = local.tm_mday
+    while True:
+        when = time.mktime((local.tm_year, local.tm_mon, day, hour, minute, 0, 0, 0, -1))
+        if when > after:
+            return when
+        day += 1
+
+class Timer:
+    __slots__ = ("tick", "device", "command", "value", "interval", "at", "cancelled", "_scheduler")
+
+    def __init__(self, scheduler, tick, device, command, value, interval, at=None):
+        self._scheduler = scheduler
+        self.tick = tick
+        self.device = device
+        self.command = command
+        self.value = value
+        self.interval = interval
+        # (hour, minute) for timers repeating at a local time of day
+        self.at = at
+        self.cancelled = False
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+class Scheduler:
+    # Hierarchical timing wheel. Level 0 has one slot per tick; each higher level has one slot per
+    # full turn of the level below, and its slots are redistributed downwards as time reaches them.
+    # Inserting is a list append and cancelling just marks the timer, so both are O(1); cancelled
+    # timers are dropped when their slot comes up
+    LEVEL_BITS = (8, 6, 6, 6)
+
+    def __init__(self, dispatch=None, tick=1.0, clock=time.time):
+        self.dispatch = dispatch or self.apply_actions
+        self.tick = tick
+        self.clock = clock
+        self._now = self._ticks_floor(clock())
+        self._levels = []
+        shift = 0
+        for bits in self.LEVEL_BITS:
+            self._levels.append((shift, bits, [[] for _ in range(1 << bits)]))
+            shift += bits
+        # Bit i set while level 0 slot i holds timers, so advance() can skip the empty ones
+        self._occupied = 0
+        self._active = 0
+        self.fired = 0
+        self.failed = []
+
+    def __len__(self):
+        return self._active
+
+    def _ticks_floor(self, when):
+        return int(when // self.tick)
+
+    # Scheduling
+    def call_at(self, when, device, command, value=None, interval=None, at=None):
+        timer = Timer(self, self._tick_at(when), device, command, value,
+                      None if interval is None else max(1, round(interval / self.tick)), at)
+        self._place(timer)
+        self._active += 1
+        return timer
+
+    def _tick_at(self, when):
+        return max(math.ceil(when / self.tick), self._now + 1)
+
+    def call_later(self, delay, device, command, value=None, interval=None):
+        return self.call_at(self.clock() + delay, device, command, value, interval)
+
+    def daily(self, hour, minute, device, command, value=None):
+        # Every day at local hour:minute. Each run is placed from the calendar rather than 24 hours
+        # after the last, so the time of day holds across DST changes
+        return self.call_at(_next_local(hour, minute, self.clock()), device, command, value, at=(hour, minute))
+
+    def cancel(self, timer):
+        if not timer.cancelled:
+            timer.cancelled = True
+            self._active -= 1
+
+    def _place(self, timer):
+        delta = timer.tick - self._now
+        for shift, bits, slots in self._levels:
+            if delta < 1 << (shift + bits):
+                break
+        # Too far out for the top level: parked there and placed again when its slot comes round
+        index = (timer.tick >> shift) & ((1 << bits) - 1)
+        slots[index].append(timer)
+        if shift == 0:
+            self._occupied |= 1 << index
+
+    # Firing
+    def advance(self, now=None):
+        # Moves the wheel up to now and dispatches everything due as one batch
+        target = self._ticks_floor(self.clock() if now is None else now)
+        due = []
+        level0 = self._levels[0][2]
+        mask0 = len(level0) - 1
+        while self._now < target:
+            # Straight to the next slot holding timers, or to the next turn, where the level
+            # above is cascaded down
+            pending = self._occupied >> ((self._now & mask0) + 1)
+            tick = self._now + ((pending & -pending).bit_length() if pending else len(level0) - (self._now & mask0))
+            if tick > target:
+                self._now = target
+                break
+            self._now = tick
+            if tick & mask0 == 0:
+                self._cascade(1, tick)
+            index = tick & mask0
+            slot = level0[index]
+            if not slot:
+                continue
+            level0[index] = []
+            self._occupied &= ~(1 << index)
+            for timer in slot:
+                if timer.cancelled:
+                    continue
+                if timer.tick > tick:
+                    self._place(timer)
+                    continue
+                due.append(timer)
+        if not due:
+            return 0
+        repeating = [timer for timer in due if timer.interval is not None or timer.at is not None]
+        self._active -= len(due) - len(repeating)
+        for timer in repeating:
+            # Runs missed while the wheel was not being advanced are skipped, not replayed
+            if timer.at is not None:
+                timer.tick = self._tick_at(_next_local(*timer.at, self._now * self.tick))
+            else:
+                timer.tick += timer.interval * ((self._now - timer.tick) // timer.interval + 1)
+            self._place(timer)
+        for timer in due:
+            if timer.interval is None and timer.at is None:
+                timer.cancelled = True
+        self.dispatch(due)
+        self.fired += len(due)
+        return len(due)
+
+    def _cascade(self, level, tick):
+        if level >= len(self._levels):
+            return
+        shift, bits, slots = self._levels[level]
+        index = (tick >> shift) & ((1 << bits) - 1)
+        if index == 0:
+            self._cascade(level + 1, tick)
+        timers, slots[index] = slots[index], []
+        for timer in timers:
+            if not timer.cancelled:
+                self._place(timer)
+
+    def apply_actions(self, timers):
+        # A timer's command is a device command name, or a callable run as command(device, value)
+        for timer in timers:
+            try:
+                if callable(timer.command):
+                    timer.command(timer.device, timer.value)
+                else:
+                    apply_command(timer.device, timer.command, timer.value)
+            except Exception as error:
+                self.failed.append((timer, error))
+
+    # Drivers: the Tk mainloop, or a plain loop for headless use
+    def attach(self, root):
+        interval = max(1, int(self.tick * 1000))
+
+        def poll():
+            self.advance()
+            root.after(interval, poll)
+        root.after(interval, poll)
+
+    def run(self, until=None, sleep=time.sleep):
+        while until is None or self.clock() < until:
+            self.advance()
+            sleep(self.tick)
+        self.advance()
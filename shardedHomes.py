@@ -0,0 +1,241 @@
+import json
+import multiprocessing
+import os
+import zlib
+
+from homeStore import HomeStore
+from homeModel import SmartHome
+
+# A home key carries its shard: key = local home id * shard count + shard number
+def shard_of(key, shards):
+    return key % shards
+
+class Shard:
+    # Runs inside a worker process and owns the homes of one partition plus their store
+    def __init__(self, path, compact_every):
+        self.store = HomeStore(path, compact_every=compact_every)
+        self.homes = {home.home_id: home for home in self.store.load(SmartHome.from_dict)}
+
+    def add_home(self, name):
+        home = SmartHome(name)
+        # In the store's homes first: logging the add can trigger a compaction, and the snapshot
+        # it writes has to include this home
+        self.store.homes.append(home)
+        self.store.add_home(home)
+        self.homes[home.home_id] = home
+        return home.home_id
+
+    def remove_home(self, home_id):
+        home = self.homes.pop(home_id)
+        self.store.homes.remove(home)
+        self.store.remove_home(home)
+
+    def home(self, home_id):
+        return self.homes[home_id].to_dict()
+
+    def list_homes(self):
+        return [(home_id, home.name) for home_id, home in self.homes.items()]
+
+    def add_device(self, home_id, device):
+        home = self.homes[home_id]
+        device_id = home.add_device(dict(device))
+        self.store.add_device(home, home.get_device(device_id))
+        return device_id
+
+    def remove_device(self, home_id, device_id):
+        home = self.homes[home_id]
+        home.remove_device(device_id)
+        self.store.remove_device(home, device_id)
+
+    def toggle_device(self, home_id, device_id):
+        home = self.homes[home_id]
+        home.toggle_device(device_id)
+        self.store.toggle_device(home, device_id)
+        return home.get_device(device_id)["status"]
+
+    def set_device_status(self, home_id, device_id, status):
+        home = self.homes[home_id]
+        home.set_device_status(device_id, status)
+        self.store.edit_device(home, device_id, status)
+
+    def switch_all(self, status):
+        changed = 0
+        for home in self.homes.values():
+            for device in home.devices:
+                if device["status"] != status:
+                    self.set_device_status(home.home_id, device["id"], status)
+                    changed += 1
+        return changed
+
+    def count_on(self):
+        return sum(device["status"] == "on" for home in self.homes.values() for device in home.devices)
+
+    def batch(self, commands):
+        results = []
+        for op, args in commands:
+            try:
+                results.append(("ok", getattr(self, op)(*args)))
+            except Exception as error:
+                results.append(("error", error))
+        return results
+
+    def compact(self):
+        self.store.compact()
+
+def _serve(conn, path, compact_every):
+    try:
+        shard = Shard(path, compact_every)
+    except Exception as error:
+        conn.send(("error", error))
+        return
+    conn.send(("ok", None))
+    while True:
+        op, args = conn.recv()
+        if op == "close":
+            shard.store.close()
+            conn.send(("ok", None))
+            return
+        try:
+            conn.send(("ok", getattr(shard, op)(*args)))
+        except Exception as error:
+            conn.send(("error", error))
+
+class ShardedHomes:
+    # Homes partitioned across worker processes, each with its own HomeStore under directory.
+    # Calls for one home go to one worker; fleet-wide calls are sent to every worker before
+    # any reply is read, so the shards work in parallel. Scripts and benchmark.py drive it;
+    # the Tk apps still keep their homes in process (Challenge1 through its own HomeStore)
+    def __init__(self, directory="shards", workers=None, compact_every=1000):
+        os.makedirs(directory, exist_ok=True)
+        self.workers = self._shard_count(directory, workers or os.cpu_count() or 1)
+        self._conns = []
+        self._processes = []
+        for number in range(self.workers):
+            parent, child = multiprocessing.Pipe()
+            path = os.path.join(directory, f"shard-{number}.json")
+            process = multiprocessing.Process(target=_serve, args=(child, path, compact_every), daemon=True)
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+        for conn in self._conns:
+            self._result(conn.recv())
+
+    @staticmethod
+    def _shard_count(directory, workers):
+        # Keys encode their shard, so an existing layout keeps the count it was created with
+        layout = os.path.join(directory, "shards.json")
+        try:
+            with open(layout) as file:
+                saved = json.load(file)["workers"]
+        except FileNotFoundError:
+            with open(layout, "w") as file:
+                json.dump({"workers": workers}, file)
+            return workers
+        if saved != workers:
+            raise ValueError(f"{directory} holds {saved} shards; open it with workers={saved}.")
+        return saved
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _result(reply):
+        status, value = reply
+        if status == "error":
+            raise value
+        return value
+
+    def _call(self, shard, op, *args):
+        conn = self._conns[shard]
+        conn.send((op, args))
+        return self._result(conn.recv())
+
+    def _fan_out(self, op, *args):
+        for conn in self._conns:
+            conn.send((op, args))
+        return [self._result(conn.recv()) for conn in self._conns]
+
+    def _route(self, key):
+        return shard_of(key, self.workers), key // self.workers
+
+    # Command API
+    def add_home(self, name):
+        shard = zlib.crc32(name.encode()) % self.workers
+        return self._call(shard, "add_home", name) * self.workers + shard
+
+    def remove_home(self, key):
+        shard, home_id = self._route(key)
+        self._call(shard, "remove_home", home_id)
+
+    def home(self, key):
+        shard, home_id = self._route(key)
+        return self._call(shard, "home", home_id)
+
+    def homes(self):
+        return sorted((home_id * self.workers + shard, name)
+                      for shard, homes in enumerate(self._fan_out("list_homes"))
+                      for home_id, name in homes)
+
+    def add_device(self, key, device):
+        shard, home_id = self._route(key)
+        return self._call(shard, "add_device", home_id, device)
+
+    def remove_device(self, key, device_id):
+        shard, home_id = self._route(key)
+        self._call(shard, "remove_device", home_id, device_id)
+
+    def toggle_device(self, key, device_id):
+        shard, home_id = self._route(key)
+        return self._call(shard, "toggle_device", home_id, device_id)
+
+    def set_device_status(self, key, device_id, status):
+        shard, home_id = self._route(key)
+        self._call(shard, "set_device_status", home_id, device_id, status)
+
+    def switch_all(self, status):
+        return sum(self._fan_out("switch_all", status))
+
+    def turn_all_on(self):
+        return self.switch_all("on")
+
+    def turn_all_off(self):
+        return self.switch_all("off")
+
+    def count_on(self):
+        return sum(self._fan_out("count_on"))
+
+    def execute(self, commands):
+        # commands: (op, key, *args) tuples. Each shard gets its share in one message and the
+        # results come back in the order given; failed commands are returned as exceptions
+        groups = [[] for _ in range(self.workers)]
+        for position, (op, key, *args) in enumerate(commands):
+            shard, home_id = self._route(key)
+            groups[shard].append((position, op, (home_id, *args)))
+        busy = []
+        for shard, group in enumerate(groups):
+            if group:
+                self._conns[shard].send(("batch", ([(op, args) for _, op, args in group],)))
+                busy.append(shard)
+        results = [None] * len(commands)
+        for shard in busy:
+            for (position, _, _), (status, value) in zip(groups[shard], self._result(self._conns[shard].recv())):
+                results[position] = value
+        return results
+
+    def compact(self):
+        self._fan_out("compact")
+
+    def close(self):
+        if not self._conns:
+            return
+        self._fan_out("close")
+        for conn in self._conns:
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._conns = []
+        self._processes = []
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from smartDevice import DEVICE_REGISTRY, set_bus
+from smartHome import SmartHome
+from homeModel import SmartHome as DictHome
+from homeStore import HomeStore
+from changeBus import ChangeBus
+from deviceCommands import apply_command
+from instrumentation import Stat
+
+OPS = ("toggle", "option", "add", "remove", "bulk")
+DEFAULT_MIX = "toggle=50,option=30,add=8,remove=7,bulk=5"
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPS:
+            raise ValueError(f"Unknown operation {op!r}; choose from {', '.join(OPS)}.")
+        weights[op] = float(weight or 1)
+    return list(weights), list(weights.values())
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # No /proc: the peak is the closest thing available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class Fleet:
+    # homes x devices of the registered device classes in smartHome homes. With a store, every
+    # home also has a homeModel mirror of its switch states that is written through a HomeStore,
+    # which is what the apps persist (option values are not part of homes.json)
+    def __init__(self, homes, devices, seed, columnar=False, store=None):
+        self.rng = random.Random(seed)
+        self.types = sorted(DEVICE_REGISTRY)
+        self.values = {name: sorted(info.option_range) for name, info in DEVICE_REGISTRY.items()}
+        self.store = store
+        self.homes = []
+        self.mirrors = []
+        # Per home, device position -> mirror device id; both sides append and pop by position
+        self.ids = []
+        for number in range(homes):
+            home = SmartHome(columnar=columnar)
+            mirror = DictHome(f"home {number}") if store is not None else None
+            ids = [self._add(home, mirror, self.rng.choice(self.types)) for _ in range(devices)]
+            self.homes.append(home)
+            self.mirrors.append(mirror)
+            self.ids.append(ids)
+            if store is not None:
+                # Listed before it is logged: the add can trigger a compaction, whose snapshot has
+                # to include this home
+                store.homes.append(mirror)
+                store.add_home(mirror)
+        if store is not None:
+            # The starting fleet goes into the snapshot rather than the log
+            store.compact()
+
+    def __len__(self):
+        return sum(len(home.devices) for home in self.homes)
+
+    def _add(self, home, mirror, name):
+        info = DEVICE_REGISTRY[name]
+        home.add_device(info.cls(info.default_value))
+        if mirror is not None:
+            return mirror.add_device({"name": name, "status": "off"})
+
+    def generate(self, ops, weights):
+        # A seeded operation that is valid against the fleet as it stands now
+        rng = self.rng
+        home_index = rng.randrange(len(self.homes))
+        home = self.homes[home_index]
+        op = rng.choices(ops, weights)[0]
+        count = len(home.devices)
+        if op == "add" or not count:
+            return ["add", home_index, rng.choice(self.types)]
+        if op == "bulk":
+            return ["bulk", home_index, rng.random() < 0.5]
+        index = rng.randrange(count)
+        if op == "option":
+            device = home.devices[index]
+            name = device.device_type.name if hasattr(device, "device_type") else type(device).__name__
+            return ["option", home_index, index, rng.choice(self.values[name])]
+        return [op, home_index, index]
+
+    def apply(self, op):
+        kind, home_index = op[0], op[1]
+        home = self.homes[home_index]
+        mirror = self.mirrors[home_index]
+        ids = self.ids[home_index]
+        store = self.store
+        if kind == "toggle":
+            home.toggle_device(op[2])
+            if store is not None:
+                device_id = ids[op[2]]
+                status = "on" if home.devices[op[2]]._switched_on else "off"
+                mirror.set_device_status(device_id, status)
+                store.edit_device(mirror, device_id, status)
+        elif kind == "option":
+            apply_command(home.get_device(op[2]), "option", op[3])
+        elif kind == "add":
+            device_id = self._add(home, mirror, op[2])
+            if store is not None:
+                ids.append(device_id)
+                store.add_device(mirror, mirror.get_device(device_id))
+        elif kind == "remove":
+            home.remove_device(op[2])
+            if store is not None:
+                device_id = ids.pop(op[2])
+                mirror.remove_device(device_id)
+                store.remove_device(mirror, device_id)
+        elif kind == "bulk":
+            if op[2]:
+                home.switch_all_on()
+            else:
+                home.switch_all_off()
+            if store is not None:
+                status = "on" if op[2] else "off"
+                for device_id in ids:
+                    if mirror.get_device(device_id)["status"] != status:
+                        mirror.set_device_status(device_id, status)
+                        store.edit_device(mirror, device_id, status)
+        else:
+            raise ValueError(f"Unknown operation {kind!r}.")
+
+def open_store(path, compact_every):
+    store = HomeStore(path, compact_every=compact_every)
+    for existing in (path, store.log_path):
+        if os.path.exists(existing):
+            raise ValueError(f"{existing} already exists; the simulator starts from an empty store.")
+    return store
+
+def simulate(homes, devices, ops, seed=0, mix=DEFAULT_MIX, columnar=False, store_path=None, compact_every=1000,
+             bus=False, record=None, replay=None, samples=20, out=None):
+    # Returns {"ops", "seconds", "latency": {op: summary}, "timeline": [...]} for one run
+    workload = None
+    if replay is not None:
+        with open(replay) as file:
+            header = json.loads(file.readline())
+            workload = [json.loads(line) for line in file]
+        # Ops address devices by position, so one recording drives list and columnar homes alike
+        homes, devices, seed = header["homes"], header["devices"], header["seed"]
+        ops = len(workload)
+    change_bus = None
+    if bus:
+        change_bus = ChangeBus()
+        change_bus.subscribe(lambda changes: None)
+        set_bus(change_bus)
+    store = open_store(store_path, compact_every) if store_path else None
+    try:
+        start = time.perf_counter()
+        fleet = Fleet(homes, devices, seed, columnar, store)
+        build = time.perf_counter() - start
+        names, weights = parse_mix(mix)
+        stats = {op: Stat(op) for op in OPS}
+        overall = Stat("all")
+        recorded = [] if record is not None else None
+        timeline = []
+        every = max(1, ops // samples)
+        clock = time.perf_counter
+        began = clock()
+        mark = (0, began)
+        for number in range(ops):
+            op = workload[number] if workload is not None else fleet.generate(names, weights)
+            if recorded is not None:
+                recorded.append(op)
+            t0 = clock()
+            fleet.apply(op)
+            took = clock() - t0
+            stats[op[0]].add(took)
+            overall.add(took)
+            if (number + 1) % every == 0 or number + 1 == ops:
+                now = clock()
+                done, then = mark
+                timeline.append({"ops": number + 1, "seconds": now - began,
+                                 "ops_per_s": (number + 1 - done) / (now - then) if now > then else 0.0,
+                                 "devices": len(fleet), "rss_mb": _rss_mb()})
+                mark = (number + 1, now)
+                if out is not None:
+                    point = timeline[-1]
+                    print(f"{point['ops']:>10}{point['seconds']:>9.2f}{point['ops_per_s']:>12,.0f}"
+                          f"{point['devices']:>10}{point['rss_mb']:>9.1f}", file=out)
+        elapsed = clock() - began
+    finally:
+        if store is not None:
+            store.close()
+        if bus:
+            set_bus(None)
+    if recorded is not None:
+        with open(record, "w") as file:
+            file.write(json.dumps({"homes": homes, "devices": devices, "seed": seed}) + "\n")
+            for op in recorded:
+                file.write(json.dumps(op) + "\n")
+    return {"homes": homes, "devices": devices, "ops": ops, "build_seconds": build, "seconds": elapsed,
+            "ops_per_s": ops / elapsed if elapsed else 0.0,
+            "latency": {op: stat.summary() for op, stat in stats.items() if stat.count},
+            "overall": overall.summary(),
+            "timeline": timeline}
+
+def print_latency(result, out):
+    print(f"{'op':<8}{'count':>9}{'mean us':>10}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}", file=out)
+    for op, summary in result["latency"].items():
+        print(f"{op:<8}{summary['count']:>9}{summary['mean'] * 1e6:>10.2f}{summary['p50'] * 1e6:>10.2f}"
+              f"{summary['p90'] * 1e6:>10.2f}{summary['p99'] * 1e6:>10.2f}{summary['max'] * 1e6:>10.1f}", file=out)
+
+def _store_path(args, tmp, label=""):
+    if args.store:
+        # Each scale size starts from an empty store of its own: homes.json -> homes-10.json
+        root, ext = os.path.splitext(args.store)
+        return f"{root}{label}{ext or '.json'}" if label else args.store
+    if args.persist:
+        return os.path.join(tmp, f"homes{label}.json")
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless load generation against SmartHome and HomeStore.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("run", "one seeded or recorded workload, with a timeline and latency table"),
+                            ("scale", "the same workload across fleet sizes")):
+        command = commands.add_parser(name, help=help_text)
+        if name == "run":
+            command.add_argument("--homes", type=int, default=100)
+            command.add_argument("--record", metavar="FILE", help="write the generated workload here")
+            command.add_argument("--replay", metavar="FILE", help="run a recorded workload instead of generating one")
+            command.add_argument("--samples", type=int, default=20, help="timeline points")
+        else:
+            command.add_argument("--homes", type=int, nargs="+", default=[10, 100, 1_000, 10_000])
+        command.add_argument("--devices", type=int, default=50, help="devices per home")
+        command.add_argument("--ops", type=int, default=100_000)
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. toggle=3,option=1")
+        command.add_argument("--columnar", action="store_true", help="DeviceFleet homes instead of object lists")
+        command.add_argument("--bus", action="store_true", help="publish every change on a ChangeBus")
+        command.add_argument("--persist", action="store_true", help="write through a HomeStore in a temporary directory")
+        command.add_argument("--store", metavar="PATH", help="write through a HomeStore at this homes.json path")
+        command.add_argument("--compact-every", type=int, default=1000)
+        command.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+    out = sys.stdout
+    options = dict(seed=args.seed, mix=args.mix, columnar=args.columnar, compact_every=args.compact_every, bus=args.bus)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.command == "run":
+            print(f"{'ops':>10}{'s':>9}{'ops/s':>12}{'devices':>10}{'RSS MB':>9}", file=out)
+            result = simulate(args.homes, args.devices, args.ops, store_path=_store_path(args, tmp),
+                              record=args.record, replay=args.replay, samples=args.samples, out=out, **options)
+            print(f"{result['homes']} homes x {result['devices']} devices: built in {result['build_seconds']:.2f} s, "
+                  f"{result['ops']} ops in {result['seconds']:.2f} s ({result['ops_per_s']:,.0f} ops/s)", file=out)
+            print_latency(result, out)
+            results = result
+        else:
+            print(f"{'homes':>8}{'devices':>10}{'ops/s':>12}{'p50 us':>9}{'p99 us':>9}{'RSS MB':>9}", file=out)
+            results = []
+            for homes in args.homes:
+                result = simulate(homes, args.devices, args.ops, store_path=_store_path(args, tmp, f"-{homes}"),
+                                  samples=1, **options)
+                overall = result["overall"]
+                print(f"{homes:>8}{homes * args.devices:>10}{result['ops_per_s']:>12,.0f}{overall['p50'] * 1e6:>9.2f}"
+                      f"{overall['p99'] * 1e6:>9.2f}{result['timeline'][-1]['rss_mb']:>9.1f}", file=out)
+                results.append(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=1)
+
+if __name__ == "__main__":
+    main()
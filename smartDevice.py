@@ -1,18 +1,150 @@
+import math
+from contextlib import nullcontext
+
+from changeBus import SWITCH_CHANGED, OPTION_CHANGED
+
+class Interval:
+    # Closed numeric range that, unlike range(), also holds the floats in between. Iterating it
+    # gives the whole numbers inside, e.g. for picking sample values
+    __slots__ = ("low", "high")
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def __contains__(self, value):
+        return type(value) in (int, float) and self.low <= value <= self.high
+
+    def __iter__(self):
+        return iter(range(math.ceil(self.low), math.floor(self.high) + 1))
+
+    def __eq__(self, other):
+        return isinstance(other, Interval) and (self.low, self.high) == (other.low, other.high)
+
+    def __hash__(self):
+        return hash((Interval, self.low, self.high))
+
+    def __repr__(self):
+        return f"Interval({self.low}, {self.high})"
+
+def compile_validator(option_range):
+    # Built once per device class so writes don't pay for a generic membership test
+    if isinstance(option_range, Interval):
+        low, high = option_range.low, option_range.high
+        def validate(value):
+            return type(value) in (int, float) and low <= value <= high
+    elif isinstance(option_range, range) and option_range.step == 1:
+        low, high = option_range.start, option_range.stop
+        def validate(value):
+            if type(value) is int:
+                return low <= value < high
+            return value in option_range
+    else:
+        choices = frozenset(option_range)
+        def validate(value):
+            try:
+                return value in choices
+            except TypeError:
+                # Unhashable values such as lists can't be a choice
+                return False
+    return validate
+
+class DeviceTypeInfo:
+    # Shared description of one device class: every instance of the class points at the same one
+    __slots__ = ("cls", "name", "option_name", "option_range", "default_value", "label", "template", "_parts")
+
+    def __init__(self, cls, label, template="{name} is {state} with {value}"):
+        self.cls = cls
+        self.name = cls.__name__
+        self.option_name = cls._option_name
+        self.option_range = cls._option_range
+        self.default_value = cls._default_value
+        self.label = label
+        self.template = template
+        # Everything around the value is fixed per type and state, so it is filled in up front
+        head, _, tail = template.partition("{value}")
+        self._parts = tuple((head.format(name=self.name, state=state, label=label),
+                             tail.format(name=self.name, state=state, label=label))
+                            for state in ("off", "on"))
+
+    def format(self, switched_on, value):
+        head, tail = self._parts[1 if switched_on else 0]
+        return f"{head}{value}{tail}"
+
+# Class name -> DeviceTypeInfo for every registered device class (homeModel.DEVICE_TYPES is
+# the list of names offered for dict devices)
+DEVICE_REGISTRY = {}
+
+def register_device_type(cls, label, template="{name} is {state} with {value}"):
+    info = DEVICE_REGISTRY[cls.__name__] = DeviceTypeInfo(cls, label, template)
+    return info
+
+def set_bus(bus):
+    # One bus for every device class: homes batch and suppress on it, so a class publishing
+    # elsewhere would slip past them. Classes with a bus attribute of their own (SmartPlug) follow
+    SmartDevice.bus = bus
+    for info in DEVICE_REGISTRY.values():
+        if "bus" in info.cls.__dict__:
+            info.cls.bus = bus
+
 class SmartDevice:
-    def __init__(self, option_value, option_range, default_value):
-        if option_value not in option_range:
-            raise ValueError(f"Option value must be within {option_range}.")
-        self._switched_on = False
+    # Range, default and validator live on the class; instances only carry their own state and
+    # the display string last built from it
+    __slots__ = ("_on", "_option_value", "_text")
+    _option_range = None
+    _default_value = None
+    _option_name = "option_value"
+    # Shared by every device; a ChangeBus here receives switch and option changes. Set it
+    # through set_bus so every device class uses the same one
+    bus = None
+
+    def __init_subclass__(cls, ranged=False, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "_option_range" in cls.__dict__:
+            cls._validate = staticmethod(compile_validator(cls._option_range))
+            cls._range_error = f"Option value must be within {cls._option_range}."
+            # Per-range classes made by _with_range stand in for their parent and stay out of
+            # the registry
+            if ranged:
+                cls._type = DeviceTypeInfo(cls, getattr(cls, "_label", "Setting"))
+            else:
+                cls._type = register_device_type(cls, cls.__dict__.get("_label", "Setting"))
+
+    def __init__(self, option_value, option_range=None, default_value=None):
+        cls = type(self)
+        if option_range is not None and option_range is not cls._option_range \
+                and option_range != cls._option_range:
+            self.__class__ = _with_range(cls, option_range, default_value)
+        elif cls._option_range is None:
+            raise TypeError(f"{cls.__name__} needs an option range.")
+        if not self._validate(option_value):
+            raise ValueError(self._range_error)
+        self._on = False
         self._option_value = option_value
-        self._option_range = option_range
-        self._default_value = default_value
+        self._text = None
+    
+    # Written directly by commands and rollbacks too, so every write drops the cached string
+    @property
+    def _switched_on(self):
+        return self._on
+    
+    @_switched_on.setter
+    def _switched_on(self, value):
+        self._on = value
+        self._text = None
     
     def toggle_switch(self):
-        self._switched_on = not self._switched_on
+        on = self._on = not self._on
+        self._text = None
+        if self.bus is not None:
+            self.bus.publish(SWITCH_CHANGED, self, not on, on)
     
     def __str__(self):
-        state = "on" if self._switched_on else "off"
-        return f"{self.__class__.__name__} is {state} with {self._option_value}"
+        # Redraws ask for every visible device; only a state or option change rebuilds the string
+        text = self._text
+        if text is None:
+            text = self._text = self._type.format(self._on, self._option_value)
+        return text
     
     @property
     def option_value(self):
@@ -20,49 +152,143 @@ class SmartDevice:
     
     @option_value.setter
     def option_value(self, value):
-        if value not in self._option_range:
-            raise ValueError(f"Option value must be within {self._option_range}.")
+        if not self._validate(value):
+            raise ValueError(self._range_error)
+        self._store_option(value)
+
+    def _store_option(self, value):
+        old = self._option_value
         self._option_value = value
+        self._text = None
+        if self.bus is not None:
+            self.bus.publish(OPTION_CHANGED, self, old, value)
+
+_ranged_classes = {}
+
+def _with_range(cls, option_range, default_value):
+    # Devices built with a range of their own, as SmartDevice(value, range, default) or a
+    # subclass without a class-level _option_range, are moved to a cached subclass that carries
+    # it, so instances keep the slot-only layout
+    try:
+        key = (cls, option_range, default_value)
+        ranged = _ranged_classes.get(key)
+    except TypeError:
+        key = (cls, frozenset(option_range), default_value)
+        ranged = _ranged_classes.get(key)
+    if ranged is None:
+        namespace = {"__slots__": (), "__module__": cls.__module__, "__qualname__": cls.__qualname__,
+                     "_option_range": option_range, "_default_value": default_value}
+        ranged = _ranged_classes[key] = type(cls)(cls.__name__, (cls,), namespace, ranged=True)
+    return ranged
 
 class SmartLight(SmartDevice):
+    __slots__ = ()
+    _label = "Brightness"
+    _option_range = range(1, 101)
+    _default_value = 50
+
     def __init__(self, brightness=50):
-        super().__init__(brightness, range(1, 101), 50)
+        super().__init__(brightness, self._option_range, self._default_value)
 
 class SmartFridge(SmartDevice):
+    __slots__ = ()
+    _label = "Temperature"
+    _option_range = {1, 3, 5}
+    _default_value = 3
+
     def __init__(self, temperature=3):
-        super().__init__(temperature, {1, 3, 5}, 3)
+        super().__init__(temperature, self._option_range, self._default_value)
 
 class SmartHeater(SmartDevice):
+    __slots__ = ()
+    _label = "Setting"
+    _option_range = range(0, 6)
+    _default_value = 2
+
     def __init__(self, setting=2):
-        super().__init__(setting, range(0, 6), 2)
+        super().__init__(setting, self._option_range, self._default_value)
 
 class SmartTV(SmartDevice):
+    __slots__ = ()
+    _label = "Channel"
+    _option_range = range(1, 735)
+    _default_value = 1
+
     def __init__(self, channel=1):
-        super().__init__(channel, range(1, 735), 1)
+        super().__init__(channel, self._option_range, self._default_value)
 
 class SmartSpeaker(SmartDevice):
+    __slots__ = ()
+    _label = "Streaming"
+    _option_range = {"Amazon", "Apple", "Spotify"}
+    _default_value = "Amazon"
+
     def __init__(self, streaming="Amazon"):
-        super().__init__(streaming, {"Amazon", "Apple", "Spotify"}, "Amazon")
+        super().__init__(streaming, self._option_range, self._default_value)
 
 class SmartDoorBell(SmartDevice):
+    __slots__ = ()
+    _label = "Sleep mode"
+    _option_range = {True, False}
+    _default_value = False
+
     def __init__(self, sleep_mode=False):
-        super().__init__(sleep_mode, {True, False}, False)
+        super().__init__(sleep_mode, self._option_range, self._default_value)
 
 class SmartOven(SmartDevice):
+    __slots__ = ()
+    _label = "Temperature"
+    _option_range = range(0, 261)
+    _default_value = 150
+
     def __init__(self, temperature=150):
-        super().__init__(temperature, range(0, 261), 150)
+        super().__init__(temperature, self._option_range, self._default_value)
 
 class SmartWashingMachine(SmartDevice):
+    __slots__ = ()
+    _label = "Wash mode"
+    _option_range = {"Daily wash", "Quick wash", "Eco"}
+    _default_value = "Daily wash"
+
     def __init__(self, wash_mode="Daily wash"):
-        super().__init__(wash_mode, {"Daily wash", "Quick wash", "Eco"}, "Daily wash")
+        super().__init__(wash_mode, self._option_range, self._default_value)
 
 class SmartDoor(SmartDevice):
+    __slots__ = ()
+    _label = "Locked"
+    _option_range = {True, False}
+    _default_value = True
+
     def __init__(self, locked=True):
-        super().__init__(locked, {True, False}, True)
+        super().__init__(locked, self._option_range, self._default_value)
 
 class SmartAirFryer(SmartDevice):
+    __slots__ = ()
+    _label = "Cook mode"
+    _option_range = {"Healthy", "Defrost", "Crispy"}
+    _default_value = "Healthy"
+
     def __init__(self, cook_mode="Healthy"):
-        super().__init__(cook_mode, {"Healthy", "Defrost", "Crispy"}, "Healthy")
+        super().__init__(cook_mode, self._option_range, self._default_value)
+
+def set_option_values(devices, values):
+    devices = list(devices)
+    values = list(values)
+    if len(devices) != len(values):
+        raise ValueError("Expected one option value per device.")
+    # Validate the whole batch first so a bad entry leaves every device untouched
+    invalid = [index for index, (device, value) in enumerate(zip(devices, values))
+               if not device._validate(value)]
+    if invalid:
+        details = "; ".join(f"{index}: {devices[index]._range_error}" for index in invalid[:10])
+        more = f" (and {len(invalid) - 10} more)" if len(invalid) > 10 else ""
+        error = ValueError(f"Invalid option values at indices {invalid[:10]}{more}: {details}")
+        error.indices = invalid
+        raise error
+    bus = SmartDevice.bus
+    with bus.batch() if bus is not None else nullcontext():
+        for device, value in zip(devices, values):
+            device._store_option(value)
 
 def test_custom_devices():
     devices = [SmartLight(), SmartFridge(), SmartHeater(), SmartTV(), SmartSpeaker(),
@@ -84,6 +310,6 @@ def test_invalid_initialization():
     except ValueError as e:
         print("Invalid instantiation prevented:", e)
 
-# Run the test functions
-test_custom_devices()
-test_invalid_initialization()
+if __name__ == "__main__":
+    test_custom_devices()
+    test_invalid_initialization()
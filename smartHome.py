@@ -1,30 +1,170 @@
-from smartDevice import SmartLight, SmartFridge
+from contextlib import nullcontext
+from smartDevice import DEVICE_REGISTRY, SmartDevice, SmartLight, SmartFridge
 from smart_plug import SmartPlug
+from deviceFleet import DeviceFleet
+from changeBus import DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED, OPTION_CHANGED, ALL_SWITCHED
+
+def _option(device):
+    return getattr(device, getattr(device, "_option_name", "option_value"))
 class SmartHome:
-    def __init__(self):
-        self.devices = []
+    def __init__(self, columnar=False):
+        self.devices = DeviceFleet() if columnar else []
+    
+    @property
+    def bus(self):
+        # The devices' bus (see smartDevice.set_bus): a home operation can only suppress or batch
+        # the per-device events it replaces on the bus those events go to
+        return SmartDevice.bus
+    
+    def _publish(self, kind, device=None, old=None, new=None, devices=()):
+        if self.bus is not None:
+            self.bus.publish(kind, device, old, new, devices, source=self)
+    
+    def _batch(self):
+        return self.bus.batch() if self.bus is not None else nullcontext()
+    
+    def _quiet(self):
+        return self.bus.suppress() if self.bus is not None else nullcontext()
     
     def add_device(self, device):
         self.devices.append(device)
+        self._publish(DEVICE_ADDED, self.devices[-1])
+    
+    def remove_device(self, index):
+        removed = self.get_device(index)
+        device = self.devices.pop(index)
+        # For a fleet the event carries the view, which keeps the removed device's identity
+        self._publish(DEVICE_REMOVED, removed)
+        return device
     
     def get_device(self, index):
         if 0 <= index < len(self.devices):
             return self.devices[index]
         raise IndexError("Invalid device index.")
     
+    def get_devices(self, indices):
+        if isinstance(self.devices, DeviceFleet):
+            return self.devices.get_devices(indices)
+        return [self.get_device(index) for index in indices]
+    
     def toggle_device(self, index):
         device = self.get_device(index)
         device.toggle_switch()
     
+    def toggle_devices(self, indices):
+        indices = list(indices)
+        if not all(0 <= index < len(self.devices) for index in indices):
+            raise IndexError("Invalid device index.")
+        if isinstance(self.devices, DeviceFleet):
+            before = self.devices.states() if self.bus is not None else None
+            self.devices.toggle(indices)
+            if before is not None:
+                after = self.devices.states()
+                with self.bus.batch():
+                    for index in indices:
+                        self.bus.publish(SWITCH_CHANGED, self.devices[index], bool(before[index]), bool(after[index]))
+            return
+        with self._batch():
+            for index in indices:
+                self.toggle_device(index)
+    
+    def _switch_all(self, on):
+        if isinstance(self.devices, DeviceFleet):
+            changed = ()
+            if self.bus is not None:
+                states = self.devices.states()
+                changed = [self.devices[index] for index in range(len(states)) if bool(states[index]) != on]
+            self.devices.switch_all(on)
+        else:
+            changed = [device for device in self.devices if bool(device._switched_on) != on]
+            with self._quiet():
+                for device in changed:
+                    device.toggle_switch()
+        # One event for the whole operation instead of one per device
+        if changed:
+            self._publish(ALL_SWITCHED, new=on, devices=changed)
+    
     def switch_all_on(self):
-        for device in self.devices:
-            if not device._switched_on:
-                device.toggle_switch()
+        self._switch_all(True)
     
     def switch_all_off(self):
-        for device in self.devices:
-            if device._switched_on:
-                device.toggle_switch()
+        self._switch_all(False)
+    
+    def _select(self, target):
+        # An index, or a device class / class name meaning every device of that type
+        if isinstance(target, int):
+            self.get_device(target)
+            return [target]
+        name = target if isinstance(target, str) else target.__name__
+        if name not in DEVICE_REGISTRY:
+            # Matching nothing would make a misspelt type a silent no-op
+            raise ValueError(f"Unknown device type: {name!r}.")
+        if isinstance(self.devices, DeviceFleet):
+            types = self.devices._types
+            return [index for index, type_id in enumerate(self.devices._type_ids) if types[type_id].name == name]
+        return [index for index, device in enumerate(self.devices) if type(device).__name__ == name]
+    
+    def apply(self, operations):
+        # operations: (target, command, value) with command "switch", "toggle" or "option".
+        # Everything is validated before anything changes; if applying still fails part way, the
+        # touched devices are put back. Subscribers get the net changes as one batch.
+        plan = []
+        errors = []
+        for position, (target, command, value) in enumerate(operations):
+            try:
+                indices = self._select(target)
+            except (IndexError, ValueError) as e:
+                errors.append(f"{position}: {e}")
+                continue
+            if command == "switch":
+                if not isinstance(value, bool):
+                    errors.append(f"{position}: switch takes True or False, not {value!r}")
+            elif command == "option":
+                for index in indices:
+                    device = self.devices[index]
+                    if not device._validate(value):
+                        errors.append(f"{position}: device {index}: {device._range_error}")
+                        break
+            elif command != "toggle":
+                errors.append(f"{position}: unknown command {command!r}")
+            plan.append((indices, command, value))
+        if errors:
+            error = ValueError(f"Batch rejected, nothing was changed: {'; '.join(errors[:10])}")
+            error.errors = errors
+            raise error
+        
+        originals = {}
+        with self._quiet():
+            try:
+                for indices, command, value in plan:
+                    for index in indices:
+                        device = self.devices[index]
+                        if index not in originals:
+                            originals[index] = (bool(device._switched_on), _option(device))
+                        if command == "option":
+                            device._store_option(value)
+                        elif command == "toggle" or bool(device._switched_on) != value:
+                            device.toggle_switch()
+            except Exception:
+                for index, (on, option) in originals.items():
+                    device = self.devices[index]
+                    device._store_option(option)
+                    if bool(device._switched_on) != on:
+                        device.toggle_switch()
+                raise
+        
+        changed = []
+        with self._batch():
+            for index, (on, option) in originals.items():
+                device = self.devices[index]
+                now_on, now_option = bool(device._switched_on), _option(device)
+                if now_on != on:
+                    self._publish(SWITCH_CHANGED, device, on, now_on)
+                if now_option != option:
+                    self._publish(OPTION_CHANGED, device, option, now_option)
+                if now_on != on or now_option != option:
+                    changed.append(index)
+        return changed
     
     def __str__(self):
         result = f"SmartHome with {len(self.devices)} device(s):\n"
@@ -59,6 +199,6 @@ def test_invalid_operations():
     except IndexError as e:
         print("Error handled:", e)
     
-# Run the test functions
-test_smart_home()
-test_invalid_operations()
+if __name__ == "__main__":
+    test_smart_home()
+    test_invalid_operations()
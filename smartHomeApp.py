@@ -3,8 +3,11 @@ from tkinter import Label, Button
 from smart_plug import SmartPlug
 from smartDevice import SmartLight, SmartFridge
 from smartHome import SmartHome
+from virtualList import VirtualDeviceList
+from changeBus import ChangeBus, DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED, ALL_SWITCHED
 import tkinter as tk
 from tkinter import messagebox
+from instrumentation import profile_session
 
 class SmartHomeApp:
     def __init__(self, root):
@@ -17,6 +20,9 @@ class SmartHomeApp:
             {"name": "Fridge", "status": "off", "attribute": "Temperature: 3"},
             {"name": "Plug", "status": "off", "attribute": "Consumption: 45"}
         ]
+        # Handlers publish what they changed; the list repaints once per idle with the combined diff
+        self.bus = ChangeBus(schedule=self.root.after_idle)
+        self.bus.subscribe(self.on_changes)
         
         self.create_widgets()
 
@@ -29,58 +35,66 @@ class SmartHomeApp:
         tk.Button(top_frame, text="Turn on all", command=self.turn_on_all, **button_style).pack(side=tk.LEFT, padx=10)
         tk.Button(top_frame, text="Turn off all", command=self.turn_off_all, **button_style).pack(side=tk.LEFT, padx=10)
         
-        self.device_frame = tk.Frame(self.root, bg='lightgray')
-        self.device_frame.pack(pady=10)
+        self.device_list = VirtualDeviceList(
+            self.root,
+            row_text=self.device_text,
+            actions=[("Delete", lambda i: self.delete_device(self.devices[i])),
+                     ("Edit", lambda i: self.edit_device(self.devices[i])),
+                     ("Toggle", lambda i: self.toggle_device(self.devices[i]))],
+            row_height=40, bg='lightgray', button_options={'bd': 5, 'relief': 'ridge'})
+        self.device_list.pack(pady=10, fill='both', expand=True)
         
         self.display_devices()
         
         add_button = tk.Button(self.root, text="Add", command=self.add_device, **button_style)
         add_button.pack(pady=10)
     
+    def device_text(self, index):
+        device = self.devices[index]
+        return f"{device['name']}: {device['status']}, {device['attribute']}"
+    
     def display_devices(self):
-        for widget in self.device_frame.winfo_children():
-            widget.destroy()
-        
-        for device in self.devices:
-            frame = tk.Frame(self.device_frame, bg='lightgray', pady=2)
-            frame.pack(fill='x')
-            
-            label = tk.Label(frame, text=f"{device['name']}: {device['status']}, {device['attribute']}", bg='lightgray')
-            label.pack(side=tk.LEFT, padx=10)
-            
-            button_frame = tk.Frame(frame, bg='lightgray')
-            button_frame.pack(side=tk.RIGHT)
-            
-            tk.Button(button_frame, text="Toggle", command=lambda d=device: self.toggle_device(d), bd=5, relief='ridge').pack(side=tk.LEFT, padx=5)
-            tk.Button(button_frame, text="Edit", command=lambda d=device: self.edit_device(d), bd=5, relief='ridge').pack(side=tk.LEFT, padx=5)
-            tk.Button(button_frame, text="Delete", command=lambda d=device: self.delete_device(d), bd=5, relief='ridge').pack(side=tk.LEFT, padx=5)
+        self.device_list.refresh(len(self.devices))
+    
+    def on_changes(self, changes):
+        if any(change.kind in (DEVICE_ADDED, DEVICE_REMOVED, ALL_SWITCHED) for change in changes):
+            self.display_devices()
+            return
+        changed = {id(change.device) for change in changes}
+        self.device_list.redraw(lambda i: id(self.devices[i]) in changed)
     
     def toggle_device(self, device):
-        device["status"] = "on" if device["status"] == "off" else "off"
-        self.display_devices()
+        old = device["status"]
+        device["status"] = "on" if old == "off" else "off"
+        self.bus.publish(SWITCH_CHANGED, device, old, device["status"])
     
     def edit_device(self, device):
         messagebox.showinfo("Edit", f"Editing {device['name']}")
     
     def delete_device(self, device):
         self.devices.remove(device)
-        self.display_devices()
+        self.bus.publish(DEVICE_REMOVED, device)
+    
+    def switch_all(self, status):
+        changed = [device for device in self.devices if device["status"] != status]
+        for device in changed:
+            device["status"] = status
+        if changed:
+            self.bus.publish(ALL_SWITCHED, new=status, devices=changed)
     
     def turn_on_all(self):
-        for device in self.devices:
-            device["status"] = "on"
-        self.display_devices()
+        self.switch_all("on")
     
     def turn_off_all(self):
-        for device in self.devices:
-            device["status"] = "off"
-        self.display_devices()
+        self.switch_all("off")
     
     def add_device(self):
-        self.devices.append({"name": "New Device", "status": "off", "attribute": "Custom"})
-        self.display_devices()
+        device = {"name": "New Device", "status": "off", "attribute": "Custom"}
+        self.devices.append(device)
+        self.bus.publish(DEVICE_ADDED, device)
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = SmartHomeApp(root)
-    root.mainloop()
+    with profile_session():
+        root = tk.Tk()
+        app = SmartHomeApp(root)
+        root.mainloop()
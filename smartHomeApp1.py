@@ -3,6 +3,7 @@ from tkinter import ttk
 from smart_plug import SmartPlug
 from smartDevice import SmartLight, SmartFridge
 from smartHome import SmartHome
+from instrumentation import profile_session
 class SmartHomeGUI:
     def __init__(self, root):
         self.root = root
@@ -85,6 +86,7 @@ class SmartDevice:
         self.frame.destroy()
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = SmartHomeGUI(root)
-    root.mainloop()
+    with profile_session():
+        root = tk.Tk()
+        app = SmartHomeGUI(root)
+        root.mainloop()
@@ -1,8 +1,13 @@
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import simpledialog
+from virtualList import VirtualDeviceList
+from instrumentation import profile_session
+from changeBus import ChangeBus, DEVICE_ADDED, DEVICE_REMOVED, SWITCH_CHANGED, OPTION_CHANGED, ALL_SWITCHED
 
 class SmartDevice:
+    bus = None
+
     def __init__(self, name, state=False, option_value=None):
         self.name = name
         self.state = state
@@ -10,10 +15,14 @@ class SmartDevice:
 
     def toggle(self):
         self.state = not self.state
+        if self.bus is not None:
+            self.bus.publish(SWITCH_CHANGED, self, not self.state, self.state)
         return f"{self.name}: {'on' if self.state else 'off'}"
 
     def edit(self, new_value):
-        self.option_value = new_value
+        old, self.option_value = self.option_value, new_value
+        if self.bus is not None:
+            self.bus.publish(OPTION_CHANGED, self, old, new_value)
         return f"{self.name} setting updated to {self.option_value}"
 
     def __str__(self):
@@ -21,64 +30,80 @@ class SmartDevice:
 
 
 def update_display():
-    for widget in frame.winfo_children():
-        widget.destroy()
-    
-    for device in devices:
-        row = tk.Frame(frame)
-        row.pack(fill="x", pady=2)
-        
-        tk.Label(row, text=str(device)).pack(side="left", padx=5)
-        tk.Button(row, text="Toggle", command=lambda d=device: toggle_device(d)).pack(side="left", padx=2)
-        tk.Button(row, text="Edit", command=lambda d=device: edit_device(d)).pack(side="left", padx=2)
-        tk.Button(row, text="Delete", command=lambda d=device: delete_device(d)).pack(side="left", padx=2)
+    device_list.refresh(len(devices))
+
+def on_changes(changes):
+    if any(change.kind in (DEVICE_ADDED, DEVICE_REMOVED, ALL_SWITCHED) for change in changes):
+        update_display()
+        return
+    changed = {id(change.device) for change in changes}
+    device_list.redraw(lambda i: id(devices[i]) in changed)
 
 def toggle_device(device):
     messagebox.showinfo("Toggle", device.toggle())
-    update_display()
 
 def edit_device(device):
     new_value = simpledialog.askstring("Edit", f"Enter new setting for {device.name}:")
     if new_value:
         messagebox.showinfo("Edit", device.edit(new_value))
-    update_display()
 
 def delete_device(device):
     devices.remove(device)
-    update_display()
+    bus.publish(DEVICE_REMOVED, device)
+
+def switch_all(state):
+    changed = [device for device in devices if device.state != state]
+    for device in changed:
+        device.state = state
+    if changed:
+        bus.publish(ALL_SWITCHED, new=state, devices=changed)
 
 def turn_on_all():
-    for device in devices:
-        device.state = True
-    update_display()
+    switch_all(True)
 
 def turn_off_all():
-    for device in devices:
-        device.state = False
-    update_display()
+    switch_all(False)
 
 def add_device():
     name = simpledialog.askstring("Add Device", "Enter device name:")
     if name:
-        devices.append(SmartDevice(name))
-    update_display()
-
-root = tk.Tk()
-root.title("Smart Home Controller")
+        device = SmartDevice(name)
+        devices.append(device)
+        bus.publish(DEVICE_ADDED, device)
+
+def build(window):
+    # The controller keeps its widgets and devices in module globals, set up here
+    global root, bus, device_list, devices
+    root = window
+    root.title("Smart Home Controller")
+    bus = ChangeBus(schedule=root.after_idle)
+    SmartDevice.bus = bus
+    bus.subscribe(on_changes)
+
+    control_frame = tk.Frame(root)
+    control_frame.pack(fill="x", pady=5)
+
+    tk.Button(control_frame, text="Turn on all", command=turn_on_all).pack(side="left", padx=5)
+    tk.Button(control_frame, text="Turn off all", command=turn_off_all).pack(side="left", padx=5)
+    tk.Button(control_frame, text="Add", command=add_device).pack(side="left", padx=5)
+
+    device_list = VirtualDeviceList(
+        root,
+        row_text=lambda i: str(devices[i]),
+        actions=[("Toggle", lambda i: toggle_device(devices[i])),
+                 ("Edit", lambda i: edit_device(devices[i])),
+                 ("Delete", lambda i: delete_device(devices[i]))],
+        button_side="left")
+    device_list.pack(fill="both", expand=True)
+
+    devices = [SmartDevice("Light", False, "Brightness: 0"), SmartDevice("Fridge", False, "Temperature: 3"), SmartDevice("Plug", False, "Consumption: 45")]
 
-control_frame = tk.Frame(root)
-control_frame.pack(fill="x", pady=5)
-
-tk.Button(control_frame, text="Turn on all", command=turn_on_all).pack(side="left", padx=5)
-tk.Button(control_frame, text="Turn off all", command=turn_off_all).pack(side="left", padx=5)
-tk.Button(control_frame, text="Add", command=add_device).pack(side="left", padx=5)
-
-canvas = tk.Canvas(root)
-frame = tk.Frame(canvas)
-canvas.pack(fill="both", expand=True)
-frame.pack(fill="both", expand=True)
+    update_display()
+    return root
 
-devices = [SmartDevice("Light", False, "Brightness: 0"), SmartDevice("Fridge", False, "Temperature: 3"), SmartDevice("Plug", False, "Consumption: 45")]
+def main():
+    with profile_session():
+        build(tk.Tk()).mainloop()
 
-update_display()
-root.mainloop()
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,44 @@
+from changeBus import SWITCH_CHANGED, OPTION_CHANGED
+from smartDevice import Interval, compile_validator, register_device_type
+
 class SmartPlug:
+    __slots__ = ("_on", "_consumption_rate", "_text")
+    # Any rate in watts, fractional ones included
+    _option_range = Interval(0, 150)
+    _default_value = 45
+    _option_name = "consumption_rate"
+    _range_error = "Consumption rate must be between 0 and 150 watts."
+    _validate = staticmethod(compile_validator(_option_range))
+    bus = None
+
     def __init__(self, consumption_rate: int):
-        if not (0 <= consumption_rate <= 150):
-            raise ValueError("Consumption rate must be between 0 and 150 watts.")
+        if not self._validate(consumption_rate):
+            raise ValueError(self._range_error)
         
-        self._switched_on = False
+        self._on = False
         self._consumption_rate = consumption_rate
+        self._text = None
+    
+    @property
+    def _switched_on(self):
+        return self._on
+    
+    @_switched_on.setter
+    def _switched_on(self, value):
+        self._on = value
+        self._text = None
     
     def toggle_switch(self):
-        self._switched_on = not self._switched_on
+        on = self._on = not self._on
+        self._text = None
+        if self.bus is not None:
+            self.bus.publish(SWITCH_CHANGED, self, not on, on)
     
     def __str__(self):
-        state = "on" if self._switched_on else "off"
-        return f"SmartPlug is {state} with a consumption rate of {self._consumption_rate}"
+        text = self._text
+        if text is None:
+            text = self._text = self._type.format(self._on, self._consumption_rate)
+        return text
     
     @property
     def consumption_rate(self):
@@ -19,9 +46,19 @@ class SmartPlug:
     
     @consumption_rate.setter
     def consumption_rate(self, value):
-        if not (0 <= value <= 150):
-            raise ValueError("Consumption rate must be between 0 and 150 watts.")
+        if not self._validate(value):
+            raise ValueError(self._range_error)
+        self._store_option(value)
+
+    def _store_option(self, value):
+        old = self._consumption_rate
         self._consumption_rate = value
+        self._text = None
+        if self.bus is not None:
+            self.bus.publish(OPTION_CHANGED, self, old, value)
+
+SmartPlug._type = register_device_type(SmartPlug, "Consumption rate",
+                                       "{name} is {state} with a consumption rate of {value}")
 
 def test_smart_plug():
     try:
@@ -62,5 +99,5 @@ def test_smart_plug():
     except Exception as e:
         print("Test failed:", e)
 
-# Run the test function
-test_smart_plug()
\ No newline at end of file
+if __name__ == "__main__":
+    test_smart_plug()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import os
+
+from auditLog import AuditLog, _HEADER, _RECORD
+from changeBus import ChangeBus, DEVICE_REMOVED
+from homeModel import SmartHome
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def open_log(path, bus, clock, **kwargs):
+    return AuditLog(str(path), bus, clock=clock, **kwargs)
+
+def setup_bus():
+    bus = ChangeBus()
+    SmartHome.bus = bus
+    return bus
+
+def test_home_at_rebuilds_past_states_across_checkpoints(tmp_path):
+    bus, clock = setup_bus(), Clock()
+    try:
+        log = open_log(tmp_path / "homes.audit", bus, clock, checkpoint_every=3)
+        home = SmartHome("A")
+        home.home_id = 0
+        log.add_home(home)
+        states = {}
+        for step in range(10):
+            clock.now += 10
+            if step % 3 == 0:
+                home.add_device({"name": "Light", "status": "off"})
+            else:
+                device_id = list(home.devices)[step % len(home.devices)]["id"]
+                home.toggle_device(device_id)
+            states[clock.now] = [dict(device) for device in home.devices]
+        log.close()
+
+        reopened = open_log(tmp_path / "homes.audit", bus, clock, checkpoint_every=3)
+        for when, devices in states.items():
+            assert reopened.home_at(0, when)["devices"] == devices
+            assert reopened.homes_at(when + 5)[0]["devices"] == devices
+        assert reopened.home_at(0, 999) is None
+        reopened.close()
+    finally:
+        SmartHome.bus = None
+
+def test_torn_tails_are_cut_back_to_the_last_whole_entry(tmp_path):
+    bus, clock = setup_bus(), Clock()
+    path = tmp_path / "homes.audit"
+    try:
+        log = open_log(path, bus, clock, checkpoint_every=2)
+        home = SmartHome("A")
+        home.home_id = 0
+        log.add_home(home)
+        device_id = home.add_device({"name": "Light", "status": "off"})
+        clock.now += 1
+        home.toggle_device(device_id)
+        whole = log.home_at(0)
+        # Dropped without close(), as a crash would
+        log._log.close()
+        log._strings_file.close()
+        log._checkpoint_file.close()
+        # A crash part way through a record, a string and a checkpoint
+        with open(path, "ab") as file:
+            file.write(b"\x05\x01\x00")
+        with open(str(path) + ".strings", "a") as file:
+            file.write('"Hal')
+        with open(str(path) + ".ckpt", "a") as file:
+            file.write('{"home": 0, "seq": 9')
+
+        bus = setup_bus()
+        reopened = open_log(path, bus, clock, checkpoint_every=2)
+        assert (os.path.getsize(path) - len(_HEADER)) % _RECORD.size == 0
+        assert reopened.home_at(0) == whole
+        assert len(reopened) == len(list(reopened.events()))
+        reopened.track(home)
+        clock.now += 1
+        home.toggle_device(device_id)
+        assert reopened.home_at(0)["devices"][0]["status"] == "off"
+        reopened.close()
+        again = open_log(path, bus, clock)
+        assert again.home_at(0)["devices"][0]["status"] == "off"
+        again.close()
+    finally:
+        SmartHome.bus = None
+
+def test_keys_of_removed_devices_are_not_reused_after_reopening(tmp_path):
+    from smartDevice import SmartLight
+    bus, clock = setup_bus(), Clock()
+    path = tmp_path / "homes.audit"
+    try:
+        class Home:
+            def __init__(self, name, home_id):
+                self.name = name
+                self.home_id = home_id
+                self.devices = []
+
+        home = Home("A", 0)
+        home.devices = [SmartLight(), SmartLight()]
+        log = open_log(path, bus, clock)
+        key = log.track(home)
+        bus.publish(DEVICE_REMOVED, home.devices.pop(), source=home)
+        log.close()
+
+        reopened = open_log(path, bus, clock)
+        home.devices.append(SmartLight(20))
+        reopened.track(home)
+        keys = [device["id"] for device in reopened.home_at(key)["devices"]]
+        assert len(keys) == 2 and 1 not in keys
+        other = Home("B", 0)
+        assert reopened.track(other) != key
+        reopened.close()
+    finally:
+        SmartHome.bus = None
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from automation import AutomationEngine, Rule, StateIs, OptionIs, After, Before, Switch, SetOption
+from scheduler import Scheduler
+from smartDevice import SmartLight, SmartDoor
+
+def test_rule_fires_when_its_trigger_changes():
+    door, light = SmartDoor(), SmartLight()
+    engine = AutomationEngine(clock=lambda: 12 * 60)
+    engine.add_rule(Rule("unlock", [OptionIs(door, "==", False)], [Switch(light, True)]))
+    engine.set_option(door, False)
+    assert light._switched_on
+
+def test_cascade_limit_reports_the_rules_cut_off():
+    a, b = SmartLight(), SmartLight()
+    engine = AutomationEngine(clock=lambda: 0, max_cascade=3)
+    # Each light flips the other, so the cascade never settles
+    engine.add_rule(Rule("a flips b", [StateIs(a, True)], [Switch(b, True), Switch(a, False)]))
+    engine.add_rule(Rule("b flips a", [StateIs(b, True)], [Switch(a, True), Switch(b, False)]))
+    with pytest.raises(RuntimeError) as raised:
+        engine.toggle(a)
+    assert raised.value.rules
+    assert set(raised.value.rules) <= {"a flips b", "b flips a"}
+
+def test_cascade_within_the_limit_settles():
+    a, b, c = SmartLight(), SmartLight(), SmartLight()
+    engine = AutomationEngine(clock=lambda: 0, max_cascade=3)
+    engine.add_rule(Rule("a to b", [StateIs(a, True)], [Switch(b, True)]))
+    engine.add_rule(Rule("b to c", [StateIs(b, True)], [Switch(c, True)]))
+    engine.toggle(a)
+    assert b._switched_on and c._switched_on
+
+def test_failing_action_does_not_stop_the_batch():
+    door, light, other = SmartDoor(), SmartLight(), SmartLight()
+    engine = AutomationEngine(clock=lambda: 0)
+    engine.add_rule(Rule("bad", [OptionIs(door, "==", False)],
+                         [SetOption(light, 1000), Switch(other, True)]))
+    engine.set_option(door, False)
+    assert other._switched_on
+    assert [action.device for action, _ in engine.failed] == [light]
+
+def test_time_condition_fires_at_its_edge():
+    # 21:00 local time today; the engine reads its minute of the day from the same clock
+    now = [time.mktime(time.localtime()[:3] + (21, 0, 0, 0, 0, -1))]
+    scheduler = Scheduler(clock=lambda: now[0])
+    engine = AutomationEngine(clock=lambda: time.localtime(now[0]).tm_hour * 60 + time.localtime(now[0]).tm_min,
+                              scheduler=scheduler)
+    door, light = SmartDoor(), SmartLight()
+    engine.add_rule(Rule("late and unlocked", [OptionIs(door, "==", False), After(22)], [Switch(light, True)]))
+    engine.set_option(door, False)
+    assert not light._switched_on
+    # Nothing about the door changes; 22:00 arriving is enough
+    now[0] += 3600
+    scheduler.advance()
+    assert light._switched_on
+
+def test_time_only_rules_are_scheduled():
+    scheduler = Scheduler(clock=lambda: 0.0)
+    engine = AutomationEngine(clock=lambda: 0, scheduler=scheduler)
+    light = SmartLight()
+    rule = engine.add_rule(Rule("night", [Before(6)], [Switch(light, True)]))
+    assert len(scheduler) == 1
+    engine.remove_rule(rule)
+    assert len(scheduler) == 0
+
+def test_rule_without_any_trigger_is_rejected():
+    with pytest.raises(ValueError):
+        AutomationEngine().add_rule(Rule("never", [], [Switch(SmartLight(), True)]))
@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from changeBus import SWITCH_CHANGED
+from smartDevice import SmartLight, SmartHeater
+from smartHome import SmartHome
+
+def test_fleet_view_follows_its_device_across_a_removal(bus):
+    home = SmartHome(columnar=True)
+    for value in (10, 20, 30):
+        home.add_device(SmartLight(value))
+    view = home.devices[2]
+    home.remove_device(0)
+    assert view.option_value == 30
+    assert view == home.devices[1]
+    assert hash(view) == hash(home.devices[1])
+    home.remove_device(1)
+    with pytest.raises(IndexError):
+        view.option_value
+
+def test_home_operations_suppress_the_device_bus(bus):
+    changes = []
+    bus.subscribe(changes.extend)
+    home = SmartHome()
+    home.add_device(SmartLight())
+    home.add_device(SmartHeater())
+    changes.clear()
+    home.switch_all_on()
+    assert [change.kind for change in changes] == ["all_switched"]
+
+def test_suppress_only_drops_the_suppressing_threads_events(bus):
+    changes = []
+    bus.subscribe(changes.extend)
+    light = SmartLight()
+    with bus.suppress():
+        worker = threading.Thread(target=light.toggle_switch)
+        worker.start()
+        worker.join()
+        SmartLight().toggle_switch()
+    assert [(change.kind, change.device) for change in changes] == [(SWITCH_CHANGED, light)]
@@ -0,0 +1,59 @@
+from commandBuffer import CommandBuffer
+
+def collect():
+    flushed = []
+    return flushed, CommandBuffer(flushed.extend)
+
+def test_toggles_cancel_out():
+    flushed, buffer = collect()
+    buffer.toggle("a")
+    buffer.toggle("a")
+    buffer.toggle("b")
+    assert [command.key for command in buffer.flush()] == ["b"]
+    assert buffer.stats()["elided"] == 2
+
+def test_last_option_wins():
+    flushed, buffer = collect()
+    buffer.set_option("a", 1)
+    buffer.set_option("a", 2)
+    (command,) = buffer.flush()
+    assert command.has_option and command.option == 2 and not command.toggle
+
+def test_toggle_after_option_is_kept_in_order():
+    _, buffer = collect()
+    buffer.set_option("a", "on")
+    buffer.toggle("a")
+    (command,) = buffer.flush()
+    assert command.option == "on" and command.toggled_after and command.toggle
+
+def test_option_after_toggle_overrides_it():
+    _, buffer = collect()
+    buffer.toggle("a")
+    buffer.set_option("a", "on")
+    (command,) = buffer.flush()
+    # Total parity is still reported for targets whose switch is a separate field
+    assert command.toggle and not command.toggled_after
+
+def test_scheduled_flush_runs_once():
+    timers = []
+    flushed = []
+    buffer = CommandBuffer(flushed.append, schedule=lambda delay, callback: timers.append(callback) or len(timers))
+    buffer.toggle("a")
+    buffer.toggle("b")
+    assert len(timers) == 1
+    timers[0]()
+    assert [[command.key for command in commands] for commands in flushed] == [["a", "b"]]
+
+def test_manual_flush_cancels_the_timer():
+    timers = {}
+    cancelled = []
+    buffer = CommandBuffer(lambda commands: None,
+                           schedule=lambda delay, callback: timers.setdefault(len(timers) + 1, callback) and len(timers),
+                           cancel=cancelled.append)
+    buffer.toggle("a")
+    buffer.flush()
+    assert cancelled == [1]
+    buffer.toggle("a")
+    timers[2]()
+    # The timer that fired itself is not cancelled again
+    assert cancelled == [1]
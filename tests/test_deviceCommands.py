@@ -0,0 +1,151 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from deviceCommands import CommandExecutor, LocalTransport, SimulatedTransport, TkBridge, Transport
+from deviceFleet import DeviceFleet
+from smartDevice import SmartLight
+
+class FlakyTransport(Transport):
+    # Fails the first `failures` attempts of every command with `error`, or stalls them
+    def __init__(self, failures, error=ConnectionError, stall=0.0):
+        self.failures = failures
+        self.error = error
+        self.stall = stall
+        self.attempts = 0
+
+    async def send(self, device, command, value=None):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            if self.stall:
+                await asyncio.sleep(self.stall)
+            else:
+                raise self.error("no acknowledgement")
+        return await LocalTransport().send(device, command, value)
+
+@pytest.fixture
+def run():
+    executors = []
+
+    def run(transport, commands, **kwargs):
+        executor = CommandExecutor(transport, retry_delay=0.001, **kwargs)
+        executors.append(executor)
+        futures = executor.submit_many(commands).result(timeout=10)
+        return futures
+
+    yield run
+    for executor in executors:
+        executor.shutdown()
+
+def test_lost_commands_are_retried(run):
+    transport = FlakyTransport(failures=2)
+    light = SmartLight()
+    [future] = run(transport, [(light, "switch", True)], retries=2)
+    assert future.result() is light and light._switched_on
+    assert transport.attempts == 3
+
+def test_gives_up_after_the_last_retry(run):
+    transport = FlakyTransport(failures=5)
+    light = SmartLight()
+    [future] = run(transport, [(light, "switch", True)], retries=1)
+    assert isinstance(future.exception(), ConnectionError)
+    assert transport.attempts == 2
+    assert not light._switched_on
+
+def test_timeouts_count_as_lost(run):
+    transport = FlakyTransport(failures=1, stall=1.0)
+    light = SmartLight()
+    [future] = run(transport, [(light, "option", 70)], retries=1, timeout=0.05)
+    assert future.result().option_value == 70
+    transport = FlakyTransport(failures=3, stall=1.0)
+    [future] = run(transport, [(light, "option", 80)], retries=1, timeout=0.05)
+    assert isinstance(future.exception(), asyncio.TimeoutError)
+
+def test_other_errors_are_not_retried(run):
+    transport = FlakyTransport(failures=0)
+    [future] = run(transport, [(SmartLight(), "option", 500)], retries=3)
+    assert isinstance(future.exception(), ValueError)
+    assert transport.attempts == 1
+
+def test_a_retried_toggle_is_applied_once(run):
+    # The toggle becomes a switch to the state it should end in, so repeating it is harmless
+    light = SmartLight()
+    run(FlakyTransport(failures=1, stall=1.0), [(light, "toggle", None)], retries=2, timeout=0.05)
+    assert light._switched_on
+
+def test_commands_for_one_fleet_device_keep_their_order(run):
+    fleet = DeviceFleet([SmartLight(), SmartLight()])
+    transport = SimulatedTransport(latency=0.005, jitter=0.005, seed=3)
+    run(transport, [(fleet[0], "option", value) for value in range(1, 30)])
+    assert fleet[0].option_value == 29
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for callback in scheduled:
+            callback()
+
+def test_bridge_runs_calls_on_the_polling_thread():
+    root = FakeRoot()
+    bridge = TkBridge(root)
+    seen = []
+    worker = threading.Thread(target=bridge.call, args=(lambda value: seen.append((value, threading.current_thread())), 1))
+    worker.start()
+    worker.join()
+    assert seen == []
+    root.run_pending()
+    assert seen == [(1, threading.current_thread())]
+
+def test_bridge_keeps_polling_after_a_failing_call():
+    root = FakeRoot()
+    bridge = TkBridge(root)
+    seen = []
+    bridge.call(lambda: 1 / 0)
+    bridge.call(seen.append, "later")
+    with pytest.raises(ZeroDivisionError):
+        root.run_pending()
+    root.run_pending()
+    assert seen == ["later"]
+    assert len(root.scheduled) == 1
+
+def test_executor_results_arrive_through_dispatch(run):
+    root = FakeRoot()
+    bridge = TkBridge(root)
+    executor = CommandExecutor(LocalTransport(), dispatch=bridge.call)
+    try:
+        done = []
+        executor.submit_many([(SmartLight(), "toggle", None)], callback=done.append).result(timeout=10)
+        assert done == []
+        root.run_pending()
+        assert len(done) == 1 and done[0][0].result()._switched_on
+    finally:
+        executor.shutdown()
+
+def test_local_commands_apply_on_the_dispatching_thread():
+    root = FakeRoot()
+    bridge = TkBridge(root)
+    executor = CommandExecutor(LocalTransport(dispatch=bridge.call), dispatch=bridge.call)
+    try:
+        light = SmartLight()
+        pending = executor.submit_many([(light, "switch", True)])
+        futures = None
+        while futures is None:
+            assert not light._switched_on
+            root.run_pending()
+            try:
+                futures = pending.result(timeout=0.01)
+            except concurrent.futures.TimeoutError:
+                pass
+        while not futures[0].done():
+            root.run_pending()
+        assert futures[0].result() is light and light._switched_on
+    finally:
+        executor.shutdown()
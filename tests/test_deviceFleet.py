@@ -0,0 +1,90 @@
+import pytest
+
+from deviceFleet import DeviceFleet
+from smartDevice import SmartFridge, SmartHeater, SmartLight
+from smart_plug import SmartPlug
+
+def make_fleet():
+    devices = [SmartLight(10), SmartFridge(5), SmartPlug(60.5), SmartHeater(), SmartPlug(45)]
+    devices[1].toggle_switch()
+    return DeviceFleet(devices)
+
+def test_toggle_flips_all_or_the_given_devices():
+    fleet = make_fleet()
+    assert fleet.states() == b"\x00\x01\x00\x00\x00"
+    fleet.toggle()
+    assert fleet.states() == b"\x01\x00\x01\x01\x01"
+    fleet.toggle([0, 4])
+    assert fleet.states() == b"\x00\x00\x01\x01\x00"
+    assert fleet.count_on() == 2
+    assert fleet.states([2, 4]) == b"\x01\x00"
+    assert [device._switched_on for device in fleet] == [False, False, True, True, False]
+
+def test_switch_all():
+    fleet = make_fleet()
+    fleet.switch_all(True)
+    assert fleet.count_on() == len(fleet) == 5
+    fleet.switch_all(False)
+    assert fleet.count_on() == 0
+
+def test_options_read_back_as_stored():
+    fleet = make_fleet()
+    values = fleet.option_values()
+    assert values == [10, 5, 60.5, 2, 45]
+    assert type(values[0]) is int and type(values[4]) is int and type(values[2]) is float
+    assert fleet.option_values([1, 2]) == [5, 60.5]
+    assert fleet.option_values([1]) == [5]
+
+def test_set_choices_are_stored_as_codes():
+    fleet = make_fleet()
+    fridge = fleet[1]
+    assert fleet._options[1] == 2
+    fridge.option_value = 1
+    assert fleet._options[1] == 0 and fridge.option_value == 1
+
+def test_bad_values_are_refused_and_leave_the_slot_alone():
+    fleet = make_fleet()
+    for index, value in ((0, 0), (0, 50.5), (1, 4), (1, "3"), (2, 150.5), (2, True)):
+        with pytest.raises(ValueError):
+            fleet[index].option_value = value
+    assert fleet.option_values([0, 1, 2]) == [10, 5, 60.5]
+    with pytest.raises(AttributeError):
+        fleet[0].consumption_rate
+    fleet[2].consumption_rate = 75.25
+    assert fleet[2].consumption_rate == 75.25
+
+def test_views_of_one_device_are_equal():
+    fleet = make_fleet()
+    assert fleet[3] == fleet[3] == fleet[-2]
+    assert hash(fleet[3]) == hash(fleet[-2])
+    assert fleet[3] != fleet[4]
+    assert fleet[0] != make_fleet()[0]
+    assert len({fleet[0], fleet[0], fleet[1]}) == 2
+
+def test_views_follow_their_device_and_fail_once_it_is_gone():
+    fleet = make_fleet()
+    view = fleet[3]
+    removed = fleet.pop(1)
+    assert type(removed) is SmartFridge and removed._switched_on and removed.option_value == 5
+    assert view == fleet[2]
+    view.toggle_switch()
+    assert fleet.states() == b"\x00\x00\x01\x00"
+    fleet.pop(2)
+    with pytest.raises(IndexError):
+        view._switched_on
+
+def test_out_of_range_indices():
+    fleet = make_fleet()
+    with pytest.raises(IndexError):
+        fleet[5]
+    with pytest.raises(IndexError):
+        fleet.get_devices([0, 5])
+    with pytest.raises(IndexError):
+        fleet.option_values([-1, 2])
+
+def test_to_device_rebuilds_the_original():
+    fleet = make_fleet()
+    for index, view in enumerate(fleet):
+        device = fleet.to_device(index)
+        assert type(device) is view.device_type.cls
+        assert str(device) == str(view)
@@ -0,0 +1,24 @@
+from deviceIndex import DeviceIndex
+from smartDevice import SmartLight, SmartHeater
+from smartHome import SmartHome
+
+def test_index_drops_only_the_removed_fleet_device(bus):
+    index = DeviceIndex(bus)
+    home = SmartHome(columnar=True)
+    for value in (10, 20, 30):
+        home.add_device(SmartLight(value))
+    home.remove_device(0)
+    assert sorted(device.option_value for device in index.query(SmartLight)) == [20, 30]
+    home.toggle_device(1)
+    assert [device.option_value for device in index.query(SmartLight, on=True)] == [30]
+
+def test_index_skips_changes_to_a_device_removed_in_the_same_batch(bus):
+    index = DeviceIndex(bus)
+    home = SmartHome(columnar=True)
+    home.add_device(SmartLight(10))
+    home.add_device(SmartHeater(3))
+    with bus.batch():
+        home.toggle_device(0)
+        home.remove_device(0)
+    assert index.query(SmartLight) == []
+    assert len(index) == 1
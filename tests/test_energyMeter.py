@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from energyMeter import DAY, HOUR, MINUTE, EnergyMeter, PlugMeter
+from smart_plug import SmartPlug
+
+def reference_wh(events, start, end):
+    # Straight sum over every event, for checking what the meter keeps; the last power holds on
+    total = 0.0
+    for (time, watts), (following, _) in zip(events, events[1:] + [(float("inf"), 0.0)]):
+        low, high = max(time, start), min(following, end)
+        if high > low:
+            total += watts * (high - low) / HOUR
+    return total
+
+@pytest.mark.parametrize("capacity", [1, 3, 5, 40])
+def test_energy_matches_every_event_after_the_ring_wraps(capacity):
+    # Events fall on minute boundaries, so evicted time is exact in the minute rollups too
+    rng = random.Random(capacity)
+    events = [(minute * MINUTE, float(rng.choice([0, 60, 150, 3600]))) for minute in range(30)]
+    meter = PlugMeter(capacity)
+    for time, watts in events:
+        meter.record(time, watts)
+    times, watts = meter.events()
+    assert list(zip(times, watts)) == events[-capacity:]
+    end = events[-1][0]
+    assert meter.total_wh == pytest.approx(reference_wh(events, 0, end))
+    for _ in range(200):
+        start = rng.uniform(-MINUTE, end)
+        stop = rng.uniform(start, end + MINUTE)
+        assert meter.energy_wh(start, stop) == pytest.approx(reference_wh(events, start, stop), abs=1e-9)
+
+def test_rollups_split_segments_at_bucket_boundaries():
+    meter = PlugMeter()
+    meter.record(50, 3600.0)
+    meter.record(130, 0.0)
+    assert meter.rollups[MINUTE] == pytest.approx({0: 10.0, 60: 60.0, 120: 10.0})
+    assert meter.rollups[HOUR] == pytest.approx({0: 80.0})
+    meter.record(HOUR - 10, 3600.0)
+    meter.record(HOUR + 20, 0.0)
+    assert meter.rollups[HOUR] == pytest.approx({0: 90.0, HOUR: 20.0})
+    assert meter.rollups[DAY] == pytest.approx({0: 110.0})
+    assert meter.rollup_energy_wh(MINUTE, 90, 120) == pytest.approx(30.0)
+
+def test_rollups_keep_only_their_retention():
+    meter = PlugMeter(rollups={MINUTE: 2, HOUR: None})
+    meter.record(0, 3600.0)
+    meter.record(4 * MINUTE, 0.0)
+    assert sorted(meter.rollups[MINUTE]) == [2 * MINUTE, 3 * MINUTE]
+    assert meter.rollups[HOUR] == pytest.approx({0: 240.0})
+
+def test_open_segment_counts_up_to_now():
+    meter = PlugMeter()
+    meter.record(0, 3600.0)
+    assert meter.total_wh == 0.0
+    assert meter.live_total_wh(90) == pytest.approx(90.0)
+    assert meter.rollup_wh(MINUTE, 90) == pytest.approx({0: 60.0, 60: 30.0})
+    assert meter.rollups[MINUTE] == {}
+    assert meter.energy_wh(0, 1000, now=90) == pytest.approx(90.0)
+
+def test_events_out_of_order_are_refused():
+    meter = PlugMeter()
+    meter.record(10, 5.0)
+    with pytest.raises(ValueError):
+        meter.record(5, 5.0)
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_home_figures_add_up_their_own_plugs():
+    clock = Clock()
+    meter = EnergyMeter(clock=clock)
+    kitchen, hall, garage = SmartPlug(100), SmartPlug(50), SmartPlug(150)
+    meter.track(kitchen, home="A")
+    meter.track(hall, home="A")
+    meter.track(garage, home="B")
+    meter.toggle(kitchen, timestamp=0)
+    meter.toggle(hall, timestamp=0)
+    meter.toggle(garage, timestamp=0)
+    meter.set_rate(hall, 20, timestamp=HOUR / 2)
+    meter.toggle(kitchen, timestamp=HOUR)
+    clock.now = 2 * HOUR
+    assert meter.plug_energy_wh(kitchen, 0, 3 * HOUR) == pytest.approx(100.0)
+    assert meter.plug_energy_wh(hall, 0, 3 * HOUR) == pytest.approx(25.0 + 30.0)
+    assert meter.home_energy_wh("A", 0, 3 * HOUR) == pytest.approx(155.0)
+    assert meter.home_energy_wh("A", HOUR, 3 * HOUR) == pytest.approx(20.0)
+    assert meter.home_total_wh("A") == pytest.approx(155.0)
+    assert meter.home_total_wh("B") == pytest.approx(300.0)
+    assert meter.home_rollup_wh("A", HOUR) == pytest.approx({0: 135.0, HOUR: 20.0})
+    assert meter.home_total_wh("nowhere") == 0.0
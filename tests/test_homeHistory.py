@@ -0,0 +1,51 @@
+from changeBus import ChangeBus
+from homeHistory import HomeHistory
+from homeModel import SmartHome
+
+def make_home(name, devices=2):
+    home = SmartHome(name)
+    for _ in range(devices):
+        home.add_device({"name": "Light", "status": "off"})
+    return home
+
+def test_tracked_homes_do_not_rewrite_the_stored_versions():
+    bus = ChangeBus()
+    SmartHome.bus = bus
+    try:
+        first = make_home("A")
+        homes = [first]
+        history = HomeHistory(homes, bus)
+        first.toggle_device(0)
+        history.commit()
+        versions = list(history._versions)
+        late = make_home("B")
+        homes.append(late)
+        history.track(late)
+        assert all(a is b for a, b in zip(history._versions, versions))
+        late.toggle_device(1)
+        history.commit()
+        history.undo()
+        assert late.get_device(1)["status"] == "off"
+        history.undo()
+        assert first.get_device(0)["status"] == "off"
+        assert late.get_device(1)["status"] == "off"
+    finally:
+        SmartHome.bus = None
+
+def test_undoing_a_removal_puts_the_home_back_in_place():
+    bus = ChangeBus()
+    SmartHome.bus = bus
+    try:
+        homes = [make_home(name) for name in "ABC"]
+        history = HomeHistory(homes, bus)
+        removed = homes[1]
+        homes.remove(removed)
+        history.remove_home(removed)
+        history.commit()
+        added, gone, _ = history.undo()
+        assert added == [removed]
+        assert [home.name for home in homes] == ["A", "B", "C"]
+        history.redo()
+        assert [home.name for home in homes] == ["A", "C"]
+    finally:
+        SmartHome.bus = None
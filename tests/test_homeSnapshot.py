@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from homeModel import SmartHome
+from homeSnapshot import HomeSnapshot, json_to_snapshot, snapshot_to_json, write_snapshot
+
+def sample_homes():
+    homes = []
+    for number, name in enumerate(["Beach", "Attic", "Cabin", "Attic"]):
+        home = SmartHome(name)
+        for device_name in ("Light", "Fridge", "TV")[:number + 1]:
+            home.add_device({"name": device_name, "status": "off"})
+        homes.append(dict(home.to_dict(), id=number * 10))
+    return homes
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "homes.shb"
+    write_snapshot(sample_homes(), str(path))
+    with HomeSnapshot(str(path), writable=True) as snapshot:
+        yield snapshot
+
+def test_read_gives_back_every_home(snapshot):
+    assert len(snapshot) == 4
+    assert list(snapshot.iter_home_data()) == sample_homes()
+    home = snapshot.home(2, SmartHome.from_dict)
+    assert (home.name, home.home_id, len(home.devices)) == ("Cabin", 20, 3)
+    with pytest.raises(IndexError):
+        snapshot.home_data(4)
+
+def test_find_returns_every_home_with_the_name(snapshot):
+    assert snapshot.find("Attic") == [1, 3]
+    assert snapshot.find("Beach") == [0]
+    assert snapshot.find("Cellar") == []
+    assert snapshot.find("") == []
+
+def test_set_device_status_needs_a_known_status_and_device(snapshot):
+    # Every sample device is off, so "on" is not in the string table
+    with pytest.raises(KeyError):
+        snapshot.set_device_status(1, 0, "on")
+    with pytest.raises(KeyError):
+        snapshot.set_device_status(1, 7, "off")
+    snapshot.set_device_status(1, 1, "off")
+    assert snapshot.home_data(1)["devices"][1]["status"] == "off"
+
+def test_set_device_status_persists(tmp_path):
+    homes = sample_homes()
+    homes[1]["devices"][1]["status"] = "on"
+    path = str(tmp_path / "homes.shb")
+    write_snapshot(homes, path)
+    with HomeSnapshot(path, writable=True) as snapshot:
+        snapshot.set_device_status(2, 2, "on")
+    with HomeSnapshot(path) as snapshot:
+        assert [device["status"] for device in snapshot.home_data(2)["devices"]] == ["off", "off", "on"]
+
+def test_json_round_trip_keeps_retired_device_ids(tmp_path):
+    home = SmartHome("A")
+    first = home.add_device({"name": "Light", "status": "off"})
+    second = home.add_device({"name": "TV", "status": "on"})
+    home.remove_device(second)
+    with open(tmp_path / "homes.json", "w") as file:
+        json.dump([dict(home.to_dict(), id=0)], file)
+    json_to_snapshot(str(tmp_path / "homes.json"), str(tmp_path / "homes.shb"))
+    snapshot_to_json(str(tmp_path / "homes.shb"), str(tmp_path / "back.json"))
+    with open(tmp_path / "back.json") as file:
+        restored = SmartHome.from_dict(json.load(file)[0])
+    assert [device["id"] for device in restored.devices] == [first]
+    assert restored.add_device({"name": "Plug", "status": "off"}) == second + 1
+
+def test_ids_must_fit_in_32_bits(tmp_path):
+    with pytest.raises(ValueError):
+        write_snapshot([{"name": "A", "devices": [], "id": 1 << 32}], str(tmp_path / "homes.shb"))
+    with pytest.raises(ValueError):
+        write_snapshot([{"name": "A", "devices": [{"name": "L", "status": "on", "id": -1}]}],
+                       str(tmp_path / "homes.shb"))
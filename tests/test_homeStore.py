@@ -0,0 +1,207 @@
+import json
+
+from homeModel import SmartHome
+from homeStore import HomeStore
+
+def load(path, **kwargs):
+    store = HomeStore(str(path), **kwargs)
+    store.load(SmartHome.from_dict)
+    return store
+
+def snapshot(store):
+    return [(home.home_id, home.name, [dict(device) for device in home.devices]) for home in store.homes]
+
+def test_log_replays_on_top_of_the_snapshot(tmp_path):
+    store = load(tmp_path / "homes.json")
+    home = SmartHome("A")
+    store.homes.append(home)
+    store.add_home(home)
+    device = {"name": "Light", "status": "off"}
+    device_id = home.add_device(device)
+    store.add_device(home, device)
+    home.set_device_status(device_id, "on")
+    store.edit_device(home, device_id, "on")
+    store.close()
+
+    reloaded = load(tmp_path / "homes.json")
+    assert snapshot(reloaded) == snapshot(store)
+
+def test_compaction_writes_the_snapshot_and_empties_the_log(tmp_path):
+    store = load(tmp_path / "homes.json", compact_every=3)
+    home = SmartHome("A")
+    store.homes.append(home)
+    store.add_home(home)
+    for name in ("Light", "TV"):
+        device = {"name": name, "status": "off"}
+        home.add_device(device)
+        store.add_device(home, device)
+    store.close()
+    with open(tmp_path / "homes.json") as file:
+        assert [data["name"] for data in json.load(file)] == ["A"]
+    with open(tmp_path / "homes.json.log") as file:
+        assert not any("op" in json.loads(line) for line in file)
+    assert snapshot(load(tmp_path / "homes.json")) == snapshot(store)
+
+def test_torn_log_tail_is_dropped(tmp_path):
+    store = load(tmp_path / "homes.json")
+    home = SmartHome("A")
+    store.homes.append(home)
+    store.add_home(home)
+    store.close()
+    with open(tmp_path / "homes.json.log", "a") as file:
+        file.write('{"op": "remove_ho')
+    reloaded = load(tmp_path / "homes.json")
+    assert [home.name for home in reloaded.homes] == ["A"]
+    # The torn line is compacted away on load
+    with open(tmp_path / "homes.json.log") as file:
+        assert all(json.loads(line) for line in file)
+
+def test_stale_log_after_crash_mid_compaction(tmp_path):
+    path = tmp_path / "homes.json"
+    store = load(path)
+    home = SmartHome("A")
+    store.homes.append(home)
+    store.add_home(home)
+    ids = []
+    for name in ("Light", "TV"):
+        device = {"name": name, "status": "off"}
+        ids.append(home.add_device(device))
+        store.add_device(home, device)
+    home.remove_device(ids[1])
+    store.remove_device(home, ids[1])
+    store.close()
+    stale_log = (tmp_path / "homes.json.log").read_text()
+
+    # Compact, then put the old log back as if the crash came between the snapshot and the log
+    store = load(path)
+    store.compact()
+    store.close()
+    (tmp_path / "homes.json.log").write_text(stale_log)
+
+    store = load(path)
+    (home,) = store.homes
+    assert [device["id"] for device in home.devices] == [ids[0]]
+    # The removed device's id is not handed out again
+    new_id = home.add_device({"name": "Plug", "status": "off"})
+    assert new_id not in ids
+    other = SmartHome("B")
+    store.homes.append(other)
+    store.add_home(other)
+    assert other.home_id != home.home_id
+    store.close()
+
+def test_removed_home_ids_are_not_reused(tmp_path):
+    path = tmp_path / "homes.json"
+    store = load(path)
+    homes = [SmartHome(name) for name in "AB"]
+    for home in homes:
+        store.homes.append(home)
+        store.add_home(home)
+    store.homes.remove(homes[1])
+    store.remove_home(homes[1])
+    store.compact()
+    store.close()
+
+    store = load(path)
+    home = SmartHome("C")
+    store.homes.append(home)
+    store.add_home(home)
+    assert home.home_id == 2
+    store.close()
+
+def test_name_based_records_from_old_logs_are_migrated(tmp_path):
+    path = tmp_path / "homes.json"
+    path.write_text(json.dumps([{"name": "A", "id": 0, "devices": [
+        {"name": "Plug", "status": "off"}, {"name": "Plug", "status": "off"}, {"name": "TV", "status": "off"}]}]))
+    records = [{"op": "toggle_device", "home": 0, "device": "Plug"},
+               {"op": "edit_device", "home": 0, "device": "TV", "status": "on"},
+               {"op": "add_device", "home": 0, "device": {"name": "Light", "status": "off"}},
+               {"op": "remove_device", "home": 0, "device": "TV"}]
+    (tmp_path / "homes.json.log").write_text("".join(json.dumps(record) + "\n" for record in records))
+    (home,) = load(path).homes
+    assert [(device["name"], device["status"]) for device in home.devices] == \
+        [("Plug", "on"), ("Plug", "on"), ("Light", "off")]
+
+def test_edits_made_while_streaming_wait_for_the_load(tmp_path):
+    path = tmp_path / "homes.json"
+    path.write_text(json.dumps([{"name": name, "id": number, "devices": []} for number, name in enumerate("AB")]))
+    store = HomeStore(str(path))
+    loader = store.iter_load(SmartHome.from_dict)
+    next(loader)
+    home = SmartHome("C")
+    store.homes.append(home)
+    store.add_home(home)
+    for _ in loader:
+        pass
+    assert home.home_id == 2
+    store.close()
+    assert [home.name for home in load(path).homes] == ["A", "B", "C"]
+
+def test_shard_home_added_by_a_compacting_write_survives(tmp_path):
+    from shardedHomes import Shard
+    path = str(tmp_path / "shard.json")
+    shard = Shard(path, compact_every=1)
+    home_id = shard.add_home("A")
+    shard.store.close()
+    reloaded = Shard(path, compact_every=1)
+    assert reloaded.list_homes() == [(home_id, "A")]
+
+    device_id = reloaded.add_device(home_id, {"name": "Light", "status": "off"})
+    assert reloaded.switch_all("on") == 1
+    reloaded.store.close()
+    reloaded = Shard(path, compact_every=1)
+    assert reloaded.home(home_id)["devices"][0]["id"] == device_id
+    assert reloaded.count_on() == 1
+    reloaded.store.close()
+
+def test_restored_home_keeps_its_id_and_place(tmp_path):
+    for compacted in (False, True):
+        path = tmp_path / f"homes-{compacted}.json"
+        store = load(path)
+        for name in ("A", "B", "C"):
+            home = SmartHome(name)
+            store.homes.append(home)
+            store.add_home(home)
+            device = {"name": "Light", "status": "on"}
+            home.add_device(device)
+            store.add_device(home, device)
+        if compacted:
+            store.compact()
+        home = store.homes.pop(1)
+        store.remove_home(home)
+        store.homes.insert(1, home)
+        store.restore_home(home, store.homes[2])
+        store.close()
+
+        reloaded = load(path)
+        assert snapshot(reloaded) == snapshot(store)
+        assert [home.name for home in reloaded.homes] == ["A", "B", "C"]
+
+def test_home_added_mid_load_next_to_a_restored_home(tmp_path):
+    path = tmp_path / "homes.json"
+    store = load(path)
+    for name in ("A", "B", "D"):
+        home = SmartHome(name)
+        store.homes.append(home)
+        store.add_home(home)
+    home = store.homes.pop(1)
+    store.remove_home(home)
+    store.compact()
+    store.homes.insert(1, home)
+    store.restore_home(home, store.homes[2])
+    store.close()
+
+    store = HomeStore(str(path))
+    loader = store.iter_load(SmartHome.from_dict)
+    next(loader)
+    # The app lists a new home as soon as it is added; its store id waits for the load
+    added = SmartHome("C")
+    store.homes.append(added)
+    store.add_home(added)
+    for _ in loader:
+        pass
+    assert [home.name for home in store.homes] == ["A", "C", "B", "D"]
+    assert added.home_id == 3
+    store.close()
+    reloaded = {home.name: home.home_id for home in load(path).homes}
+    assert reloaded == {"A": 0, "B": 1, "C": 3, "D": 2}
@@ -0,0 +1,28 @@
+import io
+import json
+
+import pytest
+
+from homeStream import iter_json_array
+
+ITEMS = ["x", 1.5, 2.25, -7, 1e-05, 3.5e+20, -0.125, 12345678, {"n": 6.02e23}, [1.0, 2], True, None]
+TEXT = json.dumps(ITEMS)
+
+@pytest.mark.parametrize("offset", range(1, len(TEXT)))
+def test_elements_split_at_every_offset(offset):
+    # The first chunk ends at offset; the rest arrives in one more read
+    assert list(iter_json_array(io.BytesIO(TEXT.encode()), chunk_size=offset)) == ITEMS
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7])
+def test_small_chunks(chunk_size):
+    assert list(iter_json_array(io.BytesIO(TEXT.encode()), chunk_size)) == ITEMS
+
+def test_number_cut_after_the_point_at_the_default_chunk_size():
+    items = ["x" * 65529, 1.5, 2.25]
+    assert list(iter_json_array(io.BytesIO(json.dumps(items).encode()))) == items
+
+def test_rejects_what_is_not_an_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b'{"a": 1}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b"[1, 2")))
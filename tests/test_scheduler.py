@@ -0,0 +1,64 @@
+import os
+import random
+import time
+
+import pytest
+
+from scheduler import Scheduler
+
+@pytest.fixture
+def new_york():
+    saved = os.environ.get("TZ")
+    os.environ["TZ"] = "America/New_York"
+    time.tzset()
+    yield
+    if saved is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = saved
+    time.tzset()
+
+def local(*fields):
+    return time.mktime(fields + (0, 0, -1))
+
+def test_daily_keeps_its_local_time_across_a_dst_change(new_york):
+    fired = []
+    now = [local(2026, 3, 7, 12, 0, 0)]
+    scheduler = Scheduler(dispatch=fired.extend, clock=lambda: now[0])
+    timer = scheduler.daily(8, 0, None, "toggle")
+    for day in (8, 9, 10):
+        now[0] = local(2026, 3, day, 9, 0, 0)
+        scheduler.advance()
+        assert time.localtime(timer.tick).tm_hour == 8
+        assert time.localtime(timer.tick).tm_mday == day + 1
+    assert len(fired) == 3
+
+def test_advance_fires_timers_on_their_tick_across_long_gaps():
+    rng = random.Random(1)
+    scheduler = Scheduler(dispatch=lambda timers: None, clock=lambda: 0)
+    whens = sorted(rng.randrange(1, 200000) for _ in range(200))
+    timers = [scheduler.call_at(when, None, "toggle") for when in whens]
+    fired = []
+    scheduler.dispatch = lambda due: fired.append((scheduler._now, sorted(timer.tick for timer in due)))
+    checkpoints = sorted(set(rng.randrange(1, 200000) for _ in range(50))) + [200000]
+    previous = 0
+    for checkpoint in checkpoints:
+        scheduler.advance(checkpoint)
+        expected = [when for when in whens if previous < when <= checkpoint]
+        if expected:
+            assert fired.pop() == (checkpoint, expected)
+        previous = checkpoint
+    assert not fired
+    assert len(scheduler) == 0
+    assert all(timer.cancelled for timer in timers)
+
+def test_cancelled_and_repeating_timers():
+    fired = []
+    scheduler = Scheduler(dispatch=fired.extend, clock=lambda: 0)
+    repeating = scheduler.call_at(10, "a", "toggle", interval=300)
+    scheduler.call_at(20, "b", "toggle").cancel()
+    scheduler.advance(1000)
+    assert [timer.device for timer in fired] == ["a"]
+    assert repeating.tick == 1210
+    scheduler.advance(1210)
+    assert len(fired) == 2
@@ -0,0 +1,52 @@
+import pytest
+
+from smartDevice import Interval, SmartFridge, SmartLight, compile_validator, set_option_values
+from smart_plug import SmartPlug
+
+SAMPLES = [-1, 0, 1, 3, 4, 50, 100, 101, 50.0, 50.5, 3.0, True, False, "50", "3", None, (3,)]
+
+@pytest.mark.parametrize("option_range", [range(1, 101), range(0, 10, 3), {1, 3, 5}, frozenset({"low", "high"})])
+def test_validator_agrees_with_membership(option_range):
+    validate = compile_validator(option_range)
+    for value in SAMPLES + ["low", "medium"]:
+        assert validate(value) == (value in option_range), value
+
+def test_interval_takes_only_numbers_within_its_bounds():
+    validate = compile_validator(Interval(0, 150))
+    assert [validate(value) for value in (0, 150, 0.5, 149.99)] == [True] * 4
+    assert [validate(value) for value in (-1, 150.01, float("nan"), "50", None, True, [50])] == [False] * 7
+
+def test_set_validator_refuses_unhashable_values():
+    validate = compile_validator({1, 3, 5})
+    assert not validate([3])
+    assert not validate({3: 3})
+
+def test_set_option_values_changes_nothing_when_any_value_is_bad(bus):
+    changes = []
+    bus.subscribe(changes.extend)
+    devices = [SmartLight(10), SmartFridge(3), SmartPlug(45), SmartLight(20)]
+    with pytest.raises(ValueError) as raised:
+        set_option_values(devices, [30, 4, 60.5, "40"])
+    assert raised.value.indices == [1, 3]
+    assert [device.option_value for device in (devices[0], devices[1], devices[3])] == [10, 3, 20]
+    assert devices[2].consumption_rate == 45
+    assert changes == []
+
+def test_set_option_values_reports_every_bad_index():
+    devices = [SmartLight() for _ in range(15)]
+    with pytest.raises(ValueError, match=r"and 5 more") as raised:
+        set_option_values(devices, [0] * 15)
+    assert raised.value.indices == list(range(15))
+
+def test_set_option_values_needs_one_value_per_device():
+    with pytest.raises(ValueError):
+        set_option_values([SmartLight()], [10, 20])
+
+def test_set_option_values_publishes_each_change(bus):
+    changes = []
+    bus.subscribe(changes.extend)
+    devices = [SmartLight(10), SmartFridge(3), SmartPlug(45)]
+    set_option_values(devices, [30, 5, 60.5])
+    assert [device.option_value for device in devices[:2]] == [30, 5]
+    assert devices[2].consumption_rate == 60.5
+    assert [(change.old, change.new) for change in changes] == [(10, 30), (3, 5), (45, 60.5)]
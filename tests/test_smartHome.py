@@ -0,0 +1,32 @@
+import pytest
+
+from smartDevice import SmartLight, SmartHeater
+from smartHome import SmartHome
+
+def test_apply_rejects_an_unknown_type_name():
+    home = SmartHome()
+    home.add_device(SmartLight())
+    with pytest.raises(ValueError) as raised:
+        home.apply([("SmartLight", "switch", True), ("SmartLamp", "switch", True)])
+    assert any("SmartLamp" in error for error in raised.value.errors)
+    assert not home.get_device(0)._switched_on
+
+def test_apply_delivers_only_the_net_changes_in_one_batch(bus):
+    deliveries = []
+    bus.subscribe(deliveries.append)
+    home = SmartHome()
+    home.add_device(SmartLight(10))
+    home.add_device(SmartHeater(1))
+    deliveries.clear()
+    home.apply([(SmartLight, "option", 40), (0, "toggle", None), (0, "toggle", None), (SmartHeater, "switch", True)])
+    assert len(deliveries) == 1
+    assert sorted((change.kind, change.old, change.new) for change in deliveries[0]) == \
+        [("option_changed", 10, 40), ("switch_changed", False, True)]
+
+def test_device_strings_keep_their_format():
+    light = SmartLight(40)
+    assert str(light) == "SmartLight is off with 40"
+    light.toggle_switch()
+    assert str(light) == "SmartLight is on with 40"
+    light._switched_on = False
+    assert str(light) == "SmartLight is off with 40"
@@ -0,0 +1,100 @@
+import tkinter as tk
+from tkinter import ttk
+
+class VirtualDeviceList:
+    # A Canvas + Scrollbar list that only builds the rows that fit in the viewport and
+    # rebinds them to whichever device indices are scrolled into view
+    def __init__(self, parent, row_text, actions, row_height=32, bg=None,
+                 button_side=tk.RIGHT, button_options=None, height=300):
+        self.row_text = row_text
+        self.actions = actions
+        self.row_height = row_height
+        self.bg = bg
+        self.button_side = button_side
+        self.button_options = button_options or {}
+        self.count = 0
+        self.rows = []
+
+        self.frame = tk.Frame(parent, bg=bg)
+        self.canvas = tk.Canvas(self.frame, bg=bg, height=height, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+        self.bind_wheel(self.canvas)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll(1))
+
+    def scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self.layout()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.layout()
+
+    def first_visible(self):
+        return max(0, int(self.canvas.canvasy(0) // self.row_height))
+
+    def see(self, index):
+        if self.count:
+            self.canvas.yview_moveto(index / self.count)
+            self.layout()
+
+    def refresh(self, count):
+        self.count = count
+        self.layout()
+
+    def redraw(self, changed):
+        # Relabels just the visible rows whose item changed; nothing is laid out again
+        for row in self.rows:
+            if row["index"] is not None and changed(row["index"]):
+                row["label"].config(text=self.row_text(row["index"]))
+
+    def make_row(self):
+        row = {"index": None}
+        row["frame"] = tk.Frame(self.canvas, bg=self.bg)
+        row["label"] = tk.Label(row["frame"], bg=self.bg, anchor="w")
+        row["label"].pack(side=tk.LEFT, padx=5)
+        for text, callback in self.actions:
+            tk.Button(row["frame"], text=text, command=lambda r=row, c=callback: c(r["index"]),
+                      **self.button_options).pack(side=self.button_side, padx=2)
+        row["item"] = self.canvas.create_window((0, 0), window=row["frame"], anchor="nw",
+                                                height=self.row_height, state="hidden")
+        self.bind_wheel(row["frame"])
+        self.bind_wheel(row["label"])
+        self.rows.append(row)
+        return row
+
+    def layout(self):
+        width = self.canvas.winfo_width()
+        height = max(self.canvas.winfo_height(), int(self.canvas.cget("height")))
+        self.canvas.configure(scrollregion=(0, 0, width, self.count * self.row_height))
+
+        visible = height // self.row_height
+        needed = min(self.count, visible + 2)
+        while len(self.rows) < needed:
+            self.make_row()
+
+        first = min(self.first_visible(), max(0, self.count - visible))
+        for offset, row in enumerate(self.rows):
+            index = first + offset
+            if index < self.count and offset < needed:
+                self.canvas.coords(row["item"], 0, index * self.row_height)
+                self.canvas.itemconfigure(row["item"], width=width, state="normal")
+                row["index"] = index
+                row["label"].config(text=self.row_text(index))
+            elif row["index"] is not None:
+                self.canvas.itemconfigure(row["item"], state="hidden")
+                row["index"] = None